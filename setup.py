@@ -89,6 +89,11 @@ setuptools.setup(
         # flask -- webapp mini-framework
         'flask>=0.9',
         ],
+    extras_require = {
+        # NumPy -- needed by the vectorized simulator `vmmad.fastsim`
+        # and the workload generator `vmmad.batchsys.workload`
+        'fastsim': ['numpy'],
+        },
 
     # additional non-Python files to be bundled in the package
     #package_data = {
@@ -58,3 +58,29 @@ class BatchSystem(object):
         representing the jobs in the batch queue system.
         """
         pass
+
+
+    def get_completed_jobs(self):
+        """
+        Return a list of `JobInfo` objects (in state ``FINISHED``)
+        describing jobs that have completed since the last call.
+
+        This is optional: batch system interfaces that cannot provide
+        exact completion data should return an empty list, and
+        job completion will then be detected by the job going missing
+        from the output of `get_sched_info`.
+        """
+        return [ ]
+
+
+    def get_job_details(self, jobs):
+        """
+        Return a dictionary mapping the job ID of each `JobInfo` in
+        `jobs` into a dictionary of additional job details (e.g.,
+        resource requests), which are too costly to retrieve for every
+        job in `get_sched_info`.
+
+        This is optional: batch system interfaces that cannot provide
+        job details should return an empty dictionary.
+        """
+        return { }
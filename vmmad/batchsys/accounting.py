@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Read job completion records from the Grid Engine ``accounting`` file.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import io
+import os
+import time
+
+# local imports
+from vmmad import log
+from vmmad.batchsys import BatchSystem
+from vmmad.orchestrator import JobInfo
+
+
+def parse_accounting_line(line):
+    """
+    Parse a line from the GE ``accounting`` file and return a
+    `JobInfo` object (in state ``FINISHED``) describing the job.
+
+    Return `None` if the line is a comment or does not describe a
+    job that actually ran.
+
+    The returned object has the following attributes, in addition to
+    `jobid` and `state`:
+
+    ==============  ==========================================================
+    attribute       meaning
+    ==============  ==========================================================
+    name            job name
+    job_number      GE job number (without the task ID of array jobs)
+    exec_node_name  host where the job ran
+    queue_name      queue instance (``queue@host``) where the job ran
+    submitted_at    submission time, as UNIX epoch
+    running_at      start time, as UNIX epoch
+    finished_at     end time, as UNIX epoch
+    failed          GE failure code (0 if the job was run successfully)
+    exit_status     exit status of the job script
+    slots           number of slots used by the job
+    ==============  ==========================================================
+
+    Tasks of array jobs get a `jobid` of the form ``<job
+    number>.<task ID>``, like running tasks reported by
+    `vmmad.batchsys.gridengine.GridEngine`.
+    """
+    if line.startswith('#'):
+        return None
+    fields = line.rstrip('\n').split(':')
+    if len(fields) < 11 or int(fields[8]) == 0:
+        return None
+    jobid = fields[5]
+    if len(fields) > 35 and fields[35] not in ('', '0', 'undefined'):
+        jobid = ("%s.%s" % (jobid, fields[35]))
+    job = JobInfo(
+        jobid=jobid,
+        state=JobInfo.FINISHED,
+        name=fields[4],
+        job_number=fields[5],
+        exec_node_name=fields[1],
+        queue_name=("%s@%s" % (fields[0], fields[1])),
+        submitted_at=int(fields[8]),
+        running_at=int(fields[9]),
+        finished_at=int(fields[10]),
+        )
+    if len(fields) > 12:
+        job.failed = int(fields[11])
+        job.exit_status = int(fields[12])
+    if len(fields) > 34:
+        job.slots = int(fields[34])
+    return job
+
+
+def can_resume(stat, inode, offset):
+    """
+    Return `True` if reading of the accounting file described by
+    `stat` (as returned by `os.stat`) can continue at `offset`, where
+    reading of the file with inode number `inode` stopped; i.e., the
+    file has been neither rotated nor truncated since.  If `inode`
+    is `None`, only truncation is checked.
+    """
+    if inode is not None and stat.st_ino != inode:
+        return False
+    return stat.st_size >= offset
+
+
+class AccountingFile(object):
+    """
+    Follow a GE ``accounting`` file, like ``tail -F`` does.
+
+    Each call to `poll` returns the jobs that have been recorded in the
+    accounting file since the previous call.  Only complete lines are
+    consumed: a line that GE is still writing is left for the next
+    call.
+
+    Rotation of the accounting file is detected by watching its inode
+    number: when it changes, the rest of the old file is read before
+    switching to the new one.  If the file shrinks instead (i.e., it
+    has been truncated in place), reading restarts from its beginning.
+
+    If `state_file` is not `None`, the position reached in the
+    accounting file is saved there after every `poll`, and restored by
+    the constructor, so that no record is lost or processed twice
+    across restarts.  Otherwise (or if the state file does not exist
+    yet), reading starts at the end of the accounting file, unless
+    `from_start` is `True`.
+    """
+
+    def __init__(self, path, state_file=None, from_start=False):
+        self.path = path
+        self.state_file = state_file
+        self._file = None
+        self._inode = None
+        self._offset = 0
+        self._partial = ''
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file, 'r') as state:
+                inode, offset = state.read().split()
+            self._inode = int(inode)
+            self._offset = int(offset)
+            log.info("Resuming reading of accounting file '%s' at offset %d.",
+                     path, self._offset)
+        elif not from_start and os.path.exists(path):
+            stat = os.stat(path)
+            self._inode = stat.st_ino
+            self._offset = stat.st_size
+
+
+    def poll(self):
+        """
+        Return a list of `JobInfo` objects for the jobs that have
+        been recorded in the accounting file since the last call.
+        """
+        lines = [ ]
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # file is being rotated: keep reading the old one, if any
+            stat = None
+        if self._file is not None and stat is not None and stat.st_ino != self._inode:
+            log.info("Accounting file '%s' has been rotated.", self.path)
+            lines += self._read_lines()
+            self._file.close()
+            self._file = None
+            self._inode = None
+            self._offset = 0
+            self._partial = ''
+        if self._file is None:
+            if stat is not None:
+                # use `io.open`: reading past EOF is not "sticky" there
+                self._file = io.open(self.path, 'rb')
+                if self._inode is None or not can_resume(stat, self._inode, self._offset):
+                    # not the file we were reading last time
+                    self._offset = 0
+                self._inode = stat.st_ino
+                self._file.seek(self._offset)
+        elif stat is not None and stat.st_size < self._offset:
+            log.info("Accounting file '%s' has been truncated.", self.path)
+            self._file.seek(0)
+            self._offset = 0
+            self._partial = ''
+        if self._file is not None:
+            lines += self._read_lines()
+        self._save_state()
+        return [ job for job in (parse_accounting_line(line) for line in lines)
+                 if job is not None ]
+
+
+    def _read_lines(self):
+        data = self._partial + self._file.read()
+        end = data.rfind('\n') + 1
+        self._partial = data[end:]
+        self._offset = self._file.tell() - len(self._partial)
+        return data[:end].splitlines()
+
+
+    def _save_state(self):
+        if self.state_file is None or self._inode is None:
+            return
+        # same strategy as `Orchestrator._save_to_file`: a valid
+        # state file always exists, even if we crash while writing it
+        path_new = self.state_file + '.NEW'
+        with open(path_new, 'w') as state:
+            state.write("%d %d\n" % (self._inode, self._offset))
+        os.rename(path_new, self.state_file)
+
+
+class AccountingFollower(BatchSystem):
+    """
+    Augment a batch system interface with exact job completion
+    information read from the GE ``accounting`` file.
+
+    Without this, a finished job is only noticed when it is missing
+    from the next full listing of the batch system, and its exit
+    status and run time are lost.  An `AccountingFollower` instead
+    reads new lines from the accounting file (see `AccountingFile`)
+    at every call to `get_sched_info`, which is cheap: jobs recorded
+    there are removed from the job list and made available, with all
+    their accounting data, through `get_completed_jobs`.
+
+    The wrapped `batchsys` (e.g., a
+    `vmmad.batchsys.gridengine.GridEngine` instance) is queried at
+    most once every `poll_interval` seconds (as measured by the
+    `timer` function); in between, the last listing is reused, minus
+    the jobs that have completed in the meantime.
+    """
+
+    def __init__(self, batchsys, accounting_file, state_file=None,
+                 poll_interval=0, timer=time.time):
+        self.batchsys = batchsys
+        self.accounting = AccountingFile(accounting_file, state_file)
+        self.poll_interval = poll_interval
+        self.timer = timer
+        self._snapshot = None
+        self._last_poll = None
+        self._done = set()
+        self._completed = [ ]
+
+
+    def get_sched_info(self):
+        now = self.timer()
+        if self._snapshot is None or (now - self._last_poll) >= self.poll_interval:
+            self._snapshot = self.batchsys.get_sched_info()
+            self._last_poll = now
+            # the listing may lag behind the accounting file: keep
+            # hiding completed jobs as long as they are listed
+            self._done.intersection_update(job.jobid for job in self._snapshot)
+        completed = self.accounting.poll()
+        self._completed.extend(completed)
+        self._done.update(job.jobid for job in completed)
+        return [ job for job in self._snapshot if job.jobid not in self._done ]
+
+
+    def get_completed_jobs(self):
+        completed = self._completed
+        self._completed = [ ]
+        return completed
+
+
+    def get_job_details(self, jobs):
+        return self.batchsys.get_job_details(jobs)
@@ -0,0 +1,188 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Share a single batch system listing among several clients.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import json
+import os
+import threading
+import time
+
+# local imports
+from vmmad import log
+from vmmad.batchsys import BatchSystem
+from vmmad.orchestrator import JobInfo
+
+
+def publish_snapshot(path, jobs, taken_at):
+    """
+    Save the job list `jobs` (retrieved at time `taken_at`) into
+    file `path`, for use by `SnapshotFile`.
+
+    The file is written under a temporary name and then renamed, so
+    readers always see a complete snapshot.  Jobs are stored as JSON
+    objects, so that reading a snapshot can never run code.
+    """
+    path_new = ("%s.NEW.%d" % (path, os.getpid()))
+    with open(path_new, 'wb') as output:
+        json.dump(dict(taken_at=taken_at, jobs=[ dict(job) for job in jobs ]), output)
+    os.rename(path_new, path)
+
+
+def _str_keys(obj):
+    # JSON strings are loaded as `unicode`; job attributes are not
+    return dict((str(key), (str(value) if isinstance(value, unicode) else value))
+                for key, value in obj.iteritems())
+
+
+def load_snapshot(path):
+    """
+    Return a pair `(taken_at, jobs)` with the job list saved into
+    file `path` by `publish_snapshot`.
+    """
+    with open(path, 'rb') as snapshot:
+        data = json.load(snapshot, object_hook=_str_keys)
+    return data['taken_at'], [ JobInfo(job) for job in data['jobs'] ]
+
+
+class CachedBatchSystem(BatchSystem):
+    """
+    Cache the job list returned by another batch system interface.
+
+    Calls to `get_sched_info` return the cached job list if it is
+    less than `ttl` seconds old (as measured by the `timer`
+    function); otherwise, the wrapped `batchsys` is queried again.
+    When several threads need a fresh job list at the same time, only
+    one of them queries `batchsys`, and the others wait for it and
+    share the result.  Each caller gets its own copies of the job
+    objects, which it is free to modify.
+
+    Completed jobs are retrieved from `batchsys` together with the
+    job list, and `get_completed_jobs` returns copies of those
+    collected at the latest refresh.  So every caller sees the same
+    completions, not just the first one; a caller may see the same
+    job twice, if it calls again before the cache expires.
+
+    If `publish` is not `None`, every fresh job list is also saved
+    into the file at that path, so that other processes on the same
+    host can read it through `SnapshotFile` instead of querying the
+    batch system themselves.
+    """
+
+    def __init__(self, batchsys, ttl=30, publish=None, timer=time.time):
+        self.batchsys = batchsys
+        self.ttl = ttl
+        self.publish = publish
+        self.timer = timer
+        self._snapshot = None
+        self._snapshot_at = None
+        self._completed = [ ]
+        self._lock = threading.Lock()
+
+
+    def _refresh(self):
+        """
+        Query `batchsys` again if the cached data is stale.  Must be
+        called with `self._lock` held.
+        """
+        # callers that were waiting for the lock find here the
+        # job list just retrieved by the thread that held it
+        if self._snapshot is None or (self.timer() - self._snapshot_at) >= self.ttl:
+            self._snapshot = self.batchsys.get_sched_info()
+            # the completion records of jobs missing from the list
+            # are available by now
+            if hasattr(self.batchsys, 'get_completed_jobs'):
+                self._completed = self.batchsys.get_completed_jobs()
+            self._snapshot_at = self.timer()
+            if self.publish is not None:
+                try:
+                    publish_snapshot(self.publish, self._snapshot, self._snapshot_at)
+                except (IOError, OSError), ex:
+                    log.warning("Could not publish job list to file '%s': %s",
+                                self.publish, str(ex))
+
+
+    def get_sched_info(self):
+        with self._lock:
+            self._refresh()
+            return [ JobInfo(job) for job in self._snapshot ]
+
+
+    def get_completed_jobs(self):
+        with self._lock:
+            self._refresh()
+            return [ JobInfo(job) for job in self._completed ]
+
+
+    def get_job_details(self, jobs):
+        return self.batchsys.get_job_details(jobs)
+
+
+class SnapshotFile(BatchSystem):
+    """
+    Read the job list published by a `CachedBatchSystem` into file `path`.
+
+    The file is only loaded again when it has been modified.  If the
+    job list is older than `max_age` seconds (as measured by the
+    `timer` function, which must agree with the one used by the
+    publisher) or the file does not exist, then the `fallback` batch
+    system interface is queried instead; if `fallback` is `None`, a
+    `RuntimeError` is raised.
+    """
+
+    def __init__(self, path, max_age=60, fallback=None, timer=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.fallback = fallback
+        self.timer = timer
+        self._mtime = None
+        self._snapshot = None
+        self._snapshot_at = None
+
+
+    def get_sched_info(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime != self._mtime:
+                self._snapshot_at, self._snapshot = load_snapshot(self.path)
+                self._mtime = mtime
+        except (IOError, OSError, ValueError, KeyError), ex:
+            log.debug("Cannot read job list from file '%s': %s", self.path, str(ex))
+        if self._snapshot is not None and (self.timer() - self._snapshot_at) < self.max_age:
+            return [ JobInfo(job) for job in self._snapshot ]
+        if self.fallback is not None:
+            log.info("No recent job list in file '%s', querying the batch system directly.",
+                     self.path)
+            return self.fallback.get_sched_info()
+        raise RuntimeError("No job list newer than %s seconds in file '%s'"
+                           % (self.max_age, self.path))
+
+
+    def get_job_details(self, jobs):
+        if self.fallback is not None:
+            return self.fallback.get_job_details(jobs)
+        return { }
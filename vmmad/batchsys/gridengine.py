@@ -29,18 +29,24 @@ __version__ = '$Revision$'
 
 # stdlib imports
 from collections import Mapping, defaultdict
+import cStringIO as StringIO
+import itertools
+import multiprocessing.dummy as mp
 import os
+import signal
 import subprocess
 import sys
+import threading
 import time
 import UserDict
+import xml.etree.cElementTree as ElementTree
 import xml.sax
 
 # local imports
 from vmmad import log
 from vmmad.batchsys import BatchSystem
 from vmmad.orchestrator import JobInfo
-from vmmad.util import Struct
+from vmmad.util import Struct, TimestampConverter, timestamp_to_epoch
 
 
 class _QstatXmlHandler(xml.sax.ContentHandler):
@@ -58,7 +64,8 @@ class _QstatXmlHandler(xml.sax.ContentHandler):
         'JB_name',
         'state',
         'queue_name',
-        'slots'
+        'slots',
+        'tasks',
         ]
 
     # conversion of XML fields to Python data
@@ -158,54 +165,669 @@ class _QstatXmlHandler(xml.sax.ContentHandler):
         return
 
 
+def _set_job_queue(job, value):
+    """
+    Set the `queue_name` and `exec_node_name` attributes of `job`
+    from the ``queue@host`` string `value`.
+    """
+    if '' == value:
+        job['queue_name'] = None
+        job['exec_node_name'] = None
+    else:
+        job['queue_name'] = value
+        # FIXME: GE's queue names have the form queue@hostname;
+        # raise an appropriate exception if this is not the case!
+        at = value.index('@') + 1
+        job['exec_node_name'] = value[at:]
+
+
+def _set_job_state(job, value):
+    """
+    Set the `state` attribute of `job` from the GE state letters `value`.
+    """
+    # the GE state letters are explained in the `qstat` man page
+    if (('E' in value)
+        or ('h' in value)
+        or ('T' in value)
+        or ('s' in value) or ('S' in value)
+        or ('d' in value)):
+        job.state = JobInfo.OTHER
+    elif 'q' in value:
+        job.state = JobInfo.PENDING
+    elif ('r' in value) or ('t' in value):
+        job.state = JobInfo.RUNNING
+
+
+class _QstatXmlParser(object):
+    """
+    Fast parser for the output of `qstat -u ... -xml`.
+
+    This produces exactly the same list of `JobInfo` objects as the
+    SAX `_QstatXmlHandler` (which is kept around as the reference
+    implementation), but is several times faster: the document is
+    scanned with the C-accelerated `iterparse` from
+    `xml.etree.cElementTree`, so Python code only runs once per
+    ``job_list`` element instead of once per XML event, and child
+    elements are dispatched through a dictionary lookup instead of an
+    `if` chain.  Each ``job_list`` element is cleared as soon as it
+    has been converted, so memory usage does not grow with the
+    document size.
+
+    Input is read from a file-like object, so there is no need to hold
+    the whole XML document in memory at once.
+    """
+
+    def __init__(self, dest):
+        self.jobs = dest
+        # job-level elements that we actually convert; each maps to
+        # the method that stores its text into the `JobInfo` object
+        self._fields = {
+            'JB_job_number':      self._set_job_number,
+            'JB_submission_time': self._set_submission_time,
+            'JAT_start_time':     self._set_start_time,
+            'JAT_prio':           self._set_prio,
+            'JB_name':            self._set_name,
+            'state':              _set_job_state,
+            'queue_name':         _set_job_queue,
+            'slots':              self._set_slots,
+            'tasks':              self._set_tasks,
+            }
+
+    def parse(self, stream):
+        """Parse the whole XML document read from file-like object `stream`."""
+        fields = self._fields
+        for _, elem in ElementTree.iterparse(stream):
+            tag = elem.tag
+            if 'job_list' == tag:
+                assert 'state' in elem.attrib
+                job = JobInfo(jobid='invalid', state=JobInfo.OTHER)
+                for child in elem:
+                    if child.tag in fields:
+                        fields[child.tag](job, str(child.text or ''))
+                self.jobs.append(job)
+                elem.clear()
+            elif 'queue_info' == tag or 'job_info' == tag:
+                elem.clear()
+
+    @staticmethod
+    def _set_job_number(job, value):
+        job.jobid = value
+
+    @staticmethod
+    def _set_submission_time(job, value):
+        job.submitted_at = timestamp_to_epoch(value)
+
+    @staticmethod
+    def _set_start_time(job, value):
+        job.running_at = timestamp_to_epoch(value)
+
+    @staticmethod
+    def _set_prio(job, value):
+        job['JAT_prio'] = float(value)
+
+    @staticmethod
+    def _set_name(job, value):
+        job['name'] = value
+
+    @staticmethod
+    def _set_slots(job, value):
+        job['slots'] = int(value)
+
+    @staticmethod
+    def _set_tasks(job, value):
+        job['tasks'] = value
+
+
+def _job_number(job):
+    """
+    Return the GE job number of `job`, also when it stands for one
+    or more tasks of an array job.
+    """
+    return job.get('array_jobid', job.jobid.split('.', 1)[0])
+
+
+# the plain-text `qstat` listing uses a different time stamp format than the XML one
+_text_timestamp_to_epoch = TimestampConverter('%m/%d/%Y %H:%M:%S')
+
+
+# serialize process creation in `GridEngine._run`, which see
+_popen_lock = threading.Lock()
+
+
+def count_tasks(spec):
+    """
+    Return the number of tasks in a GE array job task specification.
+
+    A task specification is a comma-separated list of task IDs and
+    task ranges ``first-last:step``, as printed by `qstat` in the
+    ``tasks`` (or ``ja-task-ID``) column.
+
+    Examples::
+
+      >>> count_tasks('7')
+      1
+      >>> count_tasks('1-10000:1')
+      10000
+      >>> count_tasks('1,3,5-9:2')
+      5
+    """
+    total = 0
+    for part in spec.split(','):
+        if '-' in part:
+            if ':' in part:
+                bounds, step = part.split(':')
+                step = int(step)
+            else:
+                bounds, step = part, 1
+            first, last = bounds.split('-')
+            total += (int(last) - int(first)) // step + 1
+        else:
+            total += 1
+    return total
+
+
+def aggregate_array_tasks(jobs):
+    """
+    Post-process the list of `JobInfo` objects built from ``qstat``
+    output, so that array jobs are represented compactly.
+
+    `qstat` reports each running task of an array job, and each range
+    of non-running tasks, as a separate entry carrying a ``tasks``
+    attribute.  This function (which modifies the list in place and
+    returns it) turns them into:
+
+    * one `JobInfo` object per *running* task, whose `jobid` is
+      ``<job number>.<task ID>``;
+
+    * a single `JobInfo` object for all the *pending* tasks of an
+      array job, whose `jobid` is the plain job number;
+
+    * one `JobInfo` object per range of tasks in any other state
+      (e.g., held or in error), whose `jobid` is ``<job
+      number>.<tasks>``.
+
+    Running and aggregated entries get a `task_count` attribute with
+    the number of tasks they stand for, and an `array_jobid`
+    attribute with the job number.  Entries without a ``tasks``
+    attribute (i.e., regular jobs) are left untouched.
+    """
+    pending = { }
+    result = [ ]
+    for job in jobs:
+        if 'tasks' not in job:
+            result.append(job)
+            continue
+        array_jobid = job.jobid
+        job.array_jobid = array_jobid
+        job.task_count = count_tasks(job.tasks)
+        if job.state == JobInfo.PENDING:
+            if array_jobid in pending:
+                _merge_tasks(pending[array_jobid], job)
+                continue
+            pending[array_jobid] = job
+        else:
+            job.jobid = ("%s.%s" % (array_jobid, job.tasks))
+        result.append(job)
+    jobs[:] = result
+    return jobs
+
+
+def _merge_tasks(aggregate, job):
+    """
+    Add the tasks of `job` to those of `aggregate`, both representing
+    pending tasks of the same array job.  Task ranges already listed
+    in `aggregate` are not counted again.
+    """
+    parts = aggregate.tasks.split(',')
+    for part in job.tasks.split(','):
+        if part not in parts:
+            parts.append(part)
+            aggregate.task_count += count_tasks(part)
+    aggregate.tasks = str.join(',', parts)
+
+
 class GridEngine(BatchSystem):
     """
-    Abstract base class describing the interface that a node provider
-    should implement.
+    Interface to Sun/Oracle/Open Grid Engine, based on ``qstat``.
     """
 
-    def __init__(self, user='*'):
+    # `JobInfo` attributes that can be filled from the plain-text
+    # `qstat` listing; job names are not among them, since they are
+    # truncated to the column width
+    TEXT_FIELDS = frozenset([
+        'jobid',
+        'state',
+        'submitted_at',
+        'running_at',
+        'JAT_prio',
+        'queue_name',
+        'exec_node_name',
+        'slots',
+        'tasks',
+        'task_count',
+        'array_jobid',
+        ])
+
+    # keys in the output of `qstat -j` whose values are lists of
+    # ``name=value`` items
+    DETAILS_LISTS = (
+        'hard resource_list',
+        'soft resource_list',
+        'env_list',
+        'context',
+        )
+
+    def __init__(self, user='*', users=None, queues=None, threads=8,
+                 text=False, fields=None, timeout=None, background=False,
+                 details_batch=100):
         """
         Set up parameters for querying SGE.
+
+        By default, a single ``qstat -u <user> -xml`` command is run to
+        list all jobs of `user` (all users, if `user` is ``*``).
+
+        If a list of `users` and/or `queues` is given, then the
+        listing is split into several narrower ``qstat`` queries, one
+        per user (``-u``) and/or queue (``-q``), or one per (user,
+        queue) combination if both are given.  These are run
+        concurrently on a pool of (at most) `threads` threads, and
+        their results are merged, discarding duplicate job IDs (the
+        pending tasks of an array job listed by several queries are
+        merged into one entry); so polling the batch system takes as
+        long as the slowest query, rather than the sum of all of them.  Listing only the queues
+        that feed cloud candidates also means that `qmaster` has less
+        work to do.
+
+        If `text` is `True`, then the plain-text output of ``qstat``
+        is parsed instead of the XML one: it is several times smaller
+        and much cheaper to parse, but it only provides the job
+        attributes listed in `GridEngine.TEXT_FIELDS`.  Pass the set
+        of `JobInfo` attributes that the caller needs as `fields`: if
+        some of them are not available in the plain-text output, the
+        XML output is used anyway.
+
+        If `timeout` is not `None`, each ``qstat`` command is killed
+        (together with any process it may have spawned) if it has not
+        completed within `timeout` seconds; a `RuntimeError` is then
+        raised, as happens when ``qstat`` exits with a non-zero code.
+
+        If `background` is `True`, then `get_sched_info` never waits
+        for ``qstat``: it returns the last successfully retrieved job
+        list, and starts a new query in a separate thread if none is
+        running.  (Only the very first call blocks, since there is no
+        previous job list to return.)  Errors in background queries are
+        logged and the previous job list is kept.
+
+        Job details requested through `get_job_details` are fetched
+        with ``qstat -j``, for at most `details_batch` jobs per
+        command.
+
+        :param str user:    User whose jobs are listed (by default, all users)
+        :param list users:  If given, run one ``qstat -u`` query per user in this list
+        :param list queues: If given, run one ``qstat -q`` query per queue in this list
+        :param int threads: Maximum number of ``qstat`` queries to run concurrently
+        :param bool text:   Use the plain-text output of ``qstat`` if possible
+        :param fields:      Job attributes that are needed by the caller
+        :param timeout:     Maximum time (seconds) a ``qstat`` command is allowed to run
+        :param bool background: Run ``qstat`` in the background and return the last job list
+        :param int details_batch: Maximum number of jobs whose details are fetched by a single ``qstat -j``
         """
         self.user = user
+        self.shards = list(itertools.product(users or [user], queues or [None]))
+        self.threads = min(threads, len(self.shards))
+        if text and fields is not None:
+            missing = set(fields) - self.TEXT_FIELDS
+            if missing:
+                log.info("Plain-text `qstat` output lacks job attribute(s) %s;"
+                         " will use XML output instead.", str.join(', ', sorted(missing)))
+                text = False
+        self.text = text
+        self.timeout = timeout
+        self.background = background
+        self._snapshot = None
+        self._snapshot_at = None
+        self._refresh_thread = None
+        self.details_batch = details_batch
+        self._details = { }
+        # in `background` mode, `_details` is pruned by the refresh thread
+        self._details_lock = threading.Lock()
 
 
-    def run_qstat(self):
-        try:
-            qstat_cmd = ['qstat', '-u', self.user, '-xml']
-            qstat_process = subprocess.Popen(
-                qstat_cmd,
+    def run_qstat(self, user=None, queue=None, xml=True):
+        """
+        Run ``qstat`` and return its output.
+
+        Jobs are listed for user `user` (default: the one given to the
+        constructor) and, if `queue` is not `None`, restricted to the
+        jobs in that queue.  If `xml` is `False`, then the plain-text
+        listing is returned instead.
+        """
+        qstat_cmd = ['qstat', '-u', (user or self.user)]
+        if xml:
+            qstat_cmd.append('-xml')
+        if queue is not None:
+            qstat_cmd += ['-q', queue]
+        returncode, stdout, stderr = self._run(qstat_cmd)
+        if returncode != 0:
+            log.error("Error running '%s': '%s'; exit code %d",
+                      str.join(' ', qstat_cmd), stderr.strip(), returncode)
+            raise RuntimeError("Command '%s' exited with code %d"
+                               % (str.join(' ', qstat_cmd), returncode))
+        return stdout
+
+
+    def _run(self, cmd):
+        """
+        Run command `cmd` (a list of strings), killing it if it runs
+        longer than `self.timeout` seconds, and return a triple
+        (exit code, standard output, standard error).
+        """
+        # do not truncate queue names in the plain-text output
+        env = dict(os.environ, SGE_LONG_QNAMES='-1')
+        # `_query_shards` runs several commands at once from different
+        # threads: forking with a `preexec_fn` is only safe if no
+        # other thread forks at the same time, and each child must
+        # not keep the pipes of its siblings open (or their readers
+        # would wait for it to exit)
+        with _popen_lock:
+            process = subprocess.Popen(
+                cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
+                env=env,
+                # run in a new process group, so that we can kill any
+                # process that `qstat` (or a wrapper script) spawns
+                preexec_fn=os.setsid,
+                close_fds=True,
                 shell=False)
-            stdout, stderr = qstat_process.communicate()
-            return stdout
-        except subprocess.CalledProcessError, ex:
-            logging.error("Error running '%s': '%s'; exit code %d",
-                          str.join(' ', qstat_cmd), stderr, ex.returncode)
-            raise
+        killed = [ ]
+        if self.timeout is not None:
+            timer = threading.Timer(self.timeout, self._kill_process_group,
+                                    [process, killed])
+            timer.daemon = True
+            timer.start()
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            if self.timeout is not None:
+                timer.cancel()
+        if killed:
+            log.error("Command '%s' did not complete within %s seconds; killed it.",
+                      str.join(' ', cmd), self.timeout)
+            raise RuntimeError("Command '%s' timed out after %s seconds"
+                               % (str.join(' ', cmd), self.timeout))
+        return process.returncode, stdout, stderr
+
+
+    @staticmethod
+    def _kill_process_group(process, killed):
+        """
+        Kill the process group led by `process`, and record that in
+        list `killed`.  Called when the ``qstat`` timeout expires.
+        """
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            killed.append(process.pid)
+        except OSError:
+            # process already gone
+            pass
 
 
     @staticmethod
     def parse_qstat_xml_output(qstat_xml_out):
         """
-        Parse the output of a `qstat -xml` command and return a
-        tuple `(jobid,submit_time,duration)`, where each item is a list of
-        dictionary-like objects whose keys/attributes directly map the
+        Parse the output of a `qstat -xml` command and return a list
+        of `JobInfo` objects, whose keys/attributes directly map the
         XML contents.
+
+        Tasks of array jobs are aggregated as explained in
+        `aggregate_array_tasks`.
+        """
+        return GridEngine.parse_qstat_xml_stream(StringIO.StringIO(qstat_xml_out))
+
+
+    @staticmethod
+    def parse_qstat_xml_stream(stream):
+        """
+        Like `parse_qstat_xml_output`, but read the XML document
+        from file-like object `stream`, in chunks.
+        """
+        jobs = [ ]
+        _QstatXmlParser(jobs).parse(stream)
+        return aggregate_array_tasks(jobs)
+
+
+    @staticmethod
+    def parse_qstat_xml_output_sax(qstat_xml_out):
+        """
+        Parse the output of a `qstat -xml` command using the SAX-based
+        reference parser.
+
+        Results are exactly the same as `parse_qstat_xml_output`
+        (which see), only much slower; this is mainly kept for testing
+        and benchmarking purposes.
         """
         jobs = [ ]
         xml.sax.make_parser()
         xml.sax.parseString(qstat_xml_out, _QstatXmlHandler(jobs))
-        return jobs
+        return aggregate_array_tasks(jobs)
+
+
+    @staticmethod
+    def parse_qstat_text_output(qstat_out):
+        """
+        Parse the plain-text output of a `qstat` command and return a
+        list of `JobInfo` objects.
+
+        The objects have the same attributes as those returned by
+        `parse_qstat_xml_output` for the same queue, but only the
+        attributes in `GridEngine.TEXT_FIELDS` are guaranteed to have
+        the same values: in particular, the `name` attribute may be
+        truncated.
+        """
+        jobs = [ ]
+        for line in qstat_out.splitlines():
+            fields = line.split()
+            if len(fields) < 8 or not fields[0].isdigit():
+                # header, separator or empty line
+                continue
+            job = JobInfo(jobid=fields[0], state=JobInfo.OTHER)
+            job['JAT_prio'] = float(fields[1])
+            job['name'] = fields[2]
+            _set_job_state(job, fields[4])
+            # the time stamp is the start time if the job has been
+            # assigned to a queue, and the submission time otherwise
+            timestamp = _text_timestamp_to_epoch(fields[5] + ' ' + fields[6])
+            rest = fields[7:]
+            if '@' in rest[0]:
+                _set_job_queue(job, rest.pop(0))
+                job.running_at = timestamp
+            else:
+                _set_job_queue(job, '')
+                job.submitted_at = timestamp
+            job['slots'] = int(rest[0])
+            if len(rest) > 1:
+                job['tasks'] = rest[1]
+            jobs.append(job)
+        return aggregate_array_tasks(jobs)
+
+
+    @staticmethod
+    def parse_qstat_details_output(qstat_out):
+        """
+        Parse the output of a ``qstat -j <job numbers>`` command and
+        return a dictionary, mapping each job number into a dictionary
+        of job details.
+
+        Keys of the details dictionary are the ones printed by
+        ``qstat -j`` (e.g., ``hard resource_list`` or ``cwd``), and
+        values are strings, except for the list-valued keys in
+        `DETAILS_LISTS`, which are parsed into dictionaries; e.g.,
+        ``hard resource_list: h_vmem=2G,h_rt=3600`` gives the details
+        entry ``{'h_vmem':'2G', 'h_rt':'3600'}``.
+
+        Example::
+
+          >>> details = GridEngine.parse_qstat_details_output('''
+          ... ==============================================================
+          ... job_number:                 42
+          ... owner:                      cpanse
+          ... hard resource_list:         h_vmem=2G,h_rt=3600
+          ... ''')
+          >>> details['42']['owner']
+          'cpanse'
+          >>> details['42']['hard resource_list']['h_vmem']
+          '2G'
+        """
+        result = { }
+        details = None
+        key = None
+        for line in qstat_out.splitlines():
+            if line.startswith('====='):
+                details = None
+                key = None
+            elif line[:1].isspace() and key is not None:
+                # continuation of the previous value
+                details[key] += ' ' + line.strip()
+            elif ':' in line:
+                key, value = line.split(':', 1)
+                value = value.strip()
+                if key == 'job_number':
+                    details = { }
+                    result[value] = details
+                if details is not None:
+                    details[key] = value
+        for details in result.itervalues():
+            for key in GridEngine.DETAILS_LISTS:
+                if key in details:
+                    details[key] = dict(item.partition('=')[::2]
+                                        for item in details[key].split(',')
+                                        if item)
+        return result
+
+
+    def get_job_details(self, jobs):
+        """
+        Return a dictionary mapping the job ID of each `JobInfo` in
+        `jobs` into a dictionary of job details, as returned by
+        `parse_qstat_details_output`.
+
+        Details are fetched with ``qstat -j``, and cached until the
+        job leaves the queue, so asking again for the same job is
+        cheap.  Tasks of an array job share the details of the job
+        they belong to.  Jobs whose details cannot be retrieved
+        (e.g., because they have just finished) are missing from the
+        returned dictionary.
+        """
+        with self._details_lock:
+            missing = sorted(set(_job_number(job) for job in jobs) - set(self._details))
+        for start in xrange(0, len(missing), self.details_batch):
+            batch = missing[start:start+self.details_batch]
+            cmd = ['qstat', '-j', str.join(',', batch)]
+            returncode, stdout, stderr = self._run(cmd)
+            found = self.parse_qstat_details_output(stdout)
+            if returncode != 0:
+                # `qstat -j` fails if any of the jobs no longer exists
+                log.warning("Command '%s' exited with code %d: '%s';"
+                            " got details for %d jobs out of %d.",
+                            str.join(' ', cmd), returncode, stderr.strip(),
+                            len(found), len(batch))
+            with self._details_lock:
+                self._details.update(found)
+        result = { }
+        with self._details_lock:
+            for job in jobs:
+                details = self._details.get(_job_number(job))
+                if details is not None:
+                    result[job.jobid] = details
+        return result
+
+
+    def _poll_shard(self, shard):
+        user, queue = shard
+        if self.text:
+            return self.parse_qstat_text_output(self.run_qstat(user, queue, xml=False))
+        else:
+            return self.parse_qstat_xml_output(self.run_qstat(user, queue))
 
 
     def get_sched_info(self):
         """
-        Query SGE through ``qstat -xml`` and return a list of
+        Query SGE through ``qstat`` and return a list of
         `JobInfo` objects representing the jobs in the batch queue
         system.
+
+        If several ``qstat`` queries have been configured (see the
+        constructor), they are run in parallel and the merged list of
+        jobs is returned; each job appears only once in it.
+
+        In `background` mode, return the last job list retrieved
+        instead, and start a new query in the background.
         """
-        qstat_xml_out = self.run_qstat()
-        return self.parse_qstat_xml_output(qstat_xml_out)
+        if not self.background or self._snapshot is None:
+            self._snapshot = self._query_sched_info()
+            self._snapshot_at = time.time()
+            return self._snapshot
+        if self._refresh_thread is None or not self._refresh_thread.is_alive():
+            self._refresh_thread = threading.Thread(target=self._refresh)
+            self._refresh_thread.daemon = True
+            self._refresh_thread.start()
+        else:
+            log.debug("Previous `qstat` query still running,"
+                      " returning job list from %.1f seconds ago.",
+                      time.time() - self._snapshot_at)
+        return self._snapshot
+
+
+    def _refresh(self):
+        """Update the job list returned by `get_sched_info` in background mode."""
+        try:
+            jobs = self._query_sched_info()
+        except Exception, ex:
+            log.error("Error polling the batch system: %s: %s;"
+                      " keeping job list from %.1f seconds ago.",
+                      ex.__class__.__name__, str(ex), time.time() - self._snapshot_at)
+            return
+        # a single assignment is atomic, so no lock is needed
+        self._snapshot, self._snapshot_at = jobs, time.time()
+
+
+    def _query_sched_info(self):
+        if len(self.shards) == 1:
+            jobs = self._poll_shard(self.shards[0])
+        else:
+            jobs = self._query_shards()
+        # forget details of jobs that have left the queue
+        current = set(_job_number(job) for job in jobs)
+        with self._details_lock:
+            for num in self._details.keys():
+                if num not in current:
+                    del self._details[num]
+        return jobs
+
+
+    def _query_shards(self):
+        # a new pool for each query, so that no threads are left
+        # behind when this object is discarded; starting them costs
+        # far less than running `qstat`
+        pool = mp.Pool(self.threads)
+        try:
+            t0 = time.time()
+            results = pool.map(self._poll_shard, self.shards)
+            log.debug("Ran %d qstat queries in %.3f seconds.",
+                      len(self.shards), time.time() - t0)
+        finally:
+            pool.close()
+            pool.join()
+        jobs = [ ]
+        seen = { }
+        for job in itertools.chain(*results):
+            other = seen.get(job.jobid)
+            if other is None:
+                seen[job.jobid] = job
+                jobs.append(job)
+            elif job.state == JobInfo.PENDING and 'tasks' in job and 'tasks' in other:
+                # the pending tasks of an array job can be split
+                # among the shards
+                _merge_tasks(other, job)
+        return jobs
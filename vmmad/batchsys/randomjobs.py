@@ -27,13 +27,24 @@ __version__ = '$Revision$'
 
 
 # stdlib imports
-from copy import copy
+import heapq
+import itertools
+import math
 import random
+import threading
 import time
 
+# 3rd party modules
+try:
+    # NumPy is optional: it is only used to draw many random values at once
+    import numpy.random
+except ImportError:
+    numpy = None
+
 # local imports
 from vmmad import log
 from vmmad.orchestrator import JobInfo
+from vmmad.scheduler import SCHEDULERS
 
 
 class UniformlyInRange(object):
@@ -41,59 +52,227 @@ class UniformlyInRange(object):
     Iterator returning an integer `x` chosen *uniformly at random*
     from the range `low <= x <= high`.  (`low` and
     `high` are constructor parameters.)
+
+    Random numbers are drawn from `rng` (a `random.Random` instance),
+    or from the global generator of module `random` if not given.
+    Method `sample` draws many values at once, using NumPy.
     """
-    def __init__(self, low, high):
+    def __init__(self, low, high, rng=None):
         assert low < high
         self.min = low
         self.max = high
+        self.rng = rng
 
     def next(self):
-        return random.randint(self.min, self.max)
+        return (self.rng or random).randint(self.min, self.max)
+
+    def sample(self, rng, size):
+        """
+        Return a NumPy array of `size` values, drawn from the
+        `numpy.random.RandomState` instance `rng`.
+        """
+        return rng.randint(self.min, self.max + 1, size)
 
 
 class NormallyDistributedInRange(object):
     """
     Iterator returning an integer chosen at random such that
     results are normally distributed.
-    
+
     Each call to the `next()` method returns a result `x` from the
     range `low <= x <= high`.  (`low` and `high` are constructor
-    parameters.)
+    parameters.)  The mean `mu` and standard deviation `sigma` are
+    given as fractions of the range width, e.g., `mu=0.5` centers
+    the distribution in the middle of the range; values falling
+    outside the range are clipped to its ends.
+
+    Random numbers are drawn from `rng` as in `UniformlyInRange`.
     """
-    def __init__(self, low, high, mu, sigma):
+    def __init__(self, low, high, mu, sigma, rng=None):
         assert low < high
         self.min = low
         self.max = high
         self.mu = mu
         self.sigma = sigma
+        self.rng = rng
+
+    def next(self):
+        x = self.min + (self.rng or random).gauss(self.mu, self.sigma)*(self.max - self.min)
+        return int(round(min(max(x, self.min), self.max)))
+
+    def sample(self, rng, size):
+        """
+        Return a NumPy array of `size` values, drawn from the
+        `numpy.random.RandomState` instance `rng`.
+        """
+        x = self.min + rng.normal(self.mu, self.sigma, size)*(self.max - self.min)
+        return x.clip(self.min, self.max).round().astype(int)
+
+
+class ExponentiallyDistributed(object):
+    """
+    Iterator returning real numbers drawn from the exponential
+    distribution with the given `mean`; e.g., the time between
+    independent random events that happen on average every `mean`
+    seconds.
+
+    Random numbers are drawn from `rng` as in `UniformlyInRange`.
+    """
+    def __init__(self, mean, rng=None):
+        assert mean > 0
+        self.mean = mean
+        self.rng = rng
 
     def next(self):
-        return self.min + random.gauss(self.mu, self.sigma)*(self.high - self.low)
+        return (self.rng or random).expovariate(1.0 / self.mean)
+
+    def sample(self, rng, size):
+        """
+        Return a NumPy array of `size` values, drawn from the
+        `numpy.random.RandomState` instance `rng`.
+        """
+        return rng.exponential(self.mean, size)
+
+
+class LogNormallyDistributed(object):
+    """
+    Iterator returning real numbers whose logarithm is normally
+    distributed with mean `log(median)` and standard deviation
+    `sigma`.  This is a common model of job run times: most jobs are
+    short, a few are very long.
+
+    Random numbers are drawn from `rng` as in `UniformlyInRange`.
+    """
+    def __init__(self, median, sigma, rng=None):
+        assert median > 0
+        self.median = median
+        self.sigma = sigma
+        self.rng = rng
+
+    def next(self):
+        return (self.rng or random).lognormvariate(math.log(self.median), self.sigma)
+
+    def sample(self, rng, size):
+        """
+        Return a NumPy array of `size` values, drawn from the
+        `numpy.random.RandomState` instance `rng`.
+        """
+        return rng.lognormal(math.log(self.median), self.sigma, size)
+
+
+class EmpiricallyDistributed(object):
+    """
+    Iterator returning real numbers distributed like a measured
+    sample, described by its `quantiles`: a sorted list of values,
+    such that the `k`-th of the `n+1` values is the `k/n`-th quantile
+    of the sample (so the first is the minimum and the last the
+    maximum).  Values are interpolated linearly between quantiles.
+
+    Random numbers are drawn from `rng` as in `UniformlyInRange`.
+    """
+    def __init__(self, quantiles, rng=None):
+        assert len(quantiles) >= 2
+        self.quantiles = list(quantiles)
+        self.rng = rng
+
+    def next(self):
+        x = (self.rng or random).random() * (len(self.quantiles) - 1)
+        k = int(x)
+        low, high = self.quantiles[k], self.quantiles[min(k+1, len(self.quantiles)-1)]
+        return low + (x - k)*(high - low)
+
+    def sample(self, rng, size):
+        """
+        Return a NumPy array of `size` values, drawn from the
+        `numpy.random.RandomState` instance `rng`.
+        """
+        # NumPy is an optional dependency: only import it when needed
+        from numpy import arange, interp
+        x = rng.uniform(0, len(self.quantiles) - 1, size)
+        return interp(x, arange(len(self.quantiles)), self.quantiles)
 
 
 class RandomJobs(object):
     """
     Mock batch system interface, simulating submission of jobs of
     random duration at a specified rate.
+
+    Jobs run on `cluster_size` cluster nodes, and on the nodes that
+    join later (see `add_node`), as decided by the `scheduler` model
+    (see `vmmad.scheduler.SCHEDULERS`); they leave the batch system
+    when their duration has elapsed since they started running.  To
+    generate large workloads, or arrivals following a daily pattern,
+    see `vmmad.batchsys.workload`.
+
+    All methods can be called from any thread.  Random values are
+    drawn with NumPy if it is installed, otherwise with module
+    `random` (so the same `seed` gives different jobs in the two
+    cases).
     """
 
-    def __init__(self, N, p, duration=(24*60*60), timer=time.time):
+    def __init__(self, N, p, duration=(24*60*60), timer=time.time, seed=None,
+                 cluster_size=0, scheduler='fifo'):
         """
         Construct a `RandomJobs` object.
 
         :param int N: The number of submission attempts per orchestrator cycle.
-        :param float p: A real number with `0 < p < 1`; expresses the probabilty that a job is submitted at each attempt.
-        :param duration: Maximum number of seconds that a job can last; otherwise this must be a an iterator that returns an integer (expressing duration in seconds) at every invocation of its `next()` method.
+        :param float p: A real number with `0 < p < 1`; a job is submitted at each attempt with probability `1 - p`.
+        :param duration: Maximum number of seconds that a job can last; otherwise this must be a an iterator that returns an integer (expressing duration in seconds) at every invocation of its `next()` method, and preferably has a `sample` method like the iterators in this module.
+        :param seed: Seed for the random number generator; with the same seed (and the same `duration` iterator), the same jobs are generated.
+        :param int cluster_size: Number of nodes available from the start.
+        :param str scheduler: Name of the scheduler model deciding which jobs run.
         """
         self.N = N
         self.p = p
-        if isinstance(duration, int):
+        if numpy is not None:
+            self._rng = numpy.random.RandomState(seed)
+        else:
+            self._rng = None
+        self._random = random.Random(seed)
+        if isinstance(duration, (int, long)):
             assert duration > 0
-            self.duration = UniformlyInRange(1, duration)
-        self.jobs = [ ]
+            self.duration = UniformlyInRange(1, duration, self._random)
+        else:
+            self.duration = duration
+        if scheduler not in SCHEDULERS:
+            raise RuntimeError("Unknown scheduler model '%s': must be one of %s"
+                               % (scheduler, str.join(', ', sorted(SCHEDULERS))))
+        self.scheduler = SCHEDULERS[scheduler]()
+        self._lock = threading.Lock()
+        # nodes are filled in the order they joined
+        self._keys = itertools.count()
+        for n in xrange(cluster_size):
+            self.add_node('clusternode-%d' % n)
+        # jobs in the batch system, and a heap of `(end time, job
+        # ID)` pairs to find quickly the running ones that terminate next
+        self.jobs = { }
+        self._ends = [ ]
         self.next_jobid = 0
         self.timer = timer
 
+
+    def add_node(self, nodename):
+        """Make node `nodename` available for running jobs."""
+        with self._lock:
+            self.scheduler.add_node(nodename, next(self._keys))
+
+    def remove_node(self, nodename):
+        """Stop running new jobs on node `nodename`."""
+        with self._lock:
+            self.scheduler.remove_node(nodename)
+
+
+    def _count(self):
+        if self._rng is not None:
+            return self._rng.binomial(self.N, 1.0 - self.p)
+        return len([ n for n in xrange(self.N) if self._random.random() > self.p ])
+
+    def _durations(self, count):
+        if self._rng is not None and hasattr(self.duration, 'sample'):
+            return self.duration.sample(self._rng, count).tolist()
+        return [ self.duration.next() for _ in xrange(count) ]
+
+
     def get_sched_info(self):
         """
         Return a list of `JobInfo` objects representing the jobs in
@@ -101,24 +280,36 @@ class RandomJobs(object):
 
         At every invocation, this method rolls a dice `N` times and
         submits a job iff the result of the dice is greater than `p`.
-        So the effective job submission rate is `N * p / (length of an
-        orchestrator cycle)`.  The values of `N` and `p` are as
-        specified to the constructor.
-    
+        So the effective job submission rate is `N * (1-p) / (length
+        of an orchestrator cycle)`.  The values of `N` and `p` are as
+        specified to the constructor.  With NumPy, the number of jobs
+        and their durations are drawn all at once.
+
         Job durations are drawn from a random distribution that can be set
         with the `duration` constructor parameter.
         """
-        # generate new jobs
-        for _ in xrange(self.N):
-            dice = random.random()
-            if dice <= self.p:
-                continue
-            self.next_jobid += 1
-            self.jobs.append(
-                JobInfo(
-                    jobid=str(self.next_jobid),
+        with self._lock:
+            now = self.timer()
+            # generate new jobs
+            for duration in self._durations(self._count()):
+                self.next_jobid += 1
+                jobid = str(self.next_jobid)
+                job = JobInfo(
+                    jobid=jobid,
                     state=JobInfo.PENDING,
-                    duration=self.duration.next(),
-                    submitted_at=self.timer(),
-                ))
-        return self.jobs
+                    duration=duration,
+                    submitted_at=now,
+                    )
+                self.jobs[jobid] = job
+                self.scheduler.submit(job)
+            # remove jobs that have terminated, freeing their slots
+            while self._ends and self._ends[0][0] <= now:
+                job = self.jobs.pop(heapq.heappop(self._ends)[1])
+                self.scheduler.remove(job)
+            # start pending jobs
+            for job, nodes in self.scheduler.schedule(now):
+                job.state = JobInfo.RUNNING
+                job.running_at = now
+                job.exec_node_name = nodes[0]
+                heapq.heappush(self._ends, (now + job.duration, job.jobid))
+            return self.jobs.values()
@@ -28,11 +28,282 @@ __version__ = '$Revision$'
 
 # stdlib imports
 import csv
+import heapq
+import itertools
+import operator
+import os
+import sys
+import tempfile
 import time
 
 # local imports
 from vmmad import log
 from vmmad.orchestrator import JobInfo
+from vmmad.util import pack_methods, unpack_methods
+
+
+def _open_trace(input_file):
+    """
+    Return a pair `(dialect, rows)`, where `rows` is a CSV reader
+    over the (already opened) `input_file`, and `dialect` is the CSV
+    dialect auto-detected from its first lines.
+    """
+    sample = input_file.read(1024)
+    input_file.seek(0)
+    dialect = csv.Sniffer().sniff(sample)
+    return dialect, csv.reader(input_file, dialect=dialect)
+
+
+def _read_trace(filename, start_time, end_time=None, sorted_within=None):
+    """
+    Iterate over the jobs in CSV file `filename` that were submitted
+    after `start_time` and not after `end_time` (if not `None`),
+    yielding tuples `(submitted_at, duration, jobid, slots)` in file
+    order.
+
+    If a valid index file (see `build_index`) exists, only the part
+    of `filename` that contains jobs in the requested time window is
+    read.  Otherwise, if `sorted_within` is not `None`, then the file
+    is assumed to be sorted by submission time, except for jobs that
+    are at most `sorted_within` rows away from their place; reading
+    then stops as soon as no more jobs can fall into the time window.
+    """
+    index = TraceIndex.load(filename)
+    with open(filename, 'rb') as input_file:
+        if index is not None:
+            dialect = index.dialect
+        else:
+            sample = input_file.read(1024)
+            input_file.seek(0)
+            dialect = csv.Sniffer().sniff(sample)
+        header = csv.reader([input_file.readline()], dialect=dialect).next()
+        jobid_col = header.index('JOBID')
+        submitted_at_col = header.index('SUBMITTED_AT')
+        duration_col = header.index('RUN_DURATION')
+        slots_col = (header.index('SLOTS') if 'SLOTS' in header else None)
+        lines = input_file
+        if index is not None:
+            start, end = index.window(start_time, end_time)
+            if start > input_file.tell():
+                input_file.seek(start)
+            lines = _lines_until(input_file, end)
+        beyond = 0
+        for row in csv.reader(lines, dialect=dialect):
+            submitted_at = float(row[submitted_at_col])
+            if end_time is not None and submitted_at > end_time:
+                if sorted_within is not None:
+                    # a job in the window cannot be more than twice
+                    # the maximum displacement after this one
+                    beyond += 1
+                    if beyond > 2*sorted_within:
+                        break
+                continue
+            if submitted_at > start_time:
+                yield (submitted_at, float(row[duration_col]), row[jobid_col],
+                       (int(row[slots_col]) if slots_col is not None else 1))
+
+
+def _lines_until(input_file, end):
+    """
+    Iterate over lines of `input_file`, stopping at byte offset `end`.
+    """
+    offset = input_file.tell()
+    while offset < end:
+        line = input_file.readline()
+        if not line:
+            break
+        offset += len(line)
+        yield line
+
+
+class TraceIndex(object):
+    """
+    Index of a CSV job history file, mapping time intervals to byte
+    ranges of the file.
+
+    The submission time axis is divided into buckets of `bucket`
+    seconds; for each bucket, the index records the offset of the
+    first line (in file order) of a job submitted in that bucket or
+    later, and the offset just past the last line of a job submitted
+    in that bucket or earlier.  The file needs not be sorted, but an
+    index of a sorted file allows reading much less data.
+
+    Indexes are created by `build_index`, and saved in a "sidecar"
+    file named after the CSV file, with ``.idx`` appended.
+    """
+
+    HEADER = '# VM-MAD job history index:'
+
+    def __init__(self, bucket, first_bucket, starts, ends, size, delimiter=','):
+        self.bucket = bucket
+        self.delimiter = delimiter
+        self.first_bucket = first_bucket
+        self.starts = starts
+        self.ends = ends
+        self.size = size
+
+
+    @staticmethod
+    def path(filename):
+        """Return the path to the index of CSV file `filename`."""
+        return filename + '.idx'
+
+
+    @staticmethod
+    def load(filename):
+        """
+        Return the index of CSV file `filename`, or `None` if there
+        is no index file or it is older than the CSV file.
+        """
+        path = TraceIndex.path(filename)
+        try:
+            stat = os.stat(filename)
+            with open(path, 'r') as index_file:
+                fields = dict(item.split('=')
+                              for item in index_file.readline()[len(TraceIndex.HEADER):].split())
+                if (int(fields['size']) != stat.st_size
+                        # allow for rounding of sub-millisecond time stamps
+                        or abs(float(fields['mtime']) - stat.st_mtime) > 1e-3):
+                    log.warning("Ignoring stale index file '%s'; run `build_index` again.", path)
+                    return None
+                starts = [ ]
+                ends = [ ]
+                first_bucket = None
+                for line in index_file:
+                    when, start, end = line.split()
+                    if first_bucket is None:
+                        first_bucket = int(when)
+                    starts.append(int(start))
+                    ends.append(int(end))
+        except (IOError, OSError):
+            return None
+        return TraceIndex(int(fields['bucket']), first_bucket, starts, ends, stat.st_size,
+                          chr(int(fields['delimiter'])))
+
+
+    @property
+    def dialect(self):
+        """CSV dialect of the indexed file."""
+        class dialect(csv.excel):
+            delimiter = self.delimiter
+        return dialect
+
+
+    def _bucket(self, when):
+        """Return the position in the index of the bucket containing time `when`."""
+        return int(when // self.bucket) - (self.first_bucket // self.bucket)
+
+
+    def window(self, start_time, end_time=None):
+        """
+        Return a pair `(start, end)` of byte offsets, such that all
+        jobs submitted after `start_time` and not after `end_time`
+        (if not `None`) lie in that range of the CSV file.
+        """
+        if not self.starts:
+            return (self.size, self.size)
+        n = len(self.starts)
+        b = self._bucket(start_time)
+        if b < 0:
+            start = 0
+        elif b < n:
+            start = self.starts[b]
+        else:
+            start = self.size
+        if end_time is None:
+            end = self.size
+        else:
+            b = self._bucket(end_time)
+            if b < 0:
+                end = 0
+            elif b < n:
+                end = self.ends[b]
+            else:
+                end = self.size
+        return (start, max(start, end))
+
+
+def build_index(filename, bucket=3600):
+    """
+    Create the index (see `TraceIndex`) of CSV job history
+    `filename`, using time buckets of `bucket` seconds.
+
+    Jobs are assumed to take one line each in the CSV file, i.e., no
+    field may contain a newline character.
+    """
+    first = { }
+    last = { }
+    with open(filename, 'rb') as input_file:
+        sample = input_file.read(1024)
+        input_file.seek(0)
+        dialect = csv.Sniffer().sniff(sample)
+        header_line = input_file.readline()
+        col = csv.reader([header_line], dialect=dialect).next().index('SUBMITTED_AT')
+        offset = len(header_line)
+        for line in input_file:
+            end = offset + len(line)
+            if line.strip():
+                row = csv.reader([line], dialect=dialect).next()
+                b = int(float(row[col]) // bucket)
+                if b not in first:
+                    first[b] = offset
+                last[b] = end
+            offset = end
+        stat = os.fstat(input_file.fileno())
+    if first:
+        buckets = range(min(first), max(first) + 1)
+    else:
+        buckets = [ ]
+    # start offset for a bucket is the minimum over this and later buckets ...
+    starts = [ ]
+    current = stat.st_size
+    for b in reversed(buckets):
+        current = min(current, first.get(b, current))
+        starts.append(current)
+    starts.reverse()
+    # ... and the end offset is the maximum over this and earlier buckets
+    ends = [ ]
+    current = len(header_line)
+    for b in buckets:
+        current = max(current, last.get(b, current))
+        ends.append(current)
+    path = TraceIndex.path(filename)
+    with open(path + '.NEW', 'w') as index_file:
+        index_file.write("%s bucket=%d size=%d mtime=%r delimiter=%d\n"
+                         % (TraceIndex.HEADER, bucket, stat.st_size, stat.st_mtime,
+                            ord(dialect.delimiter)))
+        for b, start, end in zip(buckets, starts, ends):
+            index_file.write("%d %d %d\n" % (b * bucket, start, end))
+    os.rename(path + '.NEW', path)
+    log.info("Indexed %d time buckets of file '%s' into '%s'",
+             len(buckets), filename, path)
+
+
+def _reorder(jobs, lookahead, filename):
+    """
+    Iterate over `jobs` (tuples, as yielded by `_read_trace`) in
+    order of submission time, assuming that no job is more than
+    `lookahead` positions away from its place in that order.
+    """
+    buf = [ ]
+    last = None
+    late = 0
+    for job in jobs:
+        if len(buf) < lookahead:
+            heapq.heappush(buf, job)
+            continue
+        job = heapq.heappushpop(buf, job)
+        if last is not None and job[0] < last:
+            late += 1
+        else:
+            last = job[0]
+        yield job
+    while buf:
+        yield heapq.heappop(buf)
+    if late:
+        log.warning("%d jobs in file '%s' are out of order by more than %d positions"
+                    " and have been submitted late; sort the file with `sort_trace`.",
+                    late, filename, lookahead)
 
 
 class JobsFromFile(object):
@@ -40,7 +311,8 @@ class JobsFromFile(object):
     Mock batch system interface, replaying submitted jobs info from a CSV file.
     """
 
-    def __init__(self, filename, timer=time.time, start_time=-1):
+    def __init__(self, filename, timer=time.time, start_time=-1,
+                 stream=False, lookahead=1000, end_time=None):
         """
         Construct a `JobsFromFile` object.
 
@@ -56,10 +328,27 @@ class JobsFromFile(object):
             + ``SUBMITTED_AT``: time the job was submitted, as a UNIX epoch
             + ``RUN_DURATION``: duration of the job, in seconds
 
-        Only jobs that were submitted after `start_time` are loaded;
-        if `start_time` is `None`, then all jobs are loaded and the
-        `.start_time` attribute is set to the first submitted job in
-        the list.
+          If a ``SLOTS`` column is present, it is used to set the
+          `slots` attribute of jobs; otherwise, each job uses one slot.
+
+        Only jobs that were submitted after `start_time` (and, if
+        `end_time` is not `None`, not after `end_time`) are loaded; if
+        `start_time` is `None` (or -1), then all jobs up to `end_time`
+        are loaded and the `.start_time` attribute is set to the first
+        submitted job in the list.  To avoid reading the whole file
+        when replaying only a time window of it, create an index of
+        the file with `build_index`: it will be used automatically,
+        also to continue the replay after restoring a pickled copy of
+        this object (e.g., a simulation snapshot).
+
+        By default, the whole file is loaded and sorted by submission
+        time before the replay starts.  If `stream` is `True`, then
+        the file must already be sorted by ``SUBMITTED_AT`` (but for
+        jobs that are at most `lookahead` rows away from their place)
+        and it is read as the replay proceeds, so that memory usage is
+        proportional to the number of jobs in the (simulated) batch
+        system rather than to the length of the file.  Use
+        `sort_trace` to sort a file that does not satisfy this.
 
         Passing of time is controlled via the `timer` parameter: this
         must be a callable that returns the 'current time' in UNIX
@@ -68,43 +357,114 @@ class JobsFromFile(object):
         :param str filename: The CSV file to read job history from.
         :param timer: A function returning the (possibly simulated) current time in UNIX epoch format.
         :param int start_time: Replay start time, as a UNIX epoch.
+        :param bool stream: Read the (sorted) file while replaying instead of loading it all.
+        :param int lookahead: Max displacement (in rows) of out-of-order jobs in streaming mode.
+        :param int end_time: Replay end time, as a UNIX epoch.
 
         """
         self.timer = timer
-        self.time_last_checked = 0
-        
-        # auto-detect CSV delimiter, etc.
-        with open(filename, 'r') as input_file:
-            sample = input_file.read(1024)
-            input_file.seek(0)
-            rows = csv.DictReader(input_file,
-                                  dialect = csv.Sniffer().sniff(sample))
-            # load all jobs into memory, ordered by descending
-            # submission time, so that the last item is the next job
-            # to be submitted and we can just .pop() it
-            self.future_jobs = list(
-                sorted((JobInfo(jobid=row['JOBID'],
-                                state=JobInfo.PENDING,
-                                submitted_at=float(row['SUBMITTED_AT']),
-                                duration=float(row['RUN_DURATION']))
-                        for row in rows if float(row['SUBMITTED_AT']) > start_time),
-                    # sort list of jobs by submission time
-                    cmp=(lambda x,y: cmp(x.submitted_at, y.submitted_at)),
-                    reverse=True))
-        log.info("Loaded %d jobs from file '%s'", len(self.future_jobs), filename)
-        assert (len(self.future_jobs) < 2
-                or (self.future_jobs[0].submitted_at >= self.future_jobs[1].submitted_at))
-        
+        if start_time is None:
+            start_time = -1
+        self.filename = filename
+        self._window = (start_time, end_time)
+        self._stream = stream
+        self._lookahead = lookahead
+        if stream:
+            log.info("Streaming jobs from file '%s'", filename)
+        self._source = self._open()
+        self._start(start_time)
+
+
+    def _open(self, skip=0, since=None):
+        """
+        Return an iterator over the jobs to replay, in order of
+        submission time, skipping the first `skip` ones.
+
+        If `since` is not `None`, only jobs submitted at or after
+        time `since` are returned (and skipped); if the file has an
+        index, only the part of it from there on is read.
+        """
+        start_time, end_time = self._window
+        if since is not None:
+            # `_read_trace` only returns jobs submitted strictly after this
+            start_time = max(start_time, since - 1)
+        jobs = _read_trace(self.filename, start_time, end_time,
+                           (self._lookahead if self._stream else None))
+        if self._stream:
+            # jobs are read lazily, as `get_sched_info` consumes them
+            jobs = _reorder(jobs, self._lookahead, self.filename)
+        else:
+            jobs = iter(_sorted_jobs(jobs, self.filename))
+        if since is not None:
+            jobs = itertools.ifilter(lambda job: job[0] >= since, jobs)
+        return itertools.islice(jobs, skip, None)
+
+
+    def _reopen(self):
+        """
+        Return an iterator over the jobs after `self._next`, which
+        continues the replay of a restored snapshot.
+        """
+        if self._next is None:
+            return iter([ ])
+        # start reading from the submission time of the next job,
+        # rather than reading again all the jobs submitted so far:
+        # `get_sched_info` submits all jobs up to the current time,
+        # so none of them was submitted at or after that time, and
+        # the next job is the first one to skip
+        return self._open(1, since=self._next[0])
+
+
+    def _start(self, start_time):
+        """
+        Prepare for replaying the jobs yielded by `self._source`.
+        """
+        # the next job to be submitted, or `None` when there are no more
+        self._next = next(self._source, None)
+        self.num_submitted = 0
+
         # if `start_time` has not been set, then use earliest job
         # submission time as starting point
-        if start_time == -1:
-            self.start_time = self.future_jobs[-1].submitted_at 
-        else:
+        if start_time != -1:
             self.start_time = start_time
+        elif self._next is not None:
+            self.start_time = self._next[0]
+        else:
+            log.warning("No jobs to replay; starting at time 0.")
+            self.start_time = 0
+
+        # jobs currently in the (simulated) batch system, indexed by
+        # job ID, and a heap of `(end time, job ID)` pairs to find
+        # quickly the ones that terminate next
+        self.jobs = { }
+        self._ends = [ ]
+        # jobs submitted and terminated during the last call to
+        # `get_sched_info`
+        self.submitted = [ ]
+        self.terminated = [ ]
+
+
+    def __getstate__(self):
+        # `timer` is usually a method of the simulation
+        state = pack_methods(self.__dict__)
+        # iterators cannot be pickled; `__setstate__` opens the
+        # source again, and skips the jobs that were already read
+        del state['_source']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(unpack_methods(state))
+        self._source = self._reopen()
+
+
+    @property
+    def exhausted(self):
+        """
+        `True` if all jobs in the file have already been submitted.
+        """
+        return self._next is None
 
-        # list of jobs currently in the (simulated) batch system
-        self.jobs = [ ]
-        
 
     def get_sched_info(self):
         """
@@ -112,33 +472,203 @@ class JobsFromFile(object):
         the batch queue system.
 
         Each invocation of `get_sched_info` returns the list of jobs
-        that are either running or submitted to the batch system in
-        the interval between the 'current time' (as returned by the
-        `timer` function) and the time of the previous invocation.
+        that have been submitted up to the 'current time' (as returned
+        by the `timer` function) and have not yet terminated.  Jobs
+        stay pending until they are passed to `job_started`, and
+        terminate `duration` seconds after they started running.
 
+        The cost of each invocation is proportional to the number of
+        jobs that have been submitted or have terminated since the
+        previous one (times a logarithmic factor), plus the cost of
+        building the returned list.  These jobs are also available,
+        until the next invocation, in the `submitted` and `terminated`
+        attributes (a job submitted and terminated in the same
+        interval is in both lists).
         """
         now = self.timer()
         # add jobs that were submitted since last check
-        for job in self.next_jobs(self.time_last_checked, now):
-            self.jobs.append(job)
-        self.time_last_checked = now
+        ends = self._ends
+        self.submitted = [ ]
+        while self._next is not None and self._next[0] <= now:
+            submitted_at, duration, jobid, slots = self._next
+            if jobid in self.jobs:
+                jobid = self._unique(jobid)
+            job = JobInfo(jobid=jobid,
+                          state=JobInfo.PENDING,
+                          submitted_at=submitted_at,
+                          duration=duration,
+                          slots=slots)
+            self.jobs[jobid] = job
+            self.submitted.append(job)
+            self.num_submitted += 1
+            self._next = next(self._source, None)
         # remove jobs that have terminated since
-        for i, job in enumerate(self.jobs):
-            if job.submitted_at + job.duration < now:
-                del self.jobs[i]
-        return self.jobs
-
-    def next_jobs(self, since, until):
-        assert until > since
-        while len(self.future_jobs) > 0:
-            job = self.future_jobs.pop()
-            if until >= job.submitted_at:
-                if job.submitted_at >= since:
-                    yield job
-                else:
-                    # job is in the past (relative to the Simulator's concept of time) so ignore it
-                    pass
-            else:
-                # job is in the future: put it back for next round
-                self.future_jobs.append(job)
-                raise StopIteration
+        self.terminated = [ ]
+        while ends and ends[0][0] <= now:
+            job = self.jobs.pop(heapq.heappop(ends)[1], None)
+            if job is not None:
+                self.terminated.append(job)
+        return self.jobs.values()
+
+
+    def job_started(self, job):
+        """
+        Record that `job` started running at time `job.running_at`;
+        it will terminate `job.duration` seconds later.
+
+        This is called by the (simulated) scheduler that runs the
+        jobs: a job that waits longer than its duration for free
+        slots must still run to completion.
+        """
+        heapq.heappush(self._ends, (job.running_at + job.duration, job.jobid))
+
+
+    def _unique(self, jobid):
+        """
+        Return a job ID, derived from `jobid`, that is not used by any
+        job in the (simulated) batch system.
+
+        Job histories may list the same job ID several times (e.g.,
+        the tasks of an array job, in accounting data distilled by
+        `vmmad.distil`); those jobs get IDs like the ones GridEngine
+        gives to array tasks.
+        """
+        n = 1
+        while ("%s.%d" % (jobid, n)) in self.jobs:
+            n += 1
+        log.debug("Job ID '%s' is already in use; replaying job as '%s.%d'", jobid, jobid, n)
+        return ("%s.%d" % (jobid, n))
+
+
+    def next_event_time(self):
+        """
+        Return the time of the next job submission or termination, or
+        `None` if there are no more jobs.
+        """
+        if self._next is None:
+            if self._ends:
+                return self._ends[0][0]
+            return None
+        if self._ends:
+            return min(self._next[0], self._ends[0][0])
+        return self._next[0]
+
+
+def _sorted_jobs(jobs, filename):
+    # keep only the needed data in memory, as compact tuples;
+    # `JobInfo` objects are only created when the job is submitted
+    jobs = sorted(jobs, key=operator.itemgetter(0))
+    log.info("Loaded %d jobs from file '%s'", len(jobs), filename)
+    return jobs
+
+
+def load_jobs(filename, start_time=-1, end_time=None):
+    """
+    Return the list of jobs in CSV file `filename` that were
+    submitted after `start_time` (and not after `end_time`, if this
+    is not `None`), sorted by submission time.
+
+    Each job is represented by a tuple `(submitted_at, duration,
+    jobid, slots)`; the list can be replayed any number of times
+    with `JobsFromList`.
+    """
+    if start_time is None:
+        start_time = -1
+    return _sorted_jobs(_read_trace(filename, start_time, end_time), filename)
+
+
+class JobsFromList(JobsFromFile):
+    """
+    Mock batch system interface, replaying jobs from a list.
+
+    This works exactly like `JobsFromFile` (which see), but takes the
+    jobs from a list as returned by `load_jobs` instead of reading a
+    file.  The list is never modified, so it can be shared by any
+    number of `JobsFromList` instances; in particular, by simulations
+    running in processes forked after the list has been loaded.
+    """
+
+    def __init__(self, jobs, timer=time.time, start_time=-1):
+        self.timer = timer
+        if start_time is None:
+            start_time = -1
+        self._jobs = jobs
+        self._start_after = start_time
+        self._source = self._open()
+        self._start(start_time)
+
+
+    def _open(self, skip=0):
+        start_time = self._start_after
+        return itertools.islice(
+            itertools.dropwhile(lambda job: job[0] <= start_time, self._jobs), skip, None)
+
+
+    def _reopen(self):
+        # `_start` has read one job more than those submitted
+        return self._open(self.num_submitted + 1)
+
+
+def _sort_keys(rows, col, n):
+    for i, row in enumerate(rows):
+        yield (float(row[col]), n, i, row)
+
+
+def sort_trace(input_path, output_path, chunk_size=1000000, tmpdir=None):
+    """
+    Sort CSV job history `input_path` by submission time, and write
+    the result into `output_path`, so that it can be replayed by
+    `JobsFromFile` in streaming mode.
+
+    The input file can be larger than the available memory: it is
+    read in chunks of `chunk_size` rows, each of which is sorted and
+    saved in a temporary file in directory `tmpdir`; the chunks are
+    then merged into the output file.  Jobs with the same submission
+    time are kept in the original order.
+    """
+    chunks = [ ]
+    streams = [ ]
+    try:
+        with open(input_path, 'rb') as input_file:
+            dialect, rows = _open_trace(input_file)
+            header = rows.next()
+            col = header.index('SUBMITTED_AT')
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                chunk.sort(key=lambda row: float(row[col]))
+                fd, path = tempfile.mkstemp(prefix='trace.', suffix='.csv', dir=tmpdir)
+                chunks.append(path)
+                with os.fdopen(fd, 'wb') as output:
+                    csv.writer(output, dialect=dialect).writerows(chunk)
+        log.info("Merging %d sorted chunks of file '%s' ...", len(chunks), input_path)
+        for path in chunks:
+            streams.append(open(path, 'rb'))
+        merged = heapq.merge(*[ _sort_keys(csv.reader(stream, dialect=dialect), col, n)
+                                for n, stream in enumerate(streams) ])
+        with open(output_path, 'wb') as output:
+            writer = csv.writer(output, dialect=dialect)
+            writer.writerow(header)
+            writer.writerows(row for _, _, _, row in merged)
+    finally:
+        for stream in streams:
+            stream.close()
+        for path in chunks:
+            os.remove(path)
+
+
+## main: sort or index a trace file
+
+if "__main__" == __name__:
+    if len(sys.argv) == 4 and sys.argv[1] == 'sort':
+        sort_trace(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == 'index':
+        build_index(sys.argv[2], *[int(arg) for arg in sys.argv[3:]])
+    else:
+        sys.stderr.write("Usage: %s sort INPUT OUTPUT\n"
+                         "       %s index INPUT [BUCKET]\n"
+                         "Sort CSV job history INPUT by submission time into file OUTPUT,\n"
+                         "or index it with time buckets of BUCKET seconds (default: 3600).\n"
+                         % (sys.argv[0], sys.argv[0]))
+        sys.exit(1)
@@ -0,0 +1,356 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compact binary job history files, and a mock batch system interface
+replaying them.
+
+A trace file holds the same data as the CSV files read by
+`vmmad.batchsys.replay.JobsFromFile`, as fixed-width binary columns
+sorted by submission time.  Trace files are memory-mapped when read:
+no parsing is needed, and all processes replaying the same trace
+share a single copy of it in the OS page cache.
+
+Run this module as a script to convert a CSV file into a trace file::
+
+  python -m vmmad.batchsys.trace accounting.csv accounting.trace
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+from array import array
+import mmap
+import os
+import struct
+import sys
+import time
+
+# local imports
+from vmmad import log
+from vmmad.batchsys.replay import JobsFromFile, _open_trace
+
+
+MAGIC = 'VMMADTRC'
+VERSION = 1
+
+# file header: magic, format version, width of the JOBID column,
+# number of jobs; padded to 64 bytes
+_HEADER = struct.Struct('<8sIIQ')
+_HEADER_SIZE = 64
+
+_DOUBLE = struct.Struct('<d')
+_INT = struct.Struct('<i')
+
+
+def _pad8(size):
+    return (size + 7) & ~7
+
+
+def is_trace_file(path):
+    """
+    Return `True` if `path` is a trace file (as opposed to, e.g., a
+    CSV file).
+    """
+    with open(path, 'rb') as input_file:
+        return input_file.read(len(MAGIC)) == MAGIC
+
+
+def convert_csv(input_path, output_path):
+    """
+    Convert CSV job history `input_path` into trace file `output_path`.
+
+    The CSV file must have the format described in
+    `vmmad.batchsys.replay.JobsFromFile`; in addition to the
+    mandatory ``JOBID``, ``SUBMITTED_AT`` and ``RUN_DURATION``
+    columns, the ``RUNNING_AT`` and ``SLOTS`` columns are stored too,
+    if present.  Missing start times are stored as NaN, missing slot
+    counts as 1.
+
+    Return the number of jobs written.
+    """
+    submitted_at = array('d')
+    running_at = array('d')
+    duration = array('d')
+    slots = array('i')
+    jobids = [ ]
+    nan = float('nan')
+    with open(input_path, 'rb') as input_file:
+        dialect, rows = _open_trace(input_file)
+        header = rows.next()
+        jobid_col = header.index('JOBID')
+        submitted_at_col = header.index('SUBMITTED_AT')
+        duration_col = header.index('RUN_DURATION')
+        running_at_col = (header.index('RUNNING_AT') if 'RUNNING_AT' in header else None)
+        slots_col = (header.index('SLOTS') if 'SLOTS' in header else None)
+        for row in rows:
+            jobids.append(row[jobid_col])
+            submitted_at.append(float(row[submitted_at_col]))
+            duration.append(float(row[duration_col]))
+            if running_at_col is not None and row[running_at_col]:
+                running_at.append(float(row[running_at_col]))
+            else:
+                running_at.append(nan)
+            if slots_col is not None and row[slots_col]:
+                slots.append(int(row[slots_col]))
+            else:
+                slots.append(1)
+    num_jobs = _write(output_path, submitted_at, running_at, duration, slots, jobids)
+    log.info("Converted %d jobs from file '%s' into trace file '%s'",
+             num_jobs, input_path, output_path)
+    return num_jobs
+
+
+def write_trace(output_path, jobs):
+    """
+    Write `jobs` into trace file `output_path`.
+
+    Argument `jobs` is a sequence of tuples `(submitted_at, duration,
+    jobid, slots)`, as returned by `vmmad.batchsys.replay.load_jobs`,
+    in any order; start times are stored as NaN.  Return the number
+    of jobs written.
+    """
+    submitted_at = array('d')
+    duration = array('d')
+    slots = array('i')
+    jobids = [ ]
+    for job in jobs:
+        submitted_at.append(job[0])
+        duration.append(job[1])
+        jobids.append(job[2])
+        slots.append(job[3])
+    running_at = array('d', [float('nan')]) * len(jobids)
+    num_jobs = _write(output_path, submitted_at, running_at, duration, slots, jobids)
+    log.info("Written %d jobs into trace file '%s'", num_jobs, output_path)
+    return num_jobs
+
+
+def _write(output_path, submitted_at, running_at, duration, slots, jobids):
+    num_jobs = len(jobids)
+
+    # sort all columns by submission time (keeping ties in given order)
+    order = sorted(xrange(num_jobs), key=submitted_at.__getitem__)
+    columns = [ array(column.typecode, (column[i] for i in order))
+                for column in (submitted_at, running_at, duration, slots) ]
+    width = max([1] + [ len(jobid) for jobid in jobids ])
+    jobids = str.join('', (jobids[i].ljust(width, '\0') for i in order))
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+
+    path_new = output_path + '.NEW'
+    with open(path_new, 'wb') as output:
+        output.write(_HEADER.pack(MAGIC, VERSION, width, num_jobs)
+                     .ljust(_HEADER_SIZE, '\0'))
+        for column in columns:
+            data = column.tostring()
+            output.write(data.ljust(_pad8(len(data)), '\0'))
+        output.write(jobids)
+    os.rename(path_new, output_path)
+    return num_jobs
+
+
+class TraceFile(object):
+    """
+    Read-only, memory-mapped access to a trace file.
+
+    Jobs are identified by their index in the file, from 0 to
+    ``len(trace)-1``, in order of submission time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as input_file:
+            self._map = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.jobid_width, self.num_jobs = \
+            _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise RuntimeError("File '%s' is not a VM-MAD trace file" % path)
+        if version != VERSION:
+            raise RuntimeError("Unsupported version %d of trace file '%s'"
+                               % (version, path))
+        # offsets of the columns
+        n = self.num_jobs
+        self._submitted_at = _HEADER_SIZE
+        self._running_at = self._submitted_at + 8*n
+        self._duration = self._running_at + 8*n
+        self._slots = self._duration + 8*n
+        self._jobid = self._slots + _pad8(4*n)
+        if len(self._map) < self._jobid + self.jobid_width*n:
+            raise RuntimeError("Trace file '%s' is truncated" % path)
+
+
+    def __getstate__(self):
+        # memory maps cannot be pickled: map the file again
+        return dict(path=self.path)
+
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+
+    def __len__(self):
+        return self.num_jobs
+
+
+    def close(self):
+        self._map.close()
+
+
+    def submitted_at(self, i):
+        """Return the submission time of the `i`-th job."""
+        return _DOUBLE.unpack_from(self._map, self._submitted_at + 8*i)[0]
+
+    def running_at(self, i):
+        """Return the recorded start time of the `i`-th job (NaN if unknown)."""
+        return _DOUBLE.unpack_from(self._map, self._running_at + 8*i)[0]
+
+    def run_duration(self, i):
+        """Return the run time (in seconds) of the `i`-th job."""
+        return _DOUBLE.unpack_from(self._map, self._duration + 8*i)[0]
+
+    def slots(self, i):
+        """Return the number of slots used by the `i`-th job."""
+        return _INT.unpack_from(self._map, self._slots + 4*i)[0]
+
+    def jobid(self, i):
+        """Return the job ID of the `i`-th job."""
+        start = self._jobid + self.jobid_width*i
+        return self._map[start:start+self.jobid_width].rstrip('\0')
+
+
+    def read(self, start, count):
+        """
+        Return data about `count` consecutive jobs, starting with the
+        one at index `start`, as a list of `(submitted_at,
+        run_duration, jobid, slots)` tuples.
+
+        This is much faster than calling the single-value accessors
+        for each job.
+        """
+        count = max(0, min(count, self.num_jobs - start))
+        doubles = struct.Struct('<%dd' % count)
+        submitted_at = doubles.unpack_from(self._map, self._submitted_at + 8*start)
+        duration = doubles.unpack_from(self._map, self._duration + 8*start)
+        slots = struct.unpack_from('<%di' % count, self._map, self._slots + 4*start)
+        width = self.jobid_width
+        first = self._jobid + width*start
+        data = self._map[first:first + width*count]
+        jobids = [ data[i:i+width].rstrip('\0') for i in xrange(0, len(data), width) ]
+        return zip(submitted_at, duration, jobids, slots)
+
+
+    def raw(self, column, start, count):
+        """
+        Return the raw data of `count` consecutive values of `column`
+        (one of ``submitted_at``, ``running_at``, ``run_duration``,
+        ``slots`` or ``jobid``), starting with the job at index
+        `start`, as a string.
+
+        Times are little-endian 64-bit floats, slots are
+        little-endian 32-bit integers, and job IDs are NUL-padded to
+        ``self.jobid_width`` bytes.  This is meant for bulk loading
+        into arrays, e.g., with `array.array.fromstring` or
+        `numpy.frombuffer`.
+        """
+        offset, size = {
+            'submitted_at': (self._submitted_at, 8),
+            'running_at':   (self._running_at, 8),
+            'run_duration': (self._duration, 8),
+            'slots':        (self._slots, 4),
+            'jobid':        (self._jobid, self.jobid_width),
+            }[column]
+        count = max(0, min(count, self.num_jobs - start))
+        return self._map[offset + size*start:offset + size*(start + count)]
+
+
+    def find(self, when):
+        """
+        Return the index of the first job submitted after time `when`
+        (or ``len(self)`` if there is none).
+        """
+        lo, hi = 0, self.num_jobs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.submitted_at(mid) <= when:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class JobsFromTrace(JobsFromFile):
+    """
+    Mock batch system interface, replaying jobs from a trace file.
+
+    This works exactly like `vmmad.batchsys.replay.JobsFromFile`
+    (which see), but reads a trace file created by `convert_csv`
+    instead of a CSV file.  Replaying a time window of the trace
+    (see the `start_time` and `end_time` parameters) only costs time
+    proportional to the number of jobs in it.  Memory usage is proportional to the
+    number of jobs in the (simulated) batch system.
+    """
+
+    def __init__(self, filename, timer=time.time, start_time=-1, end_time=None):
+        self.timer = timer
+        if start_time is None:
+            start_time = -1
+        self.trace = TraceFile(filename)
+        # no index is needed: a binary search on the submission time
+        # column finds the first and last job of the window
+        first = self.trace.find(start_time)
+        if end_time is None:
+            last = len(self.trace)
+        else:
+            last = self.trace.find(end_time)
+        log.info("Replaying %d jobs from trace file '%s'",
+                 max(0, last - first), filename)
+        self._range = (first, last)
+        self._source = self._open()
+        self._start(start_time)
+
+
+    def _open(self, skip=0):
+        first, last = self._range
+        return self._read(min(first + skip, last), last)
+
+
+    def _reopen(self):
+        # jobs are found by position in the trace, which costs nothing
+        return self._open(self.num_submitted + 1)
+
+
+    def _read(self, first, last, chunk=4096):
+        for start in xrange(first, last, chunk):
+            for job in self.trace.read(start, min(chunk, last - start)):
+                yield job
+
+
+## main: convert a CSV file
+
+if "__main__" == __name__:
+    if len(sys.argv) != 3:
+        sys.stderr.write("Usage: %s INPUT OUTPUT\n"
+                         "Convert CSV job history INPUT into trace file OUTPUT.\n"
+                         % sys.argv[0])
+        sys.exit(1)
+    convert_csv(sys.argv[1], sys.argv[2])
@@ -0,0 +1,408 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generate synthetic workloads, and a mock batch system interface
+replaying them.
+
+Jobs arrive as a Poisson process, optionally in bursts and with a
+rate that varies with the time of day; their durations are drawn
+from any of the distributions in `vmmad.batchsys.randomjobs`.  Jobs
+are generated in large batches with NumPy, so that millions of them
+can be generated in seconds.  Generation is reproducible: the same
+parameters and seed always give the same jobs.
+
+A workload model (average rate, weekly arrival profile, bursts and
+duration distribution) can be fitted to a job history with
+`fit_model`, saved into a compact JSON file, and used to generate
+any amount of statistically similar jobs with `Workload.from_model`.
+
+Run this module as a script to write a workload into a CSV or trace
+file, for use with `vmmad.simul` or `vmmad.sweep`, e.g.::
+
+  python -m vmmad.batchsys.workload --rate 0.1 --count 1000000 jobs.trace
+
+or to fit a model to a (distilled) job history, and generate jobs at
+10 times its rate::
+
+  python -m vmmad.batchsys.workload --fit accounting.csv model.json
+  python -m vmmad.batchsys.workload --model model.json --scale 10 \
+      --count 1000000 jobs.trace
+
+This module requires NumPy (install VM-MAD with the ``fastsim``
+extra).
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+
+# 3rd party modules
+import numpy as np
+
+# local imports
+from vmmad import log
+from vmmad.batchsys.randomjobs import \
+     EmpiricallyDistributed, ExponentiallyDistributed, LogNormallyDistributed
+from vmmad.batchsys.replay import JobsFromFile
+from vmmad.batchsys.trace import write_trace
+
+
+class Workload(object):
+    """
+    A synthetic workload: an endless, reproducible sequence of jobs.
+
+    Jobs are submitted from time `start_time` on, at an average
+    `rate` (jobs per second), and their durations are drawn from
+    distribution `duration`, which can be any object with a
+    `sample(rng, size)` method, like the iterators in
+    `vmmad.batchsys.randomjobs`.
+
+    If `burst_size` is larger than 1, then jobs are submitted in
+    bursts of geometrically-distributed size with that mean, all the
+    jobs in a burst at the same time; bursts arrive as a Poisson
+    process of rate `rate/burst_size`.
+
+    If `profile` is given, it must be a sequence of 24 numbers (one
+    per hour of the UTC day) or 168 numbers (one per hour of the
+    week, starting on Monday at 00:00 UTC): the arrival rate during
+    each hour is then proportional to the corresponding number, and
+    `rate` is the average over the whole day or week.
+
+    Jobs are generated `chunk` at a time; the sequence only depends
+    on the parameters and the `seed`.
+    """
+
+    def __init__(self, rate, duration, start_time=0, burst_size=1, profile=None,
+                 seed=None, chunk=65536):
+        assert rate > 0
+        assert burst_size >= 1
+        self.rate = rate
+        self.duration = duration
+        self.start_time = start_time
+        self.burst_size = burst_size
+        if profile is not None:
+            profile = np.asarray(profile, dtype=float)
+            if len(profile) not in (24, 168) or profile.min() < 0 or profile.max() <= 0:
+                raise RuntimeError("The arrival profile must list 24 or 168 non-negative"
+                                   " rates, not all zero.")
+            # scale so that the average over the day (or week) is 1
+            self.profile = profile / profile.mean()
+        else:
+            self.profile = None
+        self.seed = seed
+        self.chunk = chunk
+
+
+    @staticmethod
+    def from_model(model, scale=1.0, start_time=0, seed=None):
+        """
+        Return a `Workload` generating jobs like those described by
+        `model` (as returned by `fit_model` or `load_model`), but
+        submitted `scale` times as often.
+        """
+        return Workload(model['rate'] * scale,
+                        EmpiricallyDistributed(model['duration']['quantiles']),
+                        start_time, model['burst_size'], model['profile'], seed)
+
+
+    def chunks(self):
+        """
+        Iterate over the workload in chunks, each a triple of NumPy
+        arrays `(submitted_at, duration, jobid)`; jobs are sorted by
+        submission time, and job IDs are consecutive integers
+        starting at 1.
+        """
+        rng = np.random.RandomState(self.seed)
+        if self.profile is not None:
+            peak = self.profile.max()
+        else:
+            peak = 1.0
+        # bursts arrive at the peak rate, and the ones falling at
+        # quieter times are then discarded ("thinning")
+        burst_rate = self.rate * peak / self.burst_size
+        last = float(self.start_time)
+        next_jobid = 1
+        while True:
+            arrivals = last + np.cumsum(rng.exponential(1.0 / burst_rate, self.chunk))
+            last = arrivals[-1]
+            if self.profile is not None:
+                hour = _hour_of_week(arrivals) % len(self.profile)
+                keep = rng.uniform(0, peak, self.chunk) < self.profile[hour]
+                arrivals = arrivals[keep]
+            if self.burst_size > 1:
+                arrivals = np.repeat(arrivals, rng.geometric(1.0 / self.burst_size, len(arrivals)))
+            count = len(arrivals)
+            durations = np.asarray(self.duration.sample(rng, count), dtype=float)
+            yield arrivals, durations, np.arange(next_jobid, next_jobid + count)
+            next_jobid += count
+
+
+    def arrays(self, count=None, end_time=None):
+        """
+        Return the first `count` jobs of the workload, or those
+        submitted not after `end_time` (at least one of the two must
+        be given), as a triple of NumPy arrays `(submitted_at,
+        duration, jobid)`; this can be passed directly to
+        `vmmad.fastsim.simulate`.
+        """
+        if count is None and end_time is None:
+            raise RuntimeError("Cannot generate an infinite workload:"
+                               " give the number of jobs or an end time.")
+        parts = [ ]
+        total = 0
+        for submitted_at, duration, jobid in self.chunks():
+            n = len(submitted_at)
+            if end_time is not None:
+                n = np.searchsorted(submitted_at, end_time, 'right')
+            if count is not None:
+                n = min(n, count - total)
+            parts.append((submitted_at[:n], duration[:n], jobid[:n]))
+            total += n
+            if n < len(submitted_at) or total == count:
+                break
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+    def __iter__(self):
+        """
+        Iterate over the jobs in the workload, as tuples
+        `(submitted_at, duration, jobid, slots)` like those returned by
+        `vmmad.batchsys.replay.load_jobs`.
+        """
+        for submitted_at, duration, jobid in self.chunks():
+            for job in itertools.izip(submitted_at.tolist(), duration.tolist(),
+                                      (str(n) for n in jobid), itertools.repeat(1)):
+                yield job
+
+
+    def write_csv(self, output_file, count=None, end_time=None):
+        """
+        Write jobs into file-like object `output_file`, in the CSV
+        format read by `vmmad.batchsys.replay.JobsFromFile`; arguments
+        `count` and `end_time` are as in `arrays`.
+        """
+        submitted_at, duration, jobid = self.arrays(count, end_time)
+        writer = csv.writer(output_file)
+        writer.writerow(['JOBID', 'SUBMITTED_AT', 'RUN_DURATION'])
+        writer.writerows(itertools.izip(jobid.tolist(), submitted_at.tolist(),
+                                        duration.tolist()))
+        return len(jobid)
+
+
+    def write_trace(self, output_path, count=None, end_time=None):
+        """
+        Write jobs into trace file `output_path` (see
+        `vmmad.batchsys.trace`); arguments `count` and `end_time` are
+        as in `arrays`.
+        """
+        submitted_at, duration, jobid = self.arrays(count, end_time)
+        return write_trace(output_path,
+                           itertools.izip(submitted_at.tolist(), duration.tolist(),
+                                          (str(n) for n in jobid), itertools.repeat(1)))
+
+
+class JobsFromWorkload(JobsFromFile):
+    """
+    Mock batch system interface, submitting the jobs of a `Workload`.
+
+    This works exactly like `vmmad.batchsys.replay.JobsFromFile`
+    (which see), but jobs are generated as the replay proceeds
+    instead of being read from a file.  Jobs submitted after
+    `end_time` are discarded; if `end_time` is `None`, then jobs are
+    submitted forever.  As in `JobsFromFile`, jobs stay pending until
+    they are passed to `job_started`, and terminate `duration`
+    seconds later.
+    """
+
+    def __init__(self, workload, timer=time.time, end_time=None):
+        self.timer = timer
+        self.workload = workload
+        self.end_time = end_time
+        self._source = self._open()
+        self._start(workload.start_time)
+
+
+    def _open(self, skip=0):
+        jobs = iter(self.workload)
+        if self.end_time is not None:
+            end_time = self.end_time
+            jobs = itertools.takewhile(lambda job: job[0] <= end_time, jobs)
+        return itertools.islice(jobs, skip, None)
+
+
+    def _reopen(self):
+        # the workload is generated again from the start, since it
+        # only depends on its parameters; `_start` has read one job
+        # more than those submitted
+        return self._open(self.num_submitted + 1)
+
+
+def _hour_of_week(t):
+    """
+    Return the hour of the week (0 to 167, starting on Monday at
+    00:00 UTC) of the times in array `t`.
+    """
+    # the UNIX epoch was a Thursday
+    return (((t // 3600) + 3*24) % 168).astype(int)
+
+
+def fit_model(submitted_at, duration, num_quantiles=100):
+    """
+    Return a workload model fitted to the jobs described by arrays
+    `submitted_at` and `duration` (e.g., as returned by
+    `vmmad.fastsim.load_arrays`), as a dictionary with keys:
+
+    ==============  ==========================================================
+    key             meaning
+    ==============  ==========================================================
+    rate            average number of jobs submitted per second
+    profile         relative arrival rate for each of the 168 hours of
+                    the week, or the 24 hours of the day if the history
+                    does not cover a full week, or `None` if it does not
+                    cover a full day
+    burst_size      average number of jobs submitted at the same time
+    duration        dictionary with the `num_quantiles`+1 `quantiles` of
+                    the job durations (see
+                    `vmmad.batchsys.randomjobs.EmpiricallyDistributed`),
+                    and their `mean`
+    jobs, start,    number of jobs, and time span of the history
+    end
+    ==============  ==========================================================
+
+    The arrival rate of each hour is the number of jobs submitted
+    in it divided by how long the history covers it.
+    """
+    submitted_at = np.asarray(submitted_at, dtype=float)
+    duration = np.asarray(duration, dtype=float)
+    start, end = submitted_at.min(), submitted_at.max()
+    if end <= start:
+        raise RuntimeError("Cannot fit a workload model to jobs all submitted at the same time.")
+    # how long each hour of the week is covered by the history
+    hours = np.arange(start // 3600, end // 3600 + 1) * 3600
+    covered = np.minimum(hours + 3600, end) - np.maximum(hours, start)
+    exposure = np.bincount(_hour_of_week(hours), weights=covered, minlength=168)
+    counts = np.bincount(_hour_of_week(submitted_at), minlength=168).astype(float)
+    if not exposure.all():
+        # fold the week onto a day
+        exposure = exposure.reshape((7, 24)).sum(axis=0)
+        counts = counts.reshape((7, 24)).sum(axis=0)
+    if exposure.all():
+        rates = counts / exposure
+        rate = rates.mean()
+        profile = (rates / rate).tolist()
+    else:
+        rate = len(submitted_at) / (end - start)
+        profile = None
+    probs = np.linspace(0, 100, num_quantiles + 1)
+    return dict(
+        rate=float(rate),
+        profile=profile,
+        burst_size=float(len(submitted_at)) / len(np.unique(submitted_at)),
+        duration=dict(
+            quantiles=np.percentile(duration, probs).tolist(),
+            mean=float(duration.mean()),
+            ),
+        jobs=len(submitted_at),
+        start=float(start),
+        end=float(end),
+        )
+
+
+def save_model(model, path):
+    """Save workload `model` into file `path`, in JSON format."""
+    with open(path, 'w') as output:
+        json.dump(model, output, indent=1, sort_keys=True)
+        output.write('\n')
+
+
+def load_model(path):
+    """Return the workload model saved into file `path` by `save_model`."""
+    with open(path, 'r') as input_file:
+        return json.load(input_file)
+
+
+def _duration(spec):
+    """
+    Return a duration distribution from the command-line
+    specification `spec`: ``exp:MEAN`` or ``lognormal:MEDIAN:SIGMA``.
+    """
+    kind, _, args = spec.partition(':')
+    args = [ float(arg) for arg in args.split(':') if arg ]
+    if kind == 'exp' and len(args) == 1:
+        return ExponentiallyDistributed(*args)
+    if kind == 'lognormal' and len(args) == 2:
+        return LogNormallyDistributed(*args)
+    raise argparse.ArgumentTypeError(
+        "Invalid duration distribution '%s': use 'exp:MEAN' or 'lognormal:MEDIAN:SIGMA'" % spec)
+
+
+## main: write a workload to file
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic workload and write it into a CSV or trace file.")
+    parser.add_argument('output', metavar='OUTPUT', help="Output file; it is a trace file (see `vmmad.batchsys.trace`) if the name ends in '.trace', a CSV file otherwise.")
+    parser.add_argument('--fit', metavar='HISTORY', default=None, help="Fit a workload model to the CSV or trace file HISTORY, and save it into OUTPUT; no jobs are generated.")
+    parser.add_argument('--model', '-m', metavar='MODEL', default=None, help="Generate jobs from the workload model saved into file MODEL (by --fit); options --rate, --duration, --burst-size and --profile are then ignored.")
+    parser.add_argument('--scale', metavar='NUM', type=float, default=1.0, help="Multiply the submission rate of the model by this factor; default: %(default)s")
+    parser.add_argument('--rate', '-r', metavar='JOBS_PER_SEC', type=float, default=None, help="Average job submission rate.")
+    parser.add_argument('--count', '-n', metavar='N', type=int, default=None, help="Number of jobs to generate.")
+    parser.add_argument('--duration', '-d', metavar='DIST', type=_duration, default=ExponentiallyDistributed(3600), help="Distribution of job durations (in seconds): 'exp:MEAN' or 'lognormal:MEDIAN:SIGMA'; default: exp:3600")
+    parser.add_argument('--start-time', '-stime', metavar='EPOCH', type=float, default=0, help="Time of the first submission, as a UNIX epoch; default: %(default)s")
+    parser.add_argument('--end-time', '-etime', metavar='EPOCH', type=float, default=None, help="Only generate jobs submitted until this time.")
+    parser.add_argument('--burst-size', '-b', metavar='NUM', type=float, default=1, help="Average number of jobs submitted together; default: %(default)s")
+    parser.add_argument('--profile', metavar='RATES', default=None, type=(lambda spec: [ float(x) for x in spec.split(',') ]), help="Comma-separated list of 24 (or 168) relative submission rates, one per hour of the (UTC) day (or week, starting on Monday).")
+    parser.add_argument('--seed', '-s', metavar='NUM', type=int, default=None, help="Seed for the random number generator.")
+    parser.add_argument('--version', '-V', action='version',
+                        version=("%(prog)s version " + __version__))
+    args = parser.parse_args()
+    if args.fit is not None:
+        # NumPy is needed anyway, so importing `fastsim` costs nothing
+        from vmmad.fastsim import load_arrays
+        submitted_at, duration, _ = load_arrays(args.fit)
+        model = fit_model(submitted_at, duration)
+        save_model(model, args.output)
+        log.info("Fitted model to %d jobs: %.4f jobs/s on average, %.1f jobs per burst",
+                 model['jobs'], model['rate'], model['burst_size'])
+        sys.exit(0)
+    if args.count is None and args.end_time is None:
+        parser.error("At least one of --count and --end-time must be given.")
+    if args.model is not None:
+        workload = Workload.from_model(load_model(args.model), args.scale,
+                                       args.start_time, args.seed)
+    elif args.rate is not None:
+        workload = Workload(args.rate * args.scale, args.duration, args.start_time,
+                            args.burst_size, args.profile, args.seed)
+    else:
+        parser.error("One of --rate and --model must be given.")
+    if args.output.endswith('.trace'):
+        workload.write_trace(args.output, args.count, args.end_time)
+    else:
+        with open(args.output, 'wb') as output:
+            workload.write_csv(output, args.count, args.end_time)
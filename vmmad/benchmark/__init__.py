@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Synthetic input generators and micro-benchmarks for VM-MAD components.
+
+Each module in this package can be run as a script, e.g.::
+
+  python -m vmmad.benchmark.qstat --help
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import time
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Call `fn` with the given arguments and return a pair `(result,
+    elapsed)`, where `elapsed` is the wall-clock time (in seconds)
+    taken by the call.
+    """
+    t0 = time.time()
+    result = fn(*args, **kwargs)
+    return result, (time.time() - t0)
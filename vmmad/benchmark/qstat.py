@@ -0,0 +1,421 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generate synthetic ``qstat -xml`` output and benchmark the GridEngine
+parsers on it.
+
+Run this module as a script to compare the throughput of the
+`iterparse`-based parser used by `GridEngine.parse_qstat_xml_output` with
+the SAX-based reference implementation::
+
+  python -m vmmad.benchmark.qstat --jobs 1000 10000 100000
+
+With option ``--timestamps``, compare instead the cost of converting
+the time stamps found in the synthetic documents with
+`vmmad.util.TimestampConverter` and with plain `time.strptime`.
+
+With option ``--text``, compare parsing the XML and the plain-text
+listings of the same synthetic queue; with option ``--qstat``, time
+instead the actual ``qstat`` command (in both formats) on the local
+Grid Engine cluster.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import argparse
+import cStringIO as StringIO
+import random
+import re
+import sys
+import time
+
+# local imports
+from vmmad.batchsys.gridengine import GridEngine
+from vmmad.benchmark import timed
+from vmmad.util import TimestampConverter
+
+
+_RUNNING_JOB = """\
+      <job_list state="running">
+        <JB_job_number>%(jobid)d</JB_job_number>
+        <JAT_prio>%(prio).5f</JAT_prio>
+        <JB_name>%(name)s</JB_name>
+        <JB_owner>%(owner)s</JB_owner>
+        <state>%(state)s</state>
+        <JAT_start_time>%(timestamp)s</JAT_start_time>
+        <queue_name>%(queue)s@%(host)s</queue_name>
+        <slots>%(slots)d</slots>%(tasks)s
+      </job_list>
+"""
+
+_PENDING_JOB = """\
+      <job_list state="pending">
+        <JB_job_number>%(jobid)d</JB_job_number>
+        <JAT_prio>%(prio).5f</JAT_prio>
+        <JB_name>%(name)s</JB_name>
+        <JB_owner>%(owner)s</JB_owner>
+        <state>%(state)s</state>
+        <JB_submission_time>%(timestamp)s</JB_submission_time>
+        <queue_name></queue_name>
+        <slots>%(slots)d</slots>%(tasks)s
+      </job_list>
+"""
+
+_OWNERS = ['bfabric', 'cpanse', 'rmurri', 'taleksiev', 'guest']
+_NAMES = ['STDIN', 'QRLOGIN', 'fgcz_sge_rserver__%d', 'OMSSACL_SMSCG_%d', 'mascot_%d']
+_QUEUES = ['all.q', 'cloud', 'rserver']
+
+
+def synthetic_jobs(num_jobs, running_fraction=0.3, seed=None,
+                   start=1322068834, burst=8, array_fraction=0.0, max_tasks=10000):
+    """
+    Generate data for a synthetic batch queue with `num_jobs` entries.
+
+    Yield one dictionary per entry, with keys ``running`` (boolean),
+    ``jobid``, ``prio``, ``name``, ``owner``, ``state`` (GE state
+    letters), ``when`` (start time for running jobs, submission time
+    for the others), ``queue``, ``host``, ``slots`` and ``tasks``
+    (the array job task specification, or the empty string).
+
+    A fraction `running_fraction` of the jobs is running, the rest is
+    pending.  Jobs are submitted/started in bursts of about `burst`
+    jobs sharing the same timestamp, as happens on a real cluster when
+    many jobs are submitted by a script.
+
+    A fraction `array_fraction` of the entries belongs to array jobs:
+    running entries then stand for a single task, and pending entries
+    for a range of up to `max_tasks` tasks.
+
+    The random number generator is initialized with `seed`, so that
+    the same arguments always produce the same queue.
+    """
+    rng = random.Random(seed)
+    num_running = int(num_jobs * running_fraction)
+    when = start
+    for n in xrange(num_jobs):
+        running = (n < num_running)
+        if rng.randint(1, burst) == 1:
+            when += rng.randint(1, 600)
+        name = rng.choice(_NAMES)
+        if '%d' in name:
+            name = name % rng.randint(1, 999999)
+        if running:
+            state = rng.choice(['r', 'r', 'r', 'r', 't', 'Rr'])
+        else:
+            state = rng.choice(['qw', 'qw', 'qw', 'qw', 'hqw', 'Eqw'])
+        tasks = ''
+        if array_fraction and rng.random() < array_fraction:
+            if running:
+                tasks = str(rng.randint(1, max_tasks))
+            else:
+                first = rng.randint(1, max_tasks)
+                tasks = ('%d-%d:1' % (first, rng.randint(first, max_tasks)))
+        yield dict(
+            running=running,
+            jobid=(100000 + n),
+            prio=rng.random(),
+            name=name,
+            owner=rng.choice(_OWNERS),
+            state=state,
+            when=when,
+            queue=rng.choice(_QUEUES),
+            host=('compute-0-%d' % rng.randint(0, 99)),
+            slots=rng.choice([1, 1, 1, 1, 2, 4, 8]),
+            tasks=tasks,
+            )
+
+
+def write_qstat_xml(stream, num_jobs, **kwargs):
+    """
+    Write a synthetic ``qstat -u '*' -xml`` document listing
+    `num_jobs` jobs to file-like object `stream`.
+
+    Running jobs are listed in the ``queue_info`` section, the other
+    ones in the ``job_info`` section.  All keyword arguments are
+    passed unchanged to `synthetic_jobs` (which see).
+    """
+    stream.write("<?xml version='1.0'?>\n"
+                 '<job_info  xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n'
+                 '  <queue_info>\n')
+    in_queue_info = True
+    for job in synthetic_jobs(num_jobs, **kwargs):
+        if in_queue_info and not job['running']:
+            stream.write('  </queue_info>\n'
+                         '  <job_info>\n')
+            in_queue_info = False
+        if job['running']:
+            template = _RUNNING_JOB
+        else:
+            template = _PENDING_JOB
+        if job['tasks']:
+            tasks = ('\n        <tasks>%s</tasks>' % job['tasks'])
+        else:
+            tasks = ''
+        stream.write(template % dict(
+            job,
+            timestamp=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(job['when'])),
+            tasks=tasks))
+    if in_queue_info:
+        stream.write('  </queue_info>\n'
+                     '  <job_info>\n')
+    stream.write('  </job_info>\n'
+                 '</job_info>\n')
+
+
+def write_qstat_text(stream, num_jobs, **kwargs):
+    """
+    Write a synthetic plain-text ``qstat -u '*'`` listing of
+    `num_jobs` jobs to file-like object `stream`.
+
+    The listing describes the same queue as `write_qstat_xml` does,
+    when called with the same arguments.  As with the real `qstat`,
+    job names and owners are truncated to the column width.
+    """
+    stream.write("job-ID  prior   name       user         state submit/start at"
+                 "     queue                          slots ja-task-ID \n")
+    stream.write('-' * 113 + '\n')
+    for job in synthetic_jobs(num_jobs, **kwargs):
+        if job['running']:
+            queue = ('%s@%s' % (job['queue'], job['host']))
+        else:
+            queue = ''
+        stream.write("%7d %0.5f %-10.10s %-12.12s %-5s %s %-30s %5d %s\n" % (
+            job['jobid'], job['prio'], job['name'], job['owner'], job['state'],
+            time.strftime('%m/%d/%Y %H:%M:%S', time.localtime(job['when'])),
+            queue, job['slots'], job['tasks']))
+
+
+def make_qstat_xml(num_jobs, **kwargs):
+    """
+    Return a synthetic ``qstat -xml`` document as a string.
+
+    All keyword arguments are passed unchanged to `write_qstat_xml`
+    (which see).
+    """
+    output = StringIO.StringIO()
+    write_qstat_xml(output, num_jobs, **kwargs)
+    return output.getvalue()
+
+
+def make_qstat_text(num_jobs, **kwargs):
+    """
+    Return a synthetic plain-text ``qstat`` listing as a string.
+
+    All keyword arguments are passed unchanged to `write_qstat_text`
+    (which see).
+    """
+    output = StringIO.StringIO()
+    write_qstat_text(output, num_jobs, **kwargs)
+    return output.getvalue()
+
+
+PARSERS = [
+    ('iterparse', GridEngine.parse_qstat_xml_output),
+    ('sax',       GridEngine.parse_qstat_xml_output_sax),
+    ]
+
+
+def run_benchmark(sizes, repeat=3, seed=0, check=True, out=sys.stdout):
+    """
+    Parse synthetic documents of the given `sizes` (number of jobs)
+    with every parser in `PARSERS` and print a throughput table to
+    `out`.  Each measurement is the best of `repeat` runs.
+    """
+    out.write("%10s  %-10s %10s %14s %8s\n"
+              % ('jobs', 'parser', 'seconds', 'jobs/sec', 'speedup'))
+    for num_jobs in sizes:
+        xml_data = make_qstat_xml(num_jobs, seed=seed)
+        results = { }
+        timings = [ ]
+        for name, parse in PARSERS:
+            best = None
+            for _ in xrange(repeat):
+                jobs, elapsed = timed(parse, xml_data)
+                if best is None or elapsed < best:
+                    best = elapsed
+            results[name] = jobs
+            timings.append((name, best))
+        if check:
+            reference = results[PARSERS[-1][0]]
+            for name, jobs in results.iteritems():
+                if jobs != reference:
+                    raise AssertionError(
+                        "Parser '%s' returned different results on %d jobs!"
+                        % (name, num_jobs))
+        slowest = max(elapsed for _, elapsed in timings)
+        for name, elapsed in timings:
+            out.write("%10d  %-10s %10.3f %14.0f %7.1fx\n"
+                      % (num_jobs, name, elapsed,
+                         num_jobs / max(elapsed, 1e-9),
+                         slowest / max(elapsed, 1e-9)))
+
+
+def _convert_with_strptime(timestamps, fmt='%Y-%m-%dT%H:%M:%S'):
+    return [time.mktime(time.strptime(timestr, fmt)) for timestr in timestamps]
+
+
+def _convert_with_converter(timestamps, fmt='%Y-%m-%dT%H:%M:%S'):
+    # use a fresh converter each time, so that the cache starts empty
+    to_epoch = TimestampConverter(fmt)
+    return [to_epoch(timestr) for timestr in timestamps]
+
+
+def run_timestamp_benchmark(sizes, repeat=3, seed=0, out=sys.stdout):
+    """
+    Convert all the time stamps found in synthetic documents of the
+    given `sizes` (number of jobs), with `time.strptime` and with
+    `vmmad.util.TimestampConverter`, and print a throughput table to
+    `out`.  Each measurement is the best of `repeat` runs.
+    """
+    out.write("%10s  %-10s %10s %14s %8s\n"
+              % ('stamps', 'method', 'seconds', 'stamps/sec', 'speedup'))
+    for num_jobs in sizes:
+        xml_data = make_qstat_xml(num_jobs, seed=seed)
+        timestamps = re.findall(r'[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9:]{8}', xml_data)
+        timings = [ ]
+        results = [ ]
+        for name, convert in [('converter', _convert_with_converter),
+                              ('strptime', _convert_with_strptime)]:
+            best = None
+            for _ in xrange(repeat):
+                values, elapsed = timed(convert, timestamps)
+                if best is None or elapsed < best:
+                    best = elapsed
+            results.append(values)
+            timings.append((name, best))
+        if results[0] != results[1]:
+            raise AssertionError("Time stamp conversion returned different results!")
+        slowest = max(elapsed for _, elapsed in timings)
+        for name, elapsed in timings:
+            out.write("%10d  %-10s %10.3f %14.0f %7.1fx\n"
+                      % (len(timestamps), name, elapsed,
+                         len(timestamps) / max(elapsed, 1e-9),
+                         slowest / max(elapsed, 1e-9)))
+
+
+def _same_on_text_fields(xml_jobs, text_jobs):
+    if len(xml_jobs) != len(text_jobs):
+        return False
+    for xml_job, text_job in zip(xml_jobs, text_jobs):
+        for field in GridEngine.TEXT_FIELDS:
+            if xml_job.get(field) != text_job.get(field):
+                return False
+    return True
+
+
+def run_text_benchmark(sizes, repeat=3, seed=0, out=sys.stdout):
+    """
+    Parse the XML and plain-text listings of the same synthetic
+    queues of the given `sizes` (number of jobs), and print a table
+    with the size of the listing and the parser throughput to `out`.
+    Each measurement is the best of `repeat` runs.
+    """
+    out.write("%10s  %-10s %12s %10s %14s %8s\n"
+              % ('jobs', 'format', 'bytes', 'seconds', 'jobs/sec', 'speedup'))
+    for num_jobs in sizes:
+        listings = [
+            ('xml',  make_qstat_xml(num_jobs, seed=seed, array_fraction=0.1),
+             GridEngine.parse_qstat_xml_output),
+            ('text', make_qstat_text(num_jobs, seed=seed, array_fraction=0.1),
+             GridEngine.parse_qstat_text_output),
+            ]
+        timings = [ ]
+        results = [ ]
+        for name, data, parse in listings:
+            best = None
+            for _ in xrange(repeat):
+                jobs, elapsed = timed(parse, data)
+                if best is None or elapsed < best:
+                    best = elapsed
+            results.append(jobs)
+            timings.append((name, len(data), best))
+        if not _same_on_text_fields(*results):
+            raise AssertionError("XML and text parsers returned different results!")
+        slowest = max(elapsed for _, _, elapsed in timings)
+        for name, size, elapsed in timings:
+            out.write("%10d  %-10s %12d %10.3f %14.0f %7.1fx\n"
+                      % (num_jobs, name, size, elapsed,
+                         num_jobs / max(elapsed, 1e-9),
+                         slowest / max(elapsed, 1e-9)))
+
+
+def run_qstat_benchmark(repeat=3, user='*', out=sys.stdout):
+    """
+    Poll the local Grid Engine cluster through ``qstat``, both in XML
+    and in plain-text format, and print a table with the size of the
+    output and the time taken by running ``qstat`` and by parsing its
+    output.  Each measurement is the best of `repeat` runs.
+    """
+    ge = GridEngine(user)
+    out.write("%-10s %8s %12s %10s %10s\n"
+              % ('format', 'jobs', 'bytes', 'qstat', 'parse'))
+    for name, xml, parse in [
+            ('xml',  True,  GridEngine.parse_qstat_xml_output),
+            ('text', False, GridEngine.parse_qstat_text_output),
+            ]:
+        best_run = best_parse = None
+        for _ in xrange(repeat):
+            data, elapsed_run = timed(ge.run_qstat, user, None, xml)
+            jobs, elapsed_parse = timed(parse, data)
+            if best_run is None or elapsed_run < best_run:
+                best_run = elapsed_run
+            if best_parse is None or elapsed_parse < best_parse:
+                best_parse = elapsed_parse
+        out.write("%-10s %8d %12d %10.3f %10.3f\n"
+                  % (name, len(jobs), len(data), best_run, best_parse))
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(
+        description="Benchmark parsers for `qstat -xml` output on synthetic data.")
+    parser.add_argument('--jobs', '-n', metavar='N', dest='sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help="Number of jobs in the generated documents. Default: %(default)s")
+    parser.add_argument('--repeat', '-r', metavar='N', type=int, default=3,
+                        help="Report the best of N runs. Default: %(default)s")
+    parser.add_argument('--seed', '-s', metavar='N', type=int, default=0,
+                        help="Seed for the synthetic data generator. Default: %(default)s")
+    parser.add_argument('--no-check', dest='check', action='store_false', default=True,
+                        help="Do not check that all parsers return the same results.")
+    parser.add_argument('--timestamps', '-t', action='store_true', default=False,
+                        help="Benchmark time stamp conversion instead of XML parsing.")
+    parser.add_argument('--text', action='store_true', default=False,
+                        help="Benchmark parsing of the XML vs the plain-text listing.")
+    parser.add_argument('--qstat', action='store_true', default=False,
+                        help="Benchmark the actual `qstat` command on the local cluster.")
+    parser.add_argument('--generate', '-g', metavar='PATH', default=None,
+                        help="Only write a synthetic document with the first given"
+                        " number of jobs to PATH, and exit.")
+    args = parser.parse_args()
+    if args.generate:
+        with open(args.generate, 'w') as output:
+            write_qstat_xml(output, args.sizes[0], seed=args.seed)
+    elif args.qstat:
+        run_qstat_benchmark(args.repeat)
+    elif args.text:
+        run_text_benchmark(args.sizes, args.repeat, args.seed)
+    elif args.timestamps:
+        run_timestamp_benchmark(args.sizes, args.repeat, args.seed)
+    else:
+        run_benchmark(args.sizes, args.repeat, args.seed, args.check)
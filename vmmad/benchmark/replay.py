@@ -0,0 +1,173 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generate a synthetic job history and benchmark replaying it through
+`vmmad.batchsys.replay.JobsFromFile`.
+
+Run this module as a script to time loading and replaying traces of
+increasing size::
+
+  python -m vmmad.benchmark.replay --jobs 100000 1000000 3000000
+
+Replay advances a simulated clock by a fixed interval (option
+``--interval``) and calls `JobsFromFile.get_sched_info` once per step,
+like `vmmad.simul` does, until all jobs in the trace have terminated.
+With option ``--stream``, the trace is read while replaying instead of
+being loaded upfront; with option ``--trace``, it is converted into a
+binary trace file (see `vmmad.batchsys.trace`) first, and replayed
+from that.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+# local imports
+from vmmad.batchsys.replay import JobsFromFile
+from vmmad.batchsys.trace import JobsFromTrace, convert_csv
+from vmmad.benchmark import timed
+
+
+def write_trace(output, num_jobs, seed=None, start=1322068834,
+                mean_interarrival=1.0, mean_duration=600.0):
+    """
+    Write a CSV job history with `num_jobs` jobs to file-like object
+    `output`, in the format read by `JobsFromFile`.
+
+    Jobs arrive as a Poisson process with the given mean interarrival
+    time, and run for an exponentially distributed duration; all times
+    are in seconds.  Rows are written in submission order.
+    """
+    rng = random.Random(seed)
+    output.write("JOBID,SUBMITTED_AT,RUN_DURATION\n")
+    now = float(start)
+    for n in xrange(num_jobs):
+        now += rng.expovariate(1.0 / mean_interarrival)
+        output.write("%d,%.3f,%.3f\n"
+                     % (n+1, now, rng.expovariate(1.0 / mean_duration)))
+
+
+class _Clock(object):
+    """Simulated time, advanced explicitly by the replay loop."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def replay(filename, interval=60, stream=False, trace=False):
+    """
+    Replay the job history in `filename` until no jobs are left, and
+    return a triple `(calls, max_jobs, total_jobs)` with the number
+    of calls to `get_sched_info`, the maximum length of the job list
+    returned by any of them, and the number of distinct jobs seen.
+
+    If `trace` is `True`, then `filename` is a binary trace file,
+    replayed with `vmmad.batchsys.trace.JobsFromTrace`.
+    """
+    clock = _Clock()
+    if trace:
+        batchsys = JobsFromTrace(filename, clock)
+    else:
+        batchsys = JobsFromFile(filename, clock, stream=stream)
+    clock.now = batchsys.start_time
+    calls = max_jobs = 0
+    while True:
+        jobs = batchsys.get_sched_info()
+        calls += 1
+        max_jobs = max(max_jobs, len(jobs))
+        if not jobs and batchsys.exhausted:
+            break
+        clock.now += interval
+    return calls, max_jobs, batchsys.num_submitted
+
+
+def run_benchmark(sizes, interval=60, seed=0, stream=False, trace=False, out=sys.stdout):
+    """
+    Generate job histories of the given `sizes` (number of jobs),
+    time loading and replaying them, and print a table with the
+    results to `out`.  If `stream` is `True`, use the streaming
+    replay mode of `JobsFromFile`; if `trace` is `True`, convert the
+    job histories to trace files and replay them with
+    `JobsFromTrace`.
+    """
+    out.write("%10s %10s %10s %10s %12s %14s\n"
+              % ('jobs', 'load', 'replay', 'calls', 'max live', 'usec/call'))
+    for num_jobs in sizes:
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        trace_path = path + '.trace'
+        try:
+            with os.fdopen(fd, 'w') as output:
+                write_trace(output, num_jobs, seed=seed)
+            if trace:
+                _, convert_elapsed = timed(convert_csv, path, trace_path)
+                out.write("(converted %d jobs into a trace file in %.3f seconds)\n"
+                          % (num_jobs, convert_elapsed))
+                path = trace_path
+                _, load_elapsed = timed(JobsFromTrace, path, None)
+            else:
+                _, load_elapsed = timed(JobsFromFile, path, None, stream=stream)
+            (calls, max_jobs, seen), elapsed = timed(replay, path, interval, stream, trace)
+            if seen != num_jobs:
+                raise AssertionError("Replayed %d jobs out of %d!" % (seen, num_jobs))
+            # `replay` also loads the file: do not count that twice
+            elapsed -= load_elapsed
+            out.write("%10d %10.3f %10.3f %10d %12d %14.1f\n"
+                      % (num_jobs, load_elapsed, elapsed, calls, max_jobs,
+                         1e6 * elapsed / calls))
+        finally:
+            for name in path, trace_path:
+                if os.path.exists(name):
+                    os.remove(name)
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(
+        description="Benchmark replay of job histories on synthetic data.")
+    parser.add_argument('--jobs', '-n', metavar='N', dest='sizes', type=int, nargs='+',
+                        default=[100000, 1000000, 3000000],
+                        help="Number of jobs in the generated traces. Default: %(default)s")
+    parser.add_argument('--interval', '-i', metavar='SECONDS', type=int, default=60,
+                        help="Simulated time between two polls. Default: %(default)s")
+    parser.add_argument('--seed', '-s', metavar='N', type=int, default=0,
+                        help="Seed for the synthetic data generator. Default: %(default)s")
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help="Read the trace while replaying, instead of loading it upfront.")
+    parser.add_argument('--trace', action='store_true', default=False,
+                        help="Convert the trace to binary format and replay that.")
+    parser.add_argument('--generate', '-g', metavar='PATH', default=None,
+                        help="Only write a synthetic trace with the first given"
+                        " number of jobs to PATH, and exit.")
+    args = parser.parse_args()
+    if args.generate:
+        with open(args.generate, 'w') as output:
+            write_trace(output, args.sizes[0], seed=args.seed)
+    else:
+        run_benchmark(args.sizes, args.interval, args.seed, args.stream, args.trace)
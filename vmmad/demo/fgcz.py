@@ -71,7 +71,7 @@ class DemoOrchestrator(OrchestratorWebApp):
 
     def is_new_vm_needed(self):
         # if we have more jobs queued than started VMs, start a new one
-        if len(self.candidates) > 2*len(self.vms):
+        if self.num_candidates > 2*len(self.vms):
             return True
         return False
 
@@ -42,6 +42,7 @@ from vmmad import log
 from vmmad.batchsys.randomjobs import RandomJobs
 from vmmad.orchestrator import JobInfo
 from vmmad.provider.libcloud import DummyCloud, EC2Cloud
+from vmmad.provider.simulated import SimulatedCloud
 from vmmad.webapp import OrchestratorWebApp
 
 
@@ -51,11 +52,26 @@ class DemoOrchestrator(OrchestratorWebApp):
         OrchestratorWebApp.__init__(
             self,
             delay=15,
-            cloud=DummyCloud('1', '1'),
+            # simulated VMs report to the orchestrator 30s after start
+            cloud=SimulatedCloud(boot_time=30, on_ready=(lambda vm:
+                self.vm_is_ready(vm.auth, ("vm-%s" % vm.vmid)))),
             batchsys=RandomJobs(3, 0.25, timer=self.time),
             max_vms=10)
 
 
+    def vm_is_ready(self, auth, nodename):
+        if OrchestratorWebApp.vm_is_ready(self, auth, nodename):
+            # jobs only run on the VMs
+            self.batchsys.add_node(nodename)
+            return True
+        return False
+
+    def _do_stop_vm(self, vm):
+        if 'nodename' in vm:
+            self.batchsys.remove_node(vm.nodename)
+        OrchestratorWebApp._do_stop_vm(self, vm)
+
+
     ##
     ## policy implementation interface
     ##
@@ -64,7 +80,7 @@ class DemoOrchestrator(OrchestratorWebApp):
         return True
 
     def is_new_vm_needed(self):
-        pending = len([ job for job in self.jobs.itervalues() if job.state == JobInfo.PENDING ])
+        pending = sum(job.num_tasks() for job in self.jobs.itervalues() if job.state == JobInfo.PENDING)
         running = len([ job for job in self.jobs.itervalues() if job.state == JobInfo.RUNNING ])
         if pending > 2*running:
             return True
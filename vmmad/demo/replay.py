@@ -0,0 +1,363 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Replay a job history against a live orchestrator web application,
+with time running faster than real time.
+
+Unlike `vmmad.simul`, this runs the real `OrchestratorWebApp` code:
+its main loop thread, the thread pool starting and stopping VMs, the
+HTTP server receiving the "ready" notifications from VMs, and
+(optionally) checkpointing.  Only the cloud and the batch system are
+stand-ins: VMs run on a `vmmad.provider.simulated.SimulatedCloud`,
+and notify the orchestrator over HTTP when they have booted; jobs
+are replayed from a CSV or trace file, and run on cluster nodes and
+ready VMs as scheduled by a `vmmad.scheduler` model.
+
+All times given to the orchestrator and the stand-ins (e.g., the
+VM boot time or the policy cycle) are in simulated seconds; a
+`DilatedClock` makes simulated time run `speed` times faster than
+real time.  When all jobs are done, the real time spent in the
+main code paths is printed out, e.g.::
+
+  python -m vmmad.demo.replay --csv-file accounting.csv --speed 100
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import argparse
+import itertools
+import sys
+import threading
+import time
+import urllib
+import urllib2
+
+# 3rd party modules
+from flask import Flask
+from werkzeug.serving import make_server
+
+# local imports
+from vmmad import log
+from vmmad.batchsys.replay import JobsFromFile
+from vmmad.batchsys.trace import JobsFromTrace, is_trace_file
+from vmmad.metrics import Distribution, format_text, write_json
+from vmmad.orchestrator import JobInfo
+from vmmad.provider.simulated import SimulatedCloud
+from vmmad.scheduler import SCHEDULERS
+from vmmad.util import timestamp_to_epoch
+from vmmad.webapp import OrchestratorWebApp
+
+
+class DilatedClock(object):
+    """
+    A clock that starts at time `start` (UNIX epoch) when created,
+    and then runs `speed` times faster than real time.  Call the
+    object to get the current time.
+    """
+
+    def __init__(self, start, speed=100.0):
+        self.start = start
+        self.speed = float(speed)
+        self._started_at = time.time()
+
+    def __call__(self):
+        return self.start + (time.time() - self._started_at) * self.speed
+
+    def real(self, span):
+        """Return how many real seconds a span of simulated time lasts."""
+        return span / self.speed
+
+
+class ReplayedCluster(object):
+    """
+    Mock batch system interface, replaying the jobs in `jobs_file` (a
+    CSV or trace file, see `vmmad.batchsys.replay`), and running them
+    on `cluster_size` cluster nodes and on the nodes that join later
+    (see `add_node`), as decided by the `scheduler` model (see
+    `vmmad.scheduler.SCHEDULERS`).
+
+    Jobs stay pending until the scheduler starts them, and terminate
+    their recorded duration after they started running (see
+    `vmmad.batchsys.replay.JobsFromFile.job_started`).  All methods
+    can be called from any thread.
+    """
+
+    def __init__(self, jobs_file, timer, cluster_size, start_time=None, end_time=None,
+                 scheduler='fifo'):
+        if is_trace_file(jobs_file):
+            self.replay = JobsFromTrace(jobs_file, timer, start_time, end_time)
+        else:
+            self.replay = JobsFromFile(jobs_file, timer, start_time, end_time=end_time)
+        self.timer = timer
+        if scheduler not in SCHEDULERS:
+            raise RuntimeError("Unknown scheduler model '%s': must be one of %s"
+                               % (scheduler, str.join(', ', sorted(SCHEDULERS))))
+        self.scheduler = SCHEDULERS[scheduler]()
+        self._lock = threading.Lock()
+        # nodes are filled in the order they joined
+        self._keys = itertools.count()
+        for n in xrange(cluster_size):
+            self.add_node('clusternode-%d' % n)
+        # time jobs spent pending, in simulated seconds
+        self.waits = Distribution()
+
+
+    @property
+    def start_time(self):
+        return self.replay.start_time
+
+    @property
+    def exhausted(self):
+        return self.replay.exhausted
+
+
+    def add_node(self, nodename):
+        """Make node `nodename` available for running jobs."""
+        with self._lock:
+            self.scheduler.add_node(nodename, next(self._keys))
+
+    def remove_node(self, nodename):
+        """Stop running new jobs on node `nodename`."""
+        with self._lock:
+            self.scheduler.remove_node(nodename)
+
+
+    def get_sched_info(self):
+        with self._lock:
+            jobs = self.replay.get_sched_info()
+            for job in self.replay.submitted:
+                self.scheduler.submit(job)
+            for job in self.replay.terminated:
+                self.scheduler.remove(job)
+            now = self.timer()
+            for job, nodes in self.scheduler.schedule(now):
+                job.state = JobInfo.RUNNING
+                job.running_at = now
+                job.exec_node_name = nodes[0]
+                self.replay.job_started(job)
+                self.waits.add(now - job.submitted_at)
+            return jobs
+
+
+class ReplayOrchestrator(OrchestratorWebApp):
+    """
+    Run a `OrchestratorWebApp` on the jobs replayed from `jobs_file`
+    by a `ReplayedCluster`, with VMs on a `SimulatedCloud`, and time
+    running `speed` times faster than real time.
+
+    VMs notify the orchestrator at `ready_url` (which must point to
+    the ``/x/ready`` URL of this web application) when they have
+    booted.  The policy is the same as in `vmmad.simul`: start a VM
+    when there are more than twice as many pending jobs as VMs, stop
+    it when it has been idle for more than `max_idle` seconds.
+
+    The real time taken by each orchestrator cycle, VM start, "ready"
+    notification and checkpoint save is accumulated in the
+    `latencies` dictionary, and can be retrieved with `report`.
+    """
+
+    def __init__(self, jobs_file, ready_url, speed=100, delay=30,
+                 max_vms=10, max_delta=1, max_idle=7200, startup_delay=60, cluster_size=20,
+                 start_time=None, end_time=None, scheduler='fifo', chkptfile=None):
+        self.ready_url = ready_url
+        self.max_idle = max_idle
+        self.latencies = dict(
+            cycle=Distribution(),
+            start_vm=Distribution(),
+            ready=Distribution(),
+            checkpoint=Distribution(),
+            )
+        self._latencies_lock = threading.Lock()
+        # no HTTP proxy between the VMs and the orchestrator
+        self._http = urllib2.build_opener(urllib2.ProxyHandler({ }))
+
+        # the clock must run before the main loop thread starts
+        batchsys = ReplayedCluster(jobs_file, self.time, cluster_size,
+                                   start_time, end_time, scheduler)
+        self.clock = DilatedClock(batchsys.start_time, speed)
+        OrchestratorWebApp.__init__(
+            self,
+            delay=self.clock.real(delay),
+            cloud=SimulatedCloud(boot_time=startup_delay, on_ready=self._vm_booted,
+                                 timer=self.time),
+            batchsys=batchsys,
+            max_vms=max_vms,
+            max_delta=max_delta,
+            chkptfile=chkptfile)
+
+
+    def time(self):
+        return self.clock()
+
+
+    def _measure(self, name, func, *args):
+        t0 = time.time()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.time() - t0
+            with self._latencies_lock:
+                self.latencies[name].add(elapsed)
+
+
+    def before(self):
+        if len(self.jobs) == 0 and self.batchsys.exhausted:
+            log.info("No more jobs, stopping here")
+            self.stop()
+            return
+        self._cycle_started_at = time.time()
+
+
+    def after(self):
+        with self._latencies_lock:
+            self.latencies['cycle'].add(time.time() - self._cycle_started_at)
+
+
+    def report(self):
+        """
+        Return a dictionary with statistics on the real time (in
+        seconds) taken by the main code paths, and on the simulated
+        time jobs spent waiting.
+        """
+        def summary(values):
+            return dict(count=values.count, mean=values.mean,
+                        p50=values.quantile(0.5), p95=values.quantile(0.95),
+                        max=(values.max or 0.0))
+        with self._latencies_lock:
+            latencies = dict((name, summary(values))
+                             for name, values in self.latencies.iteritems())
+        return dict(
+            latency=latencies,
+            wait=summary(self.batchsys.waits),
+            speed=self.clock.speed,
+            cycles=self.cycle,
+            vms_started=self.cloud.num_started,
+            )
+
+
+    def _vm_booted(self, vm):
+        # the VM contacts the orchestrator from "outside"
+        self._async(self._notify_ready, [vm])
+
+    def _notify_ready(self, vm):
+        query = urllib.urlencode(dict(auth=vm.auth, hostname=("vm-%s" % vm.vmid)))
+        def notify():
+            return self._http.open(self.ready_url + '?' + query).read()
+        try:
+            self._measure('ready', notify)
+        except Exception, ex:
+            log.error("VM %s could not notify the orchestrator: %s: %s",
+                      vm.vmid, ex.__class__.__name__, str(ex))
+
+    def vm_is_ready(self, auth, nodename):
+        if OrchestratorWebApp.vm_is_ready(self, auth, nodename):
+            # the node has joined the cluster
+            self.batchsys.add_node(nodename)
+            return True
+        return False
+
+
+    def _do_start_vm(self, vm):
+        self._measure('start_vm', OrchestratorWebApp._do_start_vm, self, vm)
+
+    def _do_stop_vm(self, vm):
+        if 'nodename' in vm:
+            self.batchsys.remove_node(vm.nodename)
+        OrchestratorWebApp._do_stop_vm(self, vm)
+
+    def _save_to_file(self, path):
+        self._measure('checkpoint', OrchestratorWebApp._save_to_file, self, path)
+
+
+    ##
+    ## policy implementation interface
+    ##
+    def is_cloud_candidate(self, job):
+        # every job is a candidate in this simulation
+        return True
+
+    def is_new_vm_needed(self):
+        # each VM (and cluster node) provides one slot
+        if self.num_candidate_slots > 2 * len(self.vms):
+            return True
+        return False
+
+    def can_vm_be_stopped(self, vm):
+        if len(vm.jobs) == 0 and vm.last_idle > self.max_idle:
+            return True
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Replay a job history against a live orchestrator web application,"
+        " in accelerated time.")
+    parser.add_argument('--csv-file', '-csvf', metavar='String', dest="csv_file", default="accounting.csv", help="File containing the jobs to replay (CSV, or a trace file created by `vmmad.batchsys.trace`), %(default)s")
+    parser.add_argument('--speed', metavar='NUM', type=float, default=100, help="How many times faster than real time the replay runs; default: %(default)s")
+    parser.add_argument('--delay', metavar='NUM_SECS', type=int, default=30, help="Time (in simulated seconds) between two orchestrator cycles; default: %(default)s")
+    parser.add_argument('--max-vms', '-mv', metavar='N', dest="max_vms", default=10, type=int, help="Maximum number of VMs to be started, default is %(default)s")
+    parser.add_argument('--max-delta', '-md', metavar='N', dest="max_delta", default=1, type=int, help="Cap the number of VMs that can be started or stopped in a single orchestration cycle. Default is %(default)d.")
+    parser.add_argument('--max-idle', '-mi', metavar='NUM_SECS', dest="max_idle", default=7200, type=int, help="Maximum idle time (in seconds) before swithing off a VM, default is %(default)s")
+    parser.add_argument('--startup-delay', '-s', metavar='NUM_SECS', dest="startup_delay", default=60, type=int, help="Time (in seconds) delay before a started VM is READY. Default is %(default)s")
+    parser.add_argument('--cluster-size', '-cs', metavar='NUM_CPUS', dest="cluster_size", default=20, type=int, help="Number of cluster nodes: %(default)s")
+    parser.add_argument('--start-time', '-stime', metavar='String', dest="start_time", default=None, help="Start time for the replay; default: first job submission")
+    parser.add_argument('--end-time', '-etime', metavar='String', dest="end_time", default=None, help="Only replay jobs submitted until this time; default: all jobs")
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), dest="scheduler", default="fifo", help="Model of the batch system scheduler (see `vmmad.scheduler`); default: %(default)s")
+    parser.add_argument('--checkpoint', metavar='String', dest="chkptfile", default=None, help="Save the orchestrator state into this file at every cycle.")
+    parser.add_argument('--host', metavar='String', default='127.0.0.1', help="Address where the web application listens; default: %(default)s")
+    parser.add_argument('--port', metavar='NUM', type=int, default=0, help="Port where the web application listens; default: any free port")
+    parser.add_argument('--report', '-r', metavar='String', dest="report", default=None, help="Also write the statistics in JSON format to this file.")
+    parser.add_argument('--version', '-V', action='version',
+                        version=("%(prog)s version " + __version__))
+    args = parser.parse_args()
+
+    # the socket starts listening right away, so VMs can connect
+    # even before the server runs
+    app = Flask(__name__)
+    server = make_server(args.host, args.port, app, threaded=True)
+    ready_url = ("http://%s:%d/x/ready" % (args.host, server.server_port))
+    log.info("Web application listening at http://%s:%d/", args.host, server.server_port)
+
+    start_time = (timestamp_to_epoch(args.start_time) if args.start_time is not None else None)
+    end_time = (timestamp_to_epoch(args.end_time) if args.end_time is not None else None)
+    demo = ReplayOrchestrator(args.csv_file, ready_url, args.speed, args.delay,
+                              args.max_vms, args.max_delta, args.max_idle,
+                              args.startup_delay, args.cluster_size,
+                              start_time, end_time, args.scheduler, args.chkptfile)
+    app.register_blueprint(demo)
+    web = threading.Thread(target=server.serve_forever)
+    web.daemon = True
+    web.start()
+
+    # wait for the orchestrator main loop to end (with a timeout, so
+    # that the wait can be interrupted)
+    while demo._daemon.is_alive():
+        demo._daemon.join(1)
+    server.shutdown()
+
+    report = demo.report()
+    if args.report is not None:
+        with open(args.report, 'w') as output:
+            write_json(report, output)
+    sys.stdout.write(format_text(report))
@@ -3,6 +3,15 @@
 """
 Parse the output of a ``qstat -xml`` command or an SGE accounting information file,
 and outputs the relevant "orchestrator" information in CSV format.
+
+Snapshots of the ``qstat -xml`` output (files named ``*.xml`` or
+``*.xml.gz``) are parsed in parallel by a pool of processes; each
+file is streamed into the parser, without reading it into memory
+first.  If a state file is given, the names of the snapshots already
+processed (and the position reached in the accounting file) are
+recorded there, and later runs only process new data, appending it
+to the existing output file; if the accounting file has been rotated
+or truncated in the meantime, it is read again from the start.
 """
 # Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
 #
@@ -38,18 +47,40 @@ import argparse
 import gzip
 import time
 import csv
+from itertools import izip
+import multiprocessing
 from time import mktime
 from datetime import datetime
 
 # local VM-MAD imports
+from vmmad import log
 from vmmad.orchestrator import JobInfo
+from vmmad.batchsys.accounting import can_resume, parse_accounting_line
 from vmmad.batchsys.gridengine import GridEngine
 
 
+def _pending_jobs(filename):
+    """
+    Parse the ``qstat -xml`` snapshot in file `filename` and return a
+    list of pairs `(jobid, submitted_at)` for the jobs pending in it.
+    """
+    if filename.endswith('.gz'):
+        xml_file = gzip.open(filename, 'rb')
+    else:
+        xml_file = open(filename, 'rb')
+    with xml_file:
+        jobs = GridEngine.parse_qstat_xml_stream(xml_file)
+    # submission time has already been converted to UNIX time by
+    # the (memoizing) GE parser
+    return [ (job.jobid, job.submitted_at)
+             for job in jobs if job.state == JobInfo.PENDING ]
+
+
 class Distil():
 
     def __init__(self, data_dir, output_file, xml_parse,
-                 accounting_file=None, output_delimiter=','):
+                 accounting_file=None, output_delimiter=',',
+                 processes=None, state_file=None):
 
         if accounting_file is not None:
             self.accounting_file = os.path.join(data_dir, accounting_file)
@@ -58,6 +89,14 @@ class Distil():
         self.xml_parse = xml_parse
         self.output_file = output_file
         self.output_delimiter = output_delimiter
+        self.processes = processes
+        self.state_file = state_file
+        # names of the snapshots already processed, and position
+        # reached in the accounting file (and its inode number), by
+        # previous runs
+        self.processed = set()
+        self.accounting_inode = None
+        self.accounting_offset = 0
         ## load xml files
         self.qstat_xml_files = list(
             reversed(
@@ -68,55 +107,119 @@ class Distil():
         self.__starting = 0
 
     def parse_xml_files(self):
-        ge = GridEngine()
-        for filename in self.qstat_xml_files:   
-            if filename.endswith('.gz'):
-                with gzip.open(filename, 'r') as xml_file:    
-                    xml_data = xml_file.read()
-            else:
-                with open(filename, 'r') as xml_file:
-                    xml_data = xml_file.read()
-            self.__jobs = ge.parse_qstat_xml_output(xml_data)
-            for job in self.__jobs:
-                if job.state == JobInfo.PENDING:
-                    # Convert the submit time to UNIX time
-                    struct_time = time.strptime(job.submit_time, "%Y-%m-%dT%H:%M:%S" )
-                    dt = datetime.fromtimestamp(mktime(struct_time))
-                    unix_sub_time = mktime(dt.timetuple())
-                    # Calculate the duration
-                    time_now = datetime.now()
-                    unix_time_now = mktime(time_now.timetuple())
-                    duration = unix_time_now - unix_sub_time
-                    # Write the results to file
-                    self.csv_output.writerow([job.jobid, unix_sub_time, duration])
+        filenames = [ filename for filename in self.qstat_xml_files
+                      if os.path.basename(filename) not in self.processed ]
+        # all pending jobs are assumed to be still waiting now
+        unix_time_now = time.time()
+        if self.processes == 1 or len(filenames) < 2:
+            self._write_pending(filenames, (_pending_jobs(filename) for filename in filenames),
+                                unix_time_now)
+            return
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            # `imap` returns results in order, so the output does not
+            # depend on the number of processes
+            self._write_pending(filenames, pool.imap(_pending_jobs, filenames),
+                                unix_time_now)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _write_pending(self, filenames, results, unix_time_now):
+        for filename, pending in izip(filenames, results):
+            for jobid, unix_sub_time in pending:
+                # Calculate the duration
+                duration = unix_time_now - unix_sub_time
+                # Write the results to file
+                self.csv_output.writerow([jobid, unix_sub_time, duration])
+            self._record('snapshot', os.path.basename(filename))
 
     def parse_accounting_file(self):
-        time_now = datetime.now()
-        unix_time_now = int(mktime(time_now.timetuple()))
         with open(self.accounting_file, 'r') as accounting:
-            for line in accounting:
-                fields = line.split(':')
-                if len(fields) >= 11 and int(fields[8]) !=0:
-                    jobid = fields[5]
-                    submitted_at = int(fields[8])
-                    running_at = int(fields[9])
-                    finished_at = int(fields[10])
-                    wait_duration = running_at - submitted_at
-                    run_duration = finished_at - running_at
-                    self.csv_output.writerow([jobid, submitted_at, running_at, finished_at,
-                                              wait_duration, run_duration])
+            # accounting files are only appended to, until they are
+            # rotated or truncated
+            stat = os.fstat(accounting.fileno())
+            if not can_resume(stat, self.accounting_inode, self.accounting_offset):
+                log.info("Accounting file '%s' has been rotated or truncated;"
+                         " reading it from the start.", self.accounting_file)
+                self.accounting_offset = 0
+            accounting.seek(self.accounting_offset)
+            # use `readline` (not iteration) so that `tell` is exact
+            for line in iter(accounting.readline, ''):
+                if not line.endswith('\n'):
+                    # incomplete last line, still being written
+                    break
+                job = parse_accounting_line(line)
+                if job is not None:
+                    wait_duration = job.running_at - job.submitted_at
+                    run_duration = job.finished_at - job.running_at
+                    # tasks of array jobs are listed under the job number
+                    self.csv_output.writerow([job.job_number, job.submitted_at, job.running_at,
+                                              job.finished_at, wait_duration, run_duration])
+            self._record('accounting', '%d %d' % (stat.st_ino, accounting.tell()))
+
+    def load_state(self):
+        """
+        Read the snapshots processed and the accounting file position
+        reached by previous runs from the state file, if it exists.
+        """
+        self.processed = set()
+        self.accounting_inode = None
+        self.accounting_offset = 0
+        if self.state_file is None or not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, 'r') as state:
+            for line in state:
+                kind, _, value = line.rstrip('\n').partition(' ')
+                if kind == 'snapshot':
+                    self.processed.add(value)
+                elif kind == 'accounting':
+                    # older state files only record the offset
+                    fields = [ int(field) for field in value.split() ]
+                    if len(fields) == 2:
+                        self.accounting_inode, self.accounting_offset = fields
+                    else:
+                        self.accounting_inode, self.accounting_offset = None, fields[0]
+
+    def _record(self, kind, value):
+        """
+        Append a line to the state file, once the output for it has
+        been written, so that an interrupted run loses no data.
+        """
+        if self.state_file is None:
+            return
+        self.output_stream.flush()
+        self._state.write('%s %s\n' % (kind, value))
+        self._state.flush()
 
     def run(self):
-        output_stream = open(self.output_file, 'w')
-        self.csv_output = csv.writer(output_stream, delimiter=self.output_delimiter)
-        self.csv_output.writerow(['JOBID', 'SUBMITTED_AT', 'RUNNING_AT', 'FINISHED_AT',
-                                  'WAIT_DURATION', 'RUN_DURATION'])
-        # Populate with the sched info. from the xml files.
-        if self.xml_parse:
-            self.parse_xml_files()
-        if self.accounting_file is not None:
-            # populate with the sched info. from the accounting files
-            self.parse_accounting_file()
+        self.load_state()
+        # only add new data to the output of previous runs
+        resume = (self.state_file is not None
+                  and (self.processed or self.accounting_offset > 0)
+                  and os.path.exists(self.output_file))
+        if not resume:
+            self.processed = set()
+            self.accounting_inode = None
+            self.accounting_offset = 0
+        self.output_stream = open(self.output_file, ('a' if resume else 'w'))
+        if self.state_file is not None:
+            self._state = open(self.state_file, ('a' if resume else 'w'))
+        try:
+            self.csv_output = csv.writer(self.output_stream, delimiter=self.output_delimiter)
+            if not resume:
+                self.csv_output.writerow(['JOBID', 'SUBMITTED_AT', 'RUNNING_AT', 'FINISHED_AT',
+                                          'WAIT_DURATION', 'RUN_DURATION'])
+            # Populate with the sched info. from the xml files.
+            if self.xml_parse:
+                self.parse_xml_files()
+            if self.accounting_file is not None:
+                # populate with the sched info. from the accounting files
+                self.parse_accounting_file()
+        finally:
+            self.output_stream.close()
+            if self.state_file is not None:
+                self._state.close()
 
 if "__main__" == __name__:
     parser = argparse.ArgumentParser(description='Distils `qstat -xml` and SGE account info ')
@@ -127,8 +230,13 @@ if "__main__" == __name__:
                         help="Separator for the output fields.  Default: '%(default)s'")
     parser.add_argument('--accounting-file', '-I',  metavar='PATH', dest="accounting_file", default=None, help="Parse SGE 'accounting' file located at PATH.")
     parser.add_argument('--no-xml', '-nxml',  metavar='Boolean', dest="xml_parse", default=False , help="Disable parsing xml file, %(default)s")
+    parser.add_argument('--processes', '-j', metavar='N', type=int, dest="processes", default=None, help="Number of snapshot files to parse in parallel; default: number of CPUs")
+    parser.add_argument('--state-file', '-s', metavar='PATH', dest="state_file", default=None,
+                        help="Record the data processed into file PATH, and only process new data"
+                        " (appending to the output file) if PATH exists.")
     parser.add_argument('--version', '-V', action='version', version=("%(prog)s version " + __version__))
     args = parser.parse_args()
     Distil(args.data_dir, args.output_file,
            args.xml_parse, args.accounting_file,
-           output_delimiter=args.output_delimiter).run()
+           output_delimiter=args.output_delimiter,
+           processes=args.processes, state_file=args.state_file).run()
@@ -0,0 +1,314 @@
+#! /usr/bin/env python
+#
+"""
+Vectorized simulation of many threshold policies at once.
+
+The `simulate` function in this module computes the same summary
+statistics as running `vmmad.simul.OrchestratorSimulation` (in
+fixed-step mode) once for each set of parameters, but runs all the
+simulations together, storing the state of all VMs of all
+simulations in NumPy arrays.  This is only possible because the
+policy of `OrchestratorSimulation` is simple enough:
+
+- start a new VM when the number of pending jobs exceeds `ratio`
+  times the number of VMs (cluster nodes included), at most
+  `max_delta` VMs per cycle and `max_vms` in total;
+- stop a VM that has been idle for more than `max_idle` seconds;
+
+any other policy needs the full `OrchestratorSimulation`.  Pending
+jobs are started in FIFO order, and each job uses one slot (i.e.,
+the ``fifo`` scheduler model of `vmmad.scheduler`, with all jobs
+requesting one slot).
+
+This module requires NumPy (install VM-MAD with the ``fastsim``
+extra).
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import math
+
+# 3rd party modules
+import numpy as np
+
+# local imports
+from vmmad import log
+from vmmad.batchsys.replay import load_jobs
+from vmmad.batchsys.trace import TraceFile, is_trace_file
+
+
+# default values of the simulation parameters, as in `vmmad.simul`
+DEFAULTS = dict(max_vms=10, max_delta=1, max_idle=7200, startup_delay=60, cluster_size=20)
+
+# VM states; a slot in the VM arrays is `_EMPTY` when no VM uses it
+_EMPTY, _STARTING, _READY, _DOWN = range(4)
+
+
+def load_arrays(path, start_time=None, end_time=None):
+    """
+    Return a triple `(submitted_at, duration, jobid)` of arrays with
+    the data of the jobs in the job history `path`, which can be a
+    CSV file or a trace file (see `vmmad.batchsys.trace`).  Only jobs
+    submitted after `start_time` (and not after `end_time`, if given)
+    are loaded, as `vmmad.batchsys.replay.JobsFromFile` does.
+    """
+    if start_time is None:
+        start_time = -1
+    if is_trace_file(path):
+        trace = TraceFile(path)
+        try:
+            first = trace.find(start_time)
+            if end_time is None:
+                last = len(trace)
+            else:
+                last = trace.find(end_time)
+            count = max(0, last - first)
+            submitted_at = np.frombuffer(trace.raw('submitted_at', first, count), '<f8')
+            duration = np.frombuffer(trace.raw('run_duration', first, count), '<f8')
+            jobid = np.frombuffer(trace.raw('jobid', first, count), 'S%d' % trace.jobid_width)
+        finally:
+            trace.close()
+    else:
+        jobs = load_jobs(path, start_time, end_time)
+        submitted_at = np.array([ job[0] for job in jobs ], np.float64)
+        duration = np.array([ job[1] for job in jobs ], np.float64)
+        jobid = np.array([ job[2] for job in jobs ], str)
+    log.info("Loaded %d jobs from '%s'", len(submitted_at), path)
+    return submitted_at, duration, jobid
+
+
+def simulate(jobs, runs, time_interval=3600, start_time=None, ratio=2,
+             wait_resolution=1e-3):
+    """
+    Simulate the threshold policy on the `jobs` (as returned by
+    `load_arrays`) for each dictionary of parameters in `runs`, and
+    return a list with their summary statistics, in the same order.
+
+    Each dictionary in `runs` can set the parameters `max_vms`,
+    `max_delta`, `max_idle`, `startup_delay` and `cluster_size`;
+    missing ones take their value from `DEFAULTS`.  Each item in the
+    returned list is a copy of the corresponding dictionary in
+    `runs`, augmented with the same keys that
+    `vmmad.simul.OrchestratorSimulation.summary` returns, with the
+    same values; `p95_wait` is estimated with the same histogram as
+    `vmmad.metrics.Distribution`, with relative resolution
+    `wait_resolution`.
+
+    As in `OrchestratorSimulation`, time advances in steps of
+    `time_interval` seconds, starting from `start_time` (default: the
+    time the first job was submitted); pending jobs are started in
+    order of submission, first on cluster nodes and then on cloud VMs
+    in the order these were started.
+    """
+    submitted_at, duration, jobid = jobs
+    if len(submitted_at) == 0:
+        raise RuntimeError("No jobs to simulate")
+    # jobs in the order they are started
+    order = np.lexsort((jobid, submitted_at))
+    sub = submitted_at[order]
+    length = duration[order]
+    N = len(sub)
+
+    # simulated time at each cycle is computed exactly as
+    # `OrchestratorSimulation` does
+    dt = int(time_interval)
+    if start_time is None:
+        start_time = float(sub[0])
+    starting_time = start_time - dt
+
+    # simulation parameters, one per row
+    params = [ dict(DEFAULTS, **run) for run in runs ]
+    B = len(params)
+    def column(name):
+        return np.array([ p[name] for p in params ], np.int64)
+    max_vms = column('max_vms')
+    max_delta = column('max_delta')
+    max_idle = column('max_idle')
+    startup_delay = column('startup_delay')
+    cluster_size = column('cluster_size')
+    if np.any(np.maximum(max_vms, cluster_size) == 0):
+        raise RuntimeError("No VMs and no cluster nodes to run jobs on")
+
+    # one row of VM slots per simulation: cluster nodes come first,
+    # then slots for at most `max_vms - cluster_size` cloud VMs
+    C = int(cluster_size.max())
+    M = max(1, int((max_vms - cluster_size).max()))
+    S = C + M
+    state = np.zeros((B, S), np.int8)
+    state[:, :C][np.arange(C) < cluster_size[:, None]] = _READY
+    busy_until = np.empty((B, S))
+    busy_until.fill(-np.inf)
+    ready_at = np.zeros((B, S))
+    last_idle = np.zeros((B, S))
+    # jobs are started on free VMs in order of this key: cluster
+    # nodes first, then cloud VMs by start order
+    vm_order = np.zeros((B, S))
+    vm_order[:, :C] = np.arange(C)
+    # views on the cloud VM slots
+    state_c = state[:, C:]
+    busy_c = busy_until[:, C:]
+    ready_c = ready_at[:, C:]
+    idle_c = last_idle[:, C:]
+    order_c = vm_order[:, C:]
+
+    # jobs are started in order, so the pending jobs of simulation
+    # `b` are those submitted at or after index `next_job[b]`; a job
+    # terminates `duration` seconds after it started
+    next_job = np.zeros(B, np.int64)
+    num_submitted = 0
+    # simulations still running
+    active = np.ones(B, bool)
+
+    # statistics
+    started = np.zeros(B, np.int64)
+    wait_sum = np.zeros(B)
+    wait_max = np.zeros(B)
+    vms_started = np.zeros(B, np.int64)
+    vm_seconds = np.zeros(B)
+    idle_vm_seconds = np.zeros(B)
+    step = math.log1p(wait_resolution)
+    # histogram of waiting times, indexed by `bin * B + b`, so that
+    # it can grow as longer waits are seen
+    histogram = np.zeros(0, np.int64)
+    pending_bins = [ ]
+    pending_count = 0
+
+    cycle = 0
+    elapsed = 0.0
+    while active.any():
+        now = starting_time + cycle * dt
+
+        # jobs submitted since the previous cycle
+        num_submitted = np.searchsorted(sub, now, 'right')
+
+        # VMs that have finished booting
+        booted = (state_c == _STARTING) & (ready_c <= now)
+        state_c[booted] = _READY
+        idle_c[booted] = 0
+
+        # start pending jobs on free VMs
+        pending = num_submitted - next_job
+        free = (state == _READY) & (busy_until <= now)
+        count = np.minimum(free.sum(axis=1), pending)
+        which = np.flatnonzero(count)
+        if len(which):
+            key = np.where(free[which], vm_order[which], np.inf)
+            slots = np.argsort(key, axis=1, kind='mergesort')[:, :count[which].max()]
+            rank = np.arange(slots.shape[1])
+            i, r = np.nonzero(rank < count[which][:, None])
+            b = which[i]
+            job = next_job[b] + r
+            busy_until[b, slots[i, r]] = now + length[job]
+            wait = now - sub[job]
+            started += np.bincount(b, minlength=B)
+            wait_sum += np.bincount(b, weights=wait, minlength=B)
+            np.maximum.at(wait_max, b, wait)
+            pending_bins.append((np.log1p(wait) / step).astype(np.int64) * B + b)
+            pending_count += len(b)
+            next_job += count
+            if pending_count > 1000000:
+                histogram = _add_to_histogram(histogram, pending_bins, B)
+                pending_bins = [ ]
+                pending_count = 0
+        candidates = pending - count
+
+        # forget stopped VMs, and account idle time
+        state_c[state_c == _DOWN] = _EMPTY
+        idle_c += elapsed
+        idle_c[busy_c > now] = 0
+
+        # start new VMs
+        running = cluster_size + ((state_c == _STARTING) | (state_c == _READY)).sum(axis=1)
+        needed = np.ceil((candidates - ratio * running) / float(ratio)).astype(np.int64)
+        to_start = np.maximum(0, np.minimum(np.minimum(max_delta, max_vms - running), needed))
+        empty = (state_c == _EMPTY)
+        position = np.cumsum(empty, axis=1) - 1
+        new = empty & (position < to_start[:, None])
+        state_c[new] = _STARTING
+        ready_c[new] = np.broadcast_to((now + startup_delay)[:, None], new.shape)[new]
+        busy_c[new] = -np.inf
+        idle_c[new] = 0
+        order_c[new] = (C + vms_started[:, None] + position + 1)[new]
+        vms_started += to_start
+
+        # stop VMs that have been idle too long
+        stop = (state_c == _READY) & (busy_c <= now) & (idle_c > max_idle[:, None])
+        state_c[stop] = _DOWN
+
+        # a simulation ends at the next cycle if all jobs have been
+        # submitted and have terminated by now (jobs started in this
+        # cycle are still in the batch system)
+        if num_submitted == N:
+            active &= ~((next_job == N) & (count == 0) & (busy_until.max(axis=1) <= now))
+
+        # account VM time until next cycle, unless the simulation ends there
+        elapsed = float(dt)
+        vm_seconds += active * (state_c != _EMPTY).sum(axis=1) * elapsed
+        idle_vm_seconds += active * ((state_c == _READY) & (busy_c <= now)).sum(axis=1) * elapsed
+        cycle += 1
+
+    histogram = _add_to_histogram(histogram, pending_bins, B)
+    histogram = histogram.reshape((-1, B)).T
+    results = [ ]
+    for n, run in enumerate(runs):
+        result = dict(run)
+        if started[n] > 0:
+            mean_wait = wait_sum[n] / started[n]
+            # nearest-rank percentile, as in `vmmad.metrics.Distribution.quantile`
+            rank = int(math.ceil(0.95 * started[n]))
+            bin = int(np.searchsorted(np.cumsum(histogram[n]), rank))
+            p95_wait = min(math.expm1((bin + 0.5) * step), float(wait_max[n]))
+            max_wait = float(wait_max[n])
+        else:
+            mean_wait = p95_wait = max_wait = 0.0
+        if vm_seconds[n] > 0:
+            idle_fraction = idle_vm_seconds[n] / vm_seconds[n]
+        else:
+            idle_fraction = 0.0
+        result.update(
+            jobs=int(started[n]),
+            mean_wait=float(mean_wait),
+            p95_wait=p95_wait,
+            max_wait=max_wait,
+            vms_started=int(vms_started[n]),
+            vm_hours=float(vm_seconds[n] / 3600.0),
+            idle_fraction=float(idle_fraction),
+            )
+        results.append(result)
+    return results
+
+
+def _add_to_histogram(histogram, bins, width):
+    """
+    Add the counts of `bins` to `histogram`, and return it; the
+    histogram is enlarged, by whole rows of `width` items, if needed.
+    """
+    if bins:
+        index, count = np.unique(np.concatenate(bins), return_counts=True)
+        if index[-1] >= len(histogram):
+            rows = index[-1] // width + 1
+            histogram = np.concatenate(
+                (histogram, np.zeros(rows * width - len(histogram), np.int64)))
+        histogram[index] += count
+    return histogram
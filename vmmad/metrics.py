@@ -0,0 +1,261 @@
+#! /usr/bin/env python
+#
+"""
+Accumulate statistics about a simulation while it runs.
+
+All accumulators in this module use memory that does not grow with
+the number of values added, so they can follow simulations of job
+histories of any length.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import json
+import math
+
+
+class Distribution(object):
+    """
+    Streaming summary of a distribution of non-negative values.
+
+    Count, mean, minimum and maximum are computed exactly.  Quantiles
+    are estimated from a histogram with logarithmically-spaced bins,
+    so that the estimate of any quantile is within a factor of
+    `1+resolution` of the exact value::
+
+      >>> d = Distribution()
+      >>> for x in xrange(1, 101):
+      ...     d.add(x)
+      >>> d.count, d.mean, d.max
+      (100, 50.5, 100)
+      >>> abs(d.quantile(0.95) - 95) < 95 * d.resolution
+      True
+
+    The number of bins in use is at most `log(1+M)/log(1+resolution)`,
+    where `M` is the largest value added (about 16'000 bins for
+    `M` = 10 million seconds and the default `resolution`),
+    independently of the number of values.
+    """
+
+    def __init__(self, resolution=1e-3):
+        self.resolution = resolution
+        self._step = math.log1p(resolution)
+        self._bins = { }
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+
+    def add(self, value):
+        """Add `value` to the distribution."""
+        assert value >= 0, "Distribution.add: value must be non-negative"
+        bin = int(math.log1p(value) / self._step)
+        self._bins[bin] = self._bins.get(bin, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.count == 1:
+            self.min = self.max = value
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+
+    @property
+    def mean(self):
+        """Average of the values added, or 0 if none was."""
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+
+    def quantile(self, q):
+        """
+        Return an estimate of the `q`-th quantile (with `q` between 0
+        and 1), using the nearest-rank definition; return 0 if no
+        value was added.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(q * self.count)))
+        seen = 0
+        for bin in sorted(self._bins):
+            seen += self._bins[bin]
+            if seen >= rank:
+                break
+        # the center of the bin, on a log scale
+        return min(math.expm1((bin + 0.5) * self._step), self.max)
+
+
+class SimulationMetrics(object):
+    """
+    Statistics about jobs and VMs in a simulation.
+
+    The simulation should call:
+
+    - `job_started` each time a job is started, with the time it
+      spent waiting;
+    - `jobs_completed` with the number of jobs that finished running;
+    - `jobs_dropped` with the number of jobs that left the batch
+      system without ever running;
+    - `vm_started` and `vm_stopped` for each cloud VM started or
+      stopped;
+    - `sample` at each step, with the number of cloud VMs and how
+      many of them were idle since the previous step.
+
+    Method `report` returns all the statistics in a dictionary,
+    which functions `write_json` and `format_text` can write out.  If
+    `sla_wait` is given, then the report includes the fraction of
+    started jobs that waited at most `sla_wait` seconds.
+    """
+
+    # quantiles of the wait time distribution to report
+    QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+    def __init__(self, sla_wait=None, resolution=1e-3):
+        self.sla_wait = sla_wait
+        self.waits = Distribution(resolution)
+        self.within_sla = 0
+        self.completed = 0
+        self.dropped = 0
+        self.vms_started = 0
+        self.vms_stopped = 0
+        self.vm_seconds = 0.0
+        self.idle_vm_seconds = 0.0
+        self.first_sample_at = None
+        self.last_sample_at = None
+
+
+    def job_started(self, wait):
+        self.waits.add(wait)
+        if self.sla_wait is not None and wait <= self.sla_wait:
+            self.within_sla += 1
+
+    def jobs_completed(self, count=1):
+        self.completed += count
+
+    def jobs_dropped(self, count=1):
+        self.dropped += count
+
+    def vm_started(self):
+        self.vms_started += 1
+
+    def vm_stopped(self):
+        self.vms_stopped += 1
+
+
+    def sample(self, now, vm_count, idle_vm_count):
+        """
+        Record that, from the previous call until time `now`,
+        `vm_count` cloud VMs were up and `idle_vm_count` of them were
+        idle.  The first call only records the starting time.
+        """
+        if self.last_sample_at is None:
+            self.first_sample_at = now
+        else:
+            span = now - self.last_sample_at
+            self.vm_seconds += vm_count * span
+            self.idle_vm_seconds += idle_vm_count * span
+        self.last_sample_at = now
+
+
+    @property
+    def idle_fraction(self):
+        """Fraction of VM time that VMs spent idle."""
+        if self.vm_seconds > 0:
+            return self.idle_vm_seconds / self.vm_seconds
+        return 0.0
+
+
+    def report(self, **extra):
+        """
+        Return a dictionary with all the statistics collected so far,
+        as nested dictionaries of numbers.  Any keyword argument is
+        added to the top-level dictionary, e.g., parameters of the
+        simulation or the cost of the VMs.
+        """
+        waits = dict(
+            mean=self.waits.mean,
+            min=(self.waits.min or 0.0),
+            max=(self.waits.max or 0.0),
+            )
+        for q in self.QUANTILES:
+            waits['p%d' % int(round(100 * q))] = self.waits.quantile(q)
+        jobs = dict(
+            started=self.waits.count,
+            completed=self.completed,
+            dropped=self.dropped,
+            wait=waits,
+            )
+        if self.sla_wait is not None:
+            jobs['sla_wait'] = self.sla_wait
+            if self.waits.count > 0:
+                jobs['sla_attainment'] = float(self.within_sla) / self.waits.count
+            else:
+                jobs['sla_attainment'] = 1.0
+        if self.first_sample_at is not None:
+            duration = self.last_sample_at - self.first_sample_at
+        else:
+            duration = 0.0
+        result = dict(
+            duration=duration,
+            jobs=jobs,
+            vms=dict(
+                started=self.vms_started,
+                stopped=self.vms_stopped,
+                hours=(self.vm_seconds / 3600.0),
+                idle_hours=(self.idle_vm_seconds / 3600.0),
+                idle_fraction=self.idle_fraction,
+                ),
+            )
+        result.update(extra)
+        return result
+
+
+def write_json(report, output):
+    """
+    Write the dictionary `report` (see `SimulationMetrics.report`) to
+    file-like object `output`, in JSON format.
+    """
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+def format_text(report):
+    """
+    Return the dictionary `report` (see `SimulationMetrics.report`)
+    as human-readable text, one line per value.
+    """
+    lines = [ ]
+    def walk(data, prefix):
+        for key in sorted(data):
+            value = data[key]
+            if isinstance(value, dict):
+                walk(value, prefix + key + '.')
+            elif isinstance(value, float):
+                lines.append("%-24s %.3f" % (prefix + key, value))
+            else:
+                lines.append("%-24s %s" % (prefix + key, value))
+    walk(report, '')
+    return str.join('\n', lines) + '\n'
@@ -68,6 +68,17 @@ class JobInfo(Struct):
     attribute, which is used to match the associated VM (if any) by
     host name.
 
+    A `JobInfo` object may stand for several tasks of an array job
+    (e.g., all the pending tasks of it); in this case, the number of
+    tasks is stored in the `task_count` attribute.  Use method
+    `num_tasks` to get the number of tasks of any job.
+
+    Information that is costly to retrieve from the batch system
+    (e.g., resource requests or the submission environment) is only
+    loaded for jobs that the `Orchestrator` policy asks for (see
+    `Orchestrator.needs_job_details`); it is then available as a
+    dictionary in the `details` attribute.  Use method `get_detail`
+    to access it regardless of whether it has been loaded.
     """
 
     # job states
@@ -99,6 +110,25 @@ class JobInfo(Struct):
         return ("Job %s" % self.jobid)
 
 
+    def num_tasks(self):
+        """
+        Return the number of tasks this object stands for.
+
+        This is 1 for regular jobs and for running tasks of an array
+        job, and the number of tasks in the range for aggregated
+        pending tasks of an array job.
+        """
+        return self.get('task_count', 1)
+
+
+    def get_detail(self, name, default=None):
+        """
+        Return the value of job detail `name`, or `default` if job
+        details have not been loaded or lack that entry.
+        """
+        return self.get('details', {}).get(name, default)
+
+
     def is_running(self):
         """
         Return `True` if the job is running.
@@ -280,6 +310,9 @@ class Orchestrator(object):
         # mapping jobid to job informations
         self.jobs = { }
         self.candidates = set()
+        # accounting records of completed jobs (see
+        # `update_job_status`) not yet matched with a terminated job
+        self._completed = { }
 
         # VM book-keeping
         self._vmid = 0
@@ -287,6 +320,12 @@ class Orchestrator(object):
         # Time simulation variable
         self.cycle = 0
 
+        # set by `stop` to end the main loop
+        self._stopped = False
+
+        # time the last cycle of the main loop was run
+        self._last_cycle_at = None
+
         # Time the job statuses were last checked
         self.last_update = 0
 
@@ -304,7 +343,7 @@ class Orchestrator(object):
                          " not restoring saved state, starting afresh instead.", chkptfile)
 
 
-    def run(self, delay=30, max_cycles=0):
+    def run(self, delay=30, max_cycles=0, resume=False):
         """
         Run the orchestrator main loop until stopped or `max_cycles` reached.
 
@@ -314,16 +353,26 @@ class Orchestrator(object):
         - update job and VM status;
         - start new VMs if needed;
         - stop running VMs if they are no longer needed.
+
+        The loop also ends when `stop` is called, e.g., from the
+        `before` hook or from another thread.  If `resume` is `True`,
+        then time spent since the last cycle of the previous `run`
+        invocation is accounted for in the first cycle, as if the
+        loop had never stopped.
         """
         done = 0
-        last_cycle_at = self.time()
+        if not resume:
+            self._last_cycle_at = self.time()
+        self._stopped = False
         while max_cycles == 0 or done < max_cycles:
             log.debug("Orchestrator %x about to start cycle %d", id(self), self.cycle)
             t0 = time.time() # need real time, not the simulated one
             now = self.time()
-            elapsed = now - last_cycle_at
+            elapsed = now - self._last_cycle_at
 
             self.before()
+            if self._stopped:
+                break
 
             self.update_job_status()
             # XXX: potentially blocking - should timeout!
@@ -372,7 +421,9 @@ class Orchestrator(object):
             done += 1
             if self.chkptfile:
                 self._save_to_file(self.chkptfile)
-            last_cycle_at = now
+            self._last_cycle_at = now
+            if self._stopped:
+                break
 
             if delay > 0:
                 t1 = time.time() # need real time, not the simulated one
@@ -426,6 +477,15 @@ class Orchestrator(object):
                       vm.vmid, ex.__class__.__name__, str(ex), exc_info=__debug__)
 
 
+    def stop(self):
+        """
+        Make the `run` main loop return at the end of the current cycle.
+
+        If called from the `before` hook, the rest of the cycle is skipped.
+        """
+        self._stopped = True
+
+
     def before(self):
         """Hook called at the start of the main run() cycle."""
         pass
@@ -486,6 +546,13 @@ class Orchestrator(object):
         now = self.time()
 
         current_jobs = self.batchsys.get_sched_info()
+        # exact data about jobs that have completed, if the batch
+        # system interface can provide it; the batch system listing
+        # may still show the job for a while, so keep the record
+        # until the job is seen terminating
+        completed = self._completed
+        if hasattr(self.batchsys, 'get_completed_jobs'):
+            completed.update((job.jobid, job) for job in self.batchsys.get_completed_jobs())
         for job in current_jobs:
             jobid = job.jobid
             if jobid in self.jobs:
@@ -521,7 +588,12 @@ class Orchestrator(object):
         terminated = jobids - current_jobids
         for jobid in terminated:
             job = self.jobs[jobid]
-            if job.state == JobInfo.RUNNING:
+            if jobid in completed:
+                job.update(completed.pop(jobid))
+                log.info("Job %s finished on node '%s' with exit status %s, after running for %d seconds.",
+                         jobid, job.exec_node_name, job.get('exit_status', '(unknown)'),
+                         job.finished_at - job.running_at)
+            elif job.state == JobInfo.RUNNING:
                 assert 'exec_node_name' in job
                 log.info("Job %s terminated its execution on node '%s'",
                          jobid, self.jobs[jobid].exec_node_name)
@@ -529,18 +601,31 @@ class Orchestrator(object):
                 assert ('exec_node_name' not in job) or (job.exec_node_name is None), (
                     "Error in job object '%s': expecting 'exec_node_name' not to be there!"
                     % str.join(', ', [ ("%s=%r" % (k,v)) for k,v in job.items() ]))
-                log.info("Job %s (state %s) was cancelled.", jobid, job.state)
+                if 'task_count' in job:
+                    log.info("No more pending tasks of array job %s.", jobid)
+                else:
+                    log.info("Job %s (state %s) was cancelled.", jobid, job.state)
             else:
                 log.info("Job %s (state %s) was deleted.", jobid, job.state)
             if job in self.candidates:
                 self.candidates.remove(job)
             del self.jobs[jobid]
+        # records of jobs that are not known (anymore) will never be used
+        for jobid in completed.keys():
+            if jobid not in self.jobs:
+                del completed[jobid]
         active_vms = [ vm for vm in self.vms.values()
                        if (vm.state in [ VmInfo.READY, VmInfo.DRAINING ]) ]
         for vm in active_vms:
             # remove jobs that are no longer in the list, i.e., they are finished
             vm.jobs -= terminated
 
+        # load details of the new pending jobs that the policy wants to inspect
+        self._load_job_details([
+            job for job in self.jobs.itervalues()
+            if (job.state == JobInfo.PENDING and job.submitted_at > self.last_update
+                and 'details' not in job and self.needs_job_details(job)) ])
+
         # update info on running jobs
         for job in self.jobs.values():
             if job.state == JobInfo.RUNNING and job.running_at > self.last_update:
@@ -565,6 +650,25 @@ class Orchestrator(object):
         return self.jobs
 
 
+    def _load_job_details(self, jobs):
+        """
+        Set the `details` attribute of each job in `jobs`, fetching
+        all of them from the batch system in one go.
+        """
+        if not jobs or not hasattr(self.batchsys, 'get_job_details'):
+            return
+        try:
+            details = self.batchsys.get_job_details(jobs)
+        except Exception, ex:
+            log.error("Error retrieving details of %d jobs: %s: %s",
+                      len(jobs), ex.__class__.__name__, str(ex))
+            return
+        for job in jobs:
+            if job.jobid in details:
+                job.details = details[job.jobid]
+        log.debug("Loaded details of %d jobs out of %d.", len(details), len(jobs))
+
+
     def vm_is_ready(self, auth, nodename):
         """
         Notify an `Orchestrator` instance that a VM is ready to accept jobs.
@@ -643,6 +747,30 @@ class Orchestrator(object):
                                       for vm in self.vms.itervalues()
                                       if vm.state == VmInfo.STARTING)
 
+    @property
+    def num_candidates(self):
+        """
+        Number of candidate tasks, counting each task of an array job.
+
+        This differs from ``len(self.candidates)`` when some array
+        jobs are pending: these are represented by a single `JobInfo`
+        object in `self.candidates`, but each of their tasks needs a
+        slot to run.
+        """
+        return sum(job.num_tasks() for job in self.candidates)
+
+
+    @property
+    def num_candidate_slots(self):
+        """
+        Total number of slots requested by the candidate tasks.
+
+        Jobs that do not specify a number of slots are assumed to
+        request one slot per task.
+        """
+        return sum(job.num_tasks() * job.get('slots', 1) for job in self.candidates)
+
+
     ##
     ## policy implementation interface
     ##
@@ -657,9 +785,24 @@ class Orchestrator(object):
         return False
 
 
+    def needs_job_details(self, job):
+        """
+        Return `True` if `is_cloud_candidate` needs the detailed
+        information about `job` that is stored in its `details`
+        attribute (see `JobInfo`).
+
+        Fetching job details is costly, so this should act as a cheap
+        prefilter, based only on the job attributes that are always
+        available: e.g., return `True` only for jobs of the user or
+        queue that the policy is about.  The default implementation
+        never asks for job details.
+        """
+        return False
+
+
     def is_new_vm_needed(self):
         """Inspect job collection and decide whether we need to start new VMs."""
-        if len(self.candidates) > 0:
+        if self.num_candidates > 0:
             return True
 
 
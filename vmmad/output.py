@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+#
+"""
+Write and read the per-cycle output of a simulation.
+
+At each cycle, `vmmad.simul.OrchestratorSimulation` produces a row
+with the values listed in `COLUMNS`; a writer created by
+`open_writer` stores them into a file, in one of two formats:
+
+- ``csv``: one text line per row, with a header line starting with
+  ``#`` (this is the format that ``plot_workload.R`` reads);
+- ``columnar``: blocks of rows stored as little-endian binary
+  columns (a 64-bit float for the time stamp, 32-bit integers for
+  the counts), which are much smaller and faster to load.
+
+In both formats, the file is gzip-compressed if its name ends with
+``.gz``.  To reduce the size of the output of long simulations, a
+writer can keep only one row every `every` cycles, and/or only
+the rows where some count differs from the previous row written;
+the last row is always written.
+
+Function `read_output` reads files in any of these formats, and
+`read_columns` loads them into arrays.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+from array import array
+import csv
+import gzip
+import struct
+import sys
+
+
+# values in each row of output
+COLUMNS = ('timestamp', 'pending_jobs', 'running_jobs', 'started_vms', 'idle_vms')
+
+# header line of CSV files
+CSV_HEADER = ['#TimeStamp', 'Pending Jobs', 'Running Jobs', 'Started VMs', 'Idle VMS']
+
+FORMATS = ('csv', 'columnar')
+
+MAGIC = 'VMMADOUT'
+VERSION = 1
+
+# columnar file header: magic, format version, number of columns
+_HEADER = struct.Struct('<8sII')
+# each block starts with the number of rows in it
+_BLOCK = struct.Struct('<I')
+
+# size of the buffer of output files
+_BUFFER_SIZE = 1 << 16
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.GzipFile(path, mode)
+    return open(path, mode, _BUFFER_SIZE)
+
+
+def open_writer(path, format='csv', every=1, changes_only=False):
+    """
+    Return a writer for simulation output into file `path`, in the
+    given `format` (one of `FORMATS`).  Only every `every`-th row is
+    written; if `changes_only` is true, rows whose counts are all
+    equal to those in the previous written row are skipped, too.
+    """
+    if format == 'csv':
+        return CsvWriter(path, every, changes_only)
+    elif format == 'columnar':
+        return ColumnarWriter(path, every, changes_only)
+    else:
+        raise RuntimeError("Unknown output format '%s': must be one of %s"
+                           % (format, str.join(', ', FORMATS)))
+
+
+class _Writer(object):
+    """
+    Sample rows of output; subclasses actually store them.
+    """
+
+    def __init__(self, path, every=1, changes_only=False):
+        assert every >= 1, "Output can only be sampled every 1 or more rows"
+        self.path = path
+        self.every = every
+        self.changes_only = changes_only
+        self._output = _open(path, 'wb')
+        self._seen = 0
+        # last row written and last row skipped, if any since
+        self._last = None
+        self._skipped = None
+
+
+    def write(self, row):
+        """
+        Write `row`, a sequence of values as listed in `COLUMNS`,
+        unless sampling skips it.
+        """
+        self._seen += 1
+        if ((self._seen - 1) % self.every != 0
+            or (self.changes_only and self._last is not None
+                and list(row[1:]) == list(self._last[1:]))):
+            self._skipped = row
+            return
+        self._write(row)
+        self._last = row
+        self._skipped = None
+
+
+    def flush(self):
+        """Write buffered data to the file."""
+        self._output.flush()
+
+
+    def close(self):
+        """Write the last row, if it was skipped, and close the file."""
+        if self._skipped is not None:
+            self._write(self._skipped)
+            self._skipped = None
+        self._output.close()
+
+
+class CsvWriter(_Writer):
+    """
+    Write simulation output in CSV format; see `open_writer`.
+    """
+
+    def __init__(self, path, every=1, changes_only=False):
+        _Writer.__init__(self, path, every, changes_only)
+        self._writer = csv.writer(self._output, delimiter=',')
+        self._writer.writerow(CSV_HEADER)
+
+    def _write(self, row):
+        self._writer.writerow(row)
+
+
+class ColumnarWriter(_Writer):
+    """
+    Write simulation output in columnar binary format; see
+    `open_writer`.  Rows are buffered into blocks of `block_size`.
+    """
+
+    def __init__(self, path, every=1, changes_only=False, block_size=4096):
+        _Writer.__init__(self, path, every, changes_only)
+        self.block_size = block_size
+        self._output.write(_HEADER.pack(MAGIC, VERSION, len(COLUMNS)))
+        self._new_block()
+
+    def _new_block(self):
+        self._columns = [array('d')] + [ array('i') for _ in COLUMNS[1:] ]
+
+    def _write(self, row):
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        if len(self._columns[0]) >= self.block_size:
+            self._write_block()
+
+    def _write_block(self):
+        count = len(self._columns[0])
+        if count == 0:
+            return
+        self._output.write(_BLOCK.pack(count))
+        for column in self._columns:
+            if sys.byteorder != 'little':
+                column.byteswap()
+            self._output.write(column.tostring())
+        self._new_block()
+
+    def flush(self):
+        self._write_block()
+        _Writer.flush(self)
+
+    def close(self):
+        if self._skipped is not None:
+            self._write(self._skipped)
+            self._skipped = None
+        self._write_block()
+        self._output.close()
+
+
+def _open_input(path):
+    """
+    Return a pair `(columnar, input_file)`, where `columnar` is
+    `True` if `path` is in columnar format, and `input_file` is
+    positioned at the start of the data.
+    """
+    with open(path, 'rb') as input_file:
+        compressed = (input_file.read(2) == '\x1f\x8b')
+    if compressed:
+        input_file = gzip.GzipFile(path, 'rb')
+    else:
+        input_file = open(path, 'rb', _BUFFER_SIZE)
+    header = input_file.read(_HEADER.size)
+    if header.startswith(MAGIC):
+        magic, version, num_columns = _HEADER.unpack(header)
+        if version != VERSION or num_columns != len(COLUMNS):
+            raise RuntimeError("Unsupported version %d of simulation output file '%s'"
+                               % (version, path))
+        return True, input_file
+    input_file.seek(0)
+    return False, input_file
+
+
+def _read_blocks(input_file):
+    """
+    Iterate over the blocks of a columnar file, yielding a list of
+    arrays (one per column) for each.
+    """
+    while True:
+        data = input_file.read(_BLOCK.size)
+        if not data:
+            break
+        count, = _BLOCK.unpack(data)
+        columns = [ ]
+        for typecode in 'd' + 'i'*(len(COLUMNS) - 1):
+            column = array(typecode)
+            column.fromstring(input_file.read(count * column.itemsize))
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns.append(column)
+        yield columns
+
+
+def read_output(path):
+    """
+    Iterate over the rows of the simulation output file `path`, in
+    any of the formats written by `open_writer`, yielding tuples of
+    values as listed in `COLUMNS` (the time stamp is a float, and
+    the counts are integers).
+    """
+    columnar, input_file = _open_input(path)
+    with input_file:
+        if columnar:
+            for columns in _read_blocks(input_file):
+                for row in zip(*columns):
+                    yield row
+        else:
+            for row in csv.reader(input_file):
+                if not row or row[0].startswith('#'):
+                    continue
+                yield (float(row[0]),) + tuple(int(value) for value in row[1:])
+
+
+def read_columns(path):
+    """
+    Return the contents of the simulation output file `path` as a
+    dictionary, mapping each name in `COLUMNS` to an `array.array`
+    of its values (which can be converted cheaply to NumPy arrays
+    with `numpy.frombuffer`).
+    """
+    columns = [array('d')] + [ array('i') for _ in COLUMNS[1:] ]
+    columnar, input_file = _open_input(path)
+    if columnar:
+        with input_file:
+            for block in _read_blocks(input_file):
+                for column, values in zip(columns, block):
+                    column.extend(values)
+    else:
+        input_file.close()
+        for row in read_output(path):
+            for column, value in zip(columns, row):
+                column.append(value)
+    return dict(zip(COLUMNS, columns))
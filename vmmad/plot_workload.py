@@ -1,8 +1,9 @@
 #! /usr/bin/env python
 #
 """
-Read a 'workload' file (as produced by ``simul.py``) and convert it to
-an interractive HTML+JavaScript plot.
+Read a 'workload' file (as produced by ``simul.py``, in any of the
+formats described in `vmmad.output`) and convert it to an
+interractive HTML+JavaScript plot.
 """
 # Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
 #
@@ -23,13 +24,15 @@ __version__ = '$Revision$'
 
 
 ## stdlib imports
-import csv
 import argparse
 import os
 import os.path
 import sys
 import time
 
+## local imports
+from vmmad.output import read_output
+
 
 ## main: run tests
 
@@ -39,16 +42,13 @@ if "__main__" == __name__:
     parser = argparse.ArgumentParser(
         description="Produce an HTML plot of the data in a workload file.")
     parser.add_argument('input',
-                        help="Input file.  Must be a CSV file, in the format"
-                        " produced by `simul.py`.")
+                        help="Input file, as produced by `simul.py`: a CSV or"
+                        " columnar file, possibly gzip-compressed.")
     parser.add_argument('output', nargs='?', default=None,
                         help="Output file. If not specified, output goes to STDOUT.")
     args = parser.parse_args()
 
     ## setup I/O
-    infile = open(args.input, 'r')
-    csv_input = csv.reader(infile)
-
     if args.output is not None:
         outfile = open(args.output, 'w')
     else:
@@ -72,18 +72,16 @@ if "__main__" == __name__:
     ''')
 
     ## main loop: one line per data point
-    for row in csv_input:
-        if row[0].startswith('#'):
-            continue
-        timestamp = time.strftime('%Y/%m/%d %H:%M:%S', time.localtime(float(row[0])))
+    for row in read_output(args.input):
+        timestamp = time.strftime('%Y/%m/%d %H:%M:%S', time.localtime(row[0]))
         outfile.write(
             r' + "' +
             str.join(',', [
                 timestamp,
-                row[1], # pending
-                row[2], # running
-                row[3], # started nodes
-                row[4], # idle nodes
+                str(row[1]), # pending
+                str(row[2]), # running
+                str(row[3]), # started nodes
+                str(row[4]), # idle nodes
                 ])
             + r'\n"')
 
@@ -0,0 +1,226 @@
+#! /usr/bin/env python
+#
+"""
+In-memory simulation of a cloud provider.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# local imports
+from vmmad import log
+from vmmad.orchestrator import VmInfo
+from vmmad.provider import NodeProvider
+from vmmad.util import pack_methods, unpack_methods
+
+
+class SimulatedCloud(NodeProvider):
+    """
+    A cloud provider that only exists in memory.
+
+    VM instances boot in `boot_time` seconds, as measured by the
+    `timer` function; `boot_time` can be a number, or an object whose
+    `next()` method returns a (possibly random) boot time at every
+    invocation, like the iterators in `vmmad.batchsys.randomjobs`.
+    When a VM has booted, the next call to `update_vm_status` invokes
+    the `on_ready` callback on its `VmInfo` object; this should do
+    what the real VM would do, i.e., notify the orchestrator, e.g.::
+
+      cloud = SimulatedCloud(on_ready=(lambda vm:
+          orchestrator.vm_is_ready(vm.auth, ('vm-%s' % vm.vmid))))
+
+    If `on_ready` is `None`, booted VMs just stay in ``STARTING``
+    state, as if they were never able to contact the orchestrator.
+
+    Failures can be injected by giving the probability that:
+
+    - `start_vm` raises a `RuntimeError` (`start_failure_rate`);
+    - a started VM crashes while booting, and turns to ``DOWN`` state
+      instead of becoming ready (`boot_failure_rate`);
+    - `stop_vm` raises a `RuntimeError`, leaving the VM running
+      (`stop_failure_rate`).
+
+    Random choices are made with a private random number generator,
+    initialized from `seed`.
+
+    The `costs` dictionary maps hardware kinds to the price of one
+    hour of VM time; VMs are of the `kind` given to the constructor,
+    unless the `VmInfo` object passed to `start_vm` has a `kind`
+    attribute.  See method `cost` for the total charged so far.
+
+    All operations take constant time (plus a logarithmic factor),
+    independently of the number of VMs; in particular,
+    `update_vm_status` only looks at VMs that have finished booting
+    since the previous call.
+    """
+
+    def __init__(self, image='1', kind='1', boot_time=60, on_ready=None,
+                 start_failure_rate=0.0, boot_failure_rate=0.0, stop_failure_rate=0.0,
+                 costs=None, seed=None, timer=time.time):
+        self.image = image
+        self.kind = kind
+        self.boot_time = boot_time
+        self.on_ready = on_ready
+        self.start_failure_rate = start_failure_rate
+        self.boot_failure_rate = boot_failure_rate
+        self.stop_failure_rate = stop_failure_rate
+        self.costs = costs or { }
+        self.timer = timer
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # running instances: ID -> `VmInfo`; the time each instance
+        # was started is recorded into its `instance` attribute
+        self._instances = { }
+        # heap of `(boot end time, instance ID)` pairs
+        self._booting = [ ]
+
+        # costs of VMs already stopped
+        self._billed = 0.0
+
+        # statistics
+        self.num_started = 0
+        self.num_failed = 0
+
+
+    def __getstate__(self):
+        # `timer` and `on_ready` are usually methods of the orchestrator
+        state = pack_methods(self.__dict__)
+        del state['_lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(unpack_methods(state))
+        self._lock = threading.Lock()
+
+
+    def _next_boot_time(self):
+        if isinstance(self.boot_time, (int, long, float)):
+            return self.boot_time
+        else:
+            return self.boot_time.next()
+
+
+    def start_vm(self, vm):
+        with self._lock:
+            if self._random.random() < self.start_failure_rate:
+                self.num_failed += 1
+                raise RuntimeError("Simulated failure starting VM %s" % vm.vmid)
+            now = self.timer()
+            instance = next(self._ids)
+            vm.instance = instance
+            vm.started_at = now
+            self._instances[instance] = vm
+            heapq.heappush(self._booting, (now + self._next_boot_time(), instance))
+            self.num_started += 1
+        log.debug("Simulated VM %s started as instance %d.", vm.vmid, instance)
+
+
+    def update_vm_status(self, vms):
+        # `vms` is not used: instances that booted since last call
+        # are found in the `self._booting` heap
+        booted = [ ]
+        with self._lock:
+            now = self.timer()
+            while self._booting and self._booting[0][0] <= now:
+                _, instance = heapq.heappop(self._booting)
+                vm = self._instances.get(instance)
+                if vm is None or vm.state != VmInfo.STARTING:
+                    # stopped while booting
+                    continue
+                if self._random.random() < self.boot_failure_rate:
+                    log.debug("Simulated VM %s crashed while booting.", vm.vmid)
+                    self.num_failed += 1
+                    self._release(instance, now)
+                    vm.state = VmInfo.DOWN
+                else:
+                    booted.append(vm)
+        # run callbacks without holding the lock, as they may well
+        # call back into this object
+        if self.on_ready is not None:
+            for vm in booted:
+                self.on_ready(vm)
+
+
+    def stop_vm(self, vm):
+        with self._lock:
+            instance = vm.get('instance', None)
+            if instance not in self._instances:
+                raise RuntimeError("VM %s is not running on this simulated cloud"
+                                   % vm.vmid)
+            if self._random.random() < self.stop_failure_rate:
+                self.num_failed += 1
+                raise RuntimeError("Simulated failure stopping VM %s" % vm.vmid)
+            self._release(instance, self.timer())
+            vm.state = VmInfo.DOWN
+
+
+    def _release(self, instance, now):
+        vm = self._instances.pop(instance)
+        self._billed += self._cost(vm, now)
+
+
+    def _cost(self, vm, now):
+        return (self.costs.get(vm.get('kind', self.kind), 0.0)
+                * (now - vm.started_at) / 3600.0)
+
+
+    def cost(self):
+        """
+        Return the total cost of VMs run so far, including the ones
+        that are still running.
+        """
+        with self._lock:
+            now = self.timer()
+            return self._billed + sum(self._cost(vm, now)
+                                      for vm in self._instances.itervalues())
+
+
+    @property
+    def num_running(self):
+        """
+        Number of VM instances currently running (or booting).
+        """
+        return len(self._instances)
+
+
+    def next_event_time(self):
+        """
+        Return the time when the next VM will finish booting, or
+        `None` if no VM is booting.
+        """
+        with self._lock:
+            # discard VMs that have been stopped while booting
+            while self._booting and self._booting[0][1] not in self._instances:
+                heapq.heappop(self._booting)
+            if self._booting:
+                return self._booting[0][0]
+            return None
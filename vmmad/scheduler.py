@@ -0,0 +1,333 @@
+#! /usr/bin/env python
+#
+"""
+Models of a batch system scheduler, for use in simulations.
+
+A scheduler model keeps the queue of pending jobs and an index of
+the execution nodes with free slots; each call to `schedule` decides
+which pending jobs start on which nodes, at a cost proportional to
+the number of jobs started (times a logarithmic factor), regardless
+of the number of nodes and pending jobs.  The simulation must tell
+the scheduler about:
+
+- nodes that become available (`add_node`) or go away (`remove_node`);
+- jobs that are submitted (`submit`), and jobs that terminate or
+  leave the queue (`remove`).
+
+A job uses as many slots as its `slots` attribute says (default: 1),
+possibly spread over several nodes, which are filled up in order of
+their `key` (see `add_node`).
+
+Three models are available, by name, in `SCHEDULERS`:
+
+- ``fifo``: jobs start in order of submission; if the first one
+  does not fit in the free slots, no job starts (`FifoScheduler`);
+- ``priority``: like ``fifo``, but jobs with a higher `JAT_prio`
+  attribute (as in GridEngine's ``qstat -xml`` output) go first
+  (`PriorityScheduler`);
+- ``backfill``: like ``priority``, but jobs further down the queue
+  may start if they do not delay the first one (`BackfillScheduler`).
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import heapq
+
+
+class FifoScheduler(object):
+    """
+    Start jobs in order of submission time (ties are broken by job
+    ID), as long as there are enough free slots for them.
+    """
+
+    def __init__(self):
+        # free slots and sort key of each node, and total free slots
+        self._free = { }
+        self._keys = { }
+        self.free_slots = 0
+        # heap of `(key, node)` pairs, for the nodes that (may) have
+        # free slots; stale entries are dropped when found at the top
+        self._index = [ ]
+        self._indexed = set()
+        # heap of `(sort key, job)` pairs; the jobs still pending are
+        # those in `self._queued`, indexed by job ID
+        self._queue = [ ]
+        self._queued = { }
+        # nodes and slots used by each running job, indexed by job ID
+        self._placement = { }
+
+
+    def add_node(self, node, key, slots=1):
+        """
+        Make `slots` slots of `node` available for running jobs.
+        Jobs are placed on nodes in increasing order of `key`.
+        """
+        self._free[node] = slots
+        self.free_slots += slots
+        self._keys[node] = key
+        self._reindex(node)
+
+
+    def remove_node(self, node):
+        """
+        Make `node` unavailable for running jobs; do nothing if it
+        was never added.
+        """
+        self.free_slots -= self._free.pop(node, 0)
+        self._keys.pop(node, None)
+
+
+    def submit(self, job):
+        """Add `job` to the queue of pending jobs."""
+        self._queued[job.jobid] = job
+        heapq.heappush(self._queue, (self._sort_key(job), job))
+
+
+    def remove(self, job):
+        """
+        Remove `job` from the scheduler: if it is running, free the
+        slots it used; if it is pending, drop it from the queue.
+        """
+        placement = self._placement.pop(job.jobid, None)
+        if placement is None:
+            self._queued.pop(job.jobid, None)
+            return
+        for node, slots in placement:
+            if node in self._free:
+                self._free[node] += slots
+                self.free_slots += slots
+                self._reindex(node)
+
+
+    def __len__(self):
+        """Return the number of pending jobs."""
+        return len(self._queued)
+
+
+    def schedule(self, now):
+        """
+        Start pending jobs on the free slots, and return a list of
+        pairs `(job, nodes)`, where `nodes` is the list of nodes the
+        job has been started on, for each job started.
+        """
+        started = [ ]
+        while self.free_slots > 0:
+            job = self._head()
+            if job is None or self._slots(job) > self.free_slots:
+                break
+            heapq.heappop(self._queue)
+            started.append((job, self._start(job)))
+        return started
+
+
+    def _sort_key(self, job):
+        return (job.submitted_at, job.jobid)
+
+
+    @staticmethod
+    def _slots(job):
+        return job.get('slots', 1)
+
+
+    def _head(self):
+        """
+        Return the first pending job in the queue, or `None`.
+        """
+        queue = self._queue
+        while queue:
+            job = queue[0][1]
+            if job.jobid in self._queued:
+                return job
+            heapq.heappop(queue)
+        return None
+
+
+    def _start(self, job):
+        """
+        Take free slots for `job` and return the list of nodes they
+        belong to; the caller must have removed `job` from the queue.
+        """
+        del self._queued[job.jobid]
+        needed = self._slots(job)
+        placement = [ ]
+        index = self._index
+        while needed > 0:
+            key, node = heapq.heappop(index)
+            self._indexed.discard(node)
+            free = self._free.get(node, 0)
+            if free == 0:
+                continue
+            slots = min(free, needed)
+            self._free[node] = free - slots
+            self.free_slots -= slots
+            needed -= slots
+            placement.append((node, slots))
+        # the last node may have slots left
+        self._reindex(node)
+        self._placement[job.jobid] = placement
+        return [ node for node, _ in placement ]
+
+
+    def _reindex(self, node):
+        if self._free.get(node, 0) > 0 and node not in self._indexed:
+            heapq.heappush(self._index, (self._keys[node], node))
+            self._indexed.add(node)
+
+
+class PriorityScheduler(FifoScheduler):
+    """
+    Start jobs in decreasing order of their `JAT_prio` attribute
+    (default: 0), and then in order of submission time, as long as
+    there are enough free slots for them.
+    """
+
+    def _sort_key(self, job):
+        return (-job.get('JAT_prio', 0.0), job.submitted_at, job.jobid)
+
+
+class BackfillScheduler(PriorityScheduler):
+    """
+    Start jobs in the same order as `PriorityScheduler`; when the
+    first job in the queue does not fit in the free slots, reserve
+    for it the slots of the running jobs that end first, and start
+    later jobs if they fit into the remaining free slots and either
+    end before the reservation or do not use the reserved slots
+    (i.e., EASY backfilling).
+
+    The end time of a job is assumed to be its start time plus
+    ``job.duration``, which is exactly when `vmmad.batchsys.replay`
+    makes it terminate; so this models a batch system where users
+    request exactly the run time their jobs need.  At most `depth`
+    jobs after the first one are considered for backfilling, to
+    bound the cost of a scheduling step.
+    """
+
+    def __init__(self, depth=100):
+        PriorityScheduler.__init__(self)
+        self.depth = depth
+        # heap of `(end time, job ID)` pairs for the running jobs
+        self._ends = [ ]
+        # time of the current scheduling step
+        self._now = 0
+
+
+    def remove(self, job):
+        PriorityScheduler.remove(self, job)
+        # jobs mostly terminate in order of end time: drop them from
+        # the top of the heap; those that terminate out of order are
+        # dropped when they are more than the running jobs, so that
+        # the heap does not grow indefinitely
+        ends = self._ends
+        while ends and ends[0][1] not in self._placement:
+            heapq.heappop(ends)
+        if len(ends) > 2 * len(self._placement) + 16:
+            self._ends = [ item for item in ends if item[1] in self._placement ]
+            heapq.heapify(self._ends)
+
+
+    def schedule(self, now):
+        self._now = now
+        started = PriorityScheduler.schedule(self, now)
+        first = self._head()
+        if first is None or self.free_slots == 0:
+            return started
+        shadow, extra = self._reservation(self._slots(first))
+        held = [ heapq.heappop(self._queue) ]
+        while self._queue and self.free_slots > 0 and len(held) <= self.depth:
+            item = heapq.heappop(self._queue)
+            job = item[1]
+            if job.jobid not in self._queued:
+                continue
+            slots = self._slots(job)
+            if slots <= self.free_slots:
+                if self._end(job) <= shadow:
+                    started.append((job, self._start(job)))
+                    continue
+                elif slots <= extra:
+                    extra -= slots
+                    started.append((job, self._start(job)))
+                    continue
+            held.append(item)
+        for item in held:
+            heapq.heappush(self._queue, item)
+        return started
+
+
+    def _start(self, job):
+        nodes = PriorityScheduler._start(self, job)
+        heapq.heappush(self._ends, (self._end(job), job.jobid))
+        return nodes
+
+
+    def _end(self, job):
+        return self._now + job.duration
+
+
+    def _reservation(self, needed):
+        """
+        Return a pair `(shadow, extra)`: `shadow` is the earliest
+        time when `needed` slots will be free, and `extra` is the
+        number of slots that will be free at that time in addition
+        to them.  If `needed` slots will never be free, `shadow` is
+        infinite and `extra` is negative.
+        """
+        free = self.free_slots
+        for end, jobid in self._in_order(self._ends):
+            placement = self._placement.get(jobid)
+            if placement is None:
+                continue
+            # slots on nodes that went away are not freed
+            free += sum(slots for node, slots in placement if node in self._free)
+            if free >= needed:
+                return end, free - needed
+        return float('inf'), free - needed
+
+
+    @staticmethod
+    def _in_order(heap):
+        """
+        Iterate over the items of `heap` in increasing order, without
+        modifying it; getting the first `k` items costs `O(k log k)`,
+        regardless of the size of the heap.
+        """
+        size = len(heap)
+        if size == 0:
+            return
+        # heap of `(item, position)` pairs: the smallest items not yet
+        # returned are among the children of those already returned
+        frontier = [ (heap[0], 0) ]
+        while frontier:
+            item, pos = heapq.heappop(frontier)
+            yield item
+            for child in (2*pos + 1, 2*pos + 2):
+                if child < size:
+                    heapq.heappush(frontier, (heap[child], child))
+
+
+# scheduler models, by name
+SCHEDULERS = dict(
+    fifo=FifoScheduler,
+    priority=PriorityScheduler,
+    backfill=BackfillScheduler,
+    )
@@ -31,7 +31,7 @@ __version__ = "1.0dev (SVN $Revision$)"
 # stdlib imports
 import argparse
 from copy import copy
-import csv
+import cPickle as pickle
 import os
 import sys
 import time
@@ -39,29 +39,104 @@ import types
 
 # local imports
 from vmmad import log
-from vmmad.batchsys.replay import JobsFromFile
-from vmmad.provider.libcloud import DummyCloud
+from vmmad.batchsys.replay import JobsFromFile, JobsFromList
+from vmmad.batchsys.trace import JobsFromTrace, is_trace_file
+from vmmad.metrics import SimulationMetrics, format_text, write_json
+from vmmad.output import FORMATS, open_writer
+from vmmad.provider.simulated import SimulatedCloud
 from vmmad.orchestrator import Orchestrator, JobInfo, VmInfo
-
-class OrchestratorSimulation(Orchestrator, DummyCloud):
+from vmmad.scheduler import SCHEDULERS
+from vmmad.util import timestamp_to_epoch
+
+
+
+class OrchestratorSimulation(Orchestrator):
+    """
+    Simulate an `Orchestrator` run on the jobs recorded in a job
+    history file (see `vmmad.batchsys.replay`).
+
+    By default, the simulated time advances in fixed steps of
+    `time_interval` seconds, and a full `Orchestrator` cycle is run at
+    each step.  If `discrete` is `True`, then the simulated time jumps
+    instead to the next event that can change the state of the
+    simulation, namely: a job is submitted or terminates, a VM
+    becomes ready, or an idle VM reaches the `max_idle` time limit.
+    Policy functions are evaluated at least every `time_interval`
+    seconds, even if no such event occurs.
+
+    Instead of a file name, `csv_file` can also be a list of jobs as
+    returned by `vmmad.batchsys.replay.load_jobs`.  Per-cycle data is
+    written into `output_file` (see `vmmad.output.open_writer` for the
+    meaning of `output_format`, `sample_every` and `changes_only`).
+    If `output_file` is `None`, then no per-cycle data is written; in
+    any case, summary statistics about the simulation can be retrieved with
+    methods `summary` and `report` after the `run` method has
+    returned; they are accumulated in the `metrics` attribute (a
+    `vmmad.metrics.SimulationMetrics` instance) while the simulation
+    runs.  Cloud VMs cost `vm_cost` per hour; the report includes the
+    fraction of jobs that waited at most `sla_wait` seconds, if given.
+
+    Pending jobs are started on cluster nodes and ready cloud VMs (one
+    slot each) by the batch system scheduler model named `scheduler`
+    (one of those in `vmmad.scheduler.SCHEDULERS`, default: FIFO),
+    which looks at the `slots` and `JAT_prio` attributes of jobs.
+
+    A simulation can be paused at a given simulated time with
+    `run_until`, saved with `save_snapshot` and restored (possibly
+    many times, in different processes) with `load_snapshot`; after
+    changing the policy parameters with `set_policy`, the restored
+    simulation continues with ``run(0, resume=True)``.  See
+    `vmmad.sweep.branch` for running many such variants in parallel.
+    """
+
+    # time (in seconds) to wait past an idle timeout, so that `can_vm_be_stopped` sees it expired
+    _EPSILON = 1e-3
 
     def __init__(self, max_vms, max_delta, max_idle, startup_delay,
-                 output_file, csv_file, start_time, time_interval, cluster_size):
-        # Convert starting time to UNIX time
+                 output_file, csv_file, start_time, time_interval, cluster_size,
+                 stream=False, end_time=None, discrete=False, sla_wait=None, vm_cost=0.0,
+                 scheduler='fifo', output_format='csv', sample_every=1, changes_only=False):
+        # Convert starting and ending time to UNIX time
         if start_time is not None and isinstance(start_time, types.StringTypes):
-            start_time = time.mktime(time.strptime(start_time, "%Y-%m-%dT%H:%M:%S" ))
-
-        # implement the `Cloud` interface to simulate a cloud provider
-        DummyCloud.__init__(self, '1', '1')
+            start_time = timestamp_to_epoch(start_time)
+        if end_time is not None and isinstance(end_time, types.StringTypes):
+            end_time = timestamp_to_epoch(end_time)
+
+        # VMs run on an in-memory cloud, and notify the orchestrator
+        # as soon as they have booted
+        cloud = SimulatedCloud(boot_time=startup_delay, on_ready=self._vm_booted,
+                               costs={'1': vm_cost}, timer=self.time)
+
+        # replay jobs from a binary trace file, if given one
+        if isinstance(csv_file, list):
+            batchsys = JobsFromList(csv_file, self.time, start_time)
+        elif is_trace_file(csv_file):
+            batchsys = JobsFromTrace(csv_file, self.time, start_time, end_time)
+        else:
+            batchsys = JobsFromFile(csv_file, self.time, start_time, stream,
+                                    end_time=end_time)
 
         # init the Orchestrator part, using `self` as cloud provider and batch system interface
         Orchestrator.__init__(
             self,
-            cloud=self,
-            batchsys=JobsFromFile(csv_file, self.time, start_time),
+            cloud=cloud,
+            batchsys=batchsys,
             max_vms=max_vms,
             max_delta=max_delta,
-            vm_start_timeout=time_interval*max(startup_delay, 10))
+            vm_start_timeout=time_interval*max(startup_delay, 10),
+            threads=1)
+
+        # run VM start/stop operations synchronously, so that the
+        # outcome of a simulation does not depend on thread scheduling
+        self._async = self._run_now
+
+        # simulate the batch system scheduler; nodes are made
+        # available to it as they become ready
+        if scheduler not in SCHEDULERS:
+            raise RuntimeError("Unknown scheduler model '%s': must be one of %s"
+                               % (scheduler, str.join(', ', sorted(SCHEDULERS))))
+        self.scheduler_name = scheduler
+        self.scheduler = SCHEDULERS[scheduler]()
 
         # make cluster nodes already available at start
         self.cluster_size = cluster_size
@@ -74,15 +149,15 @@ class OrchestratorSimulation(Orchestrator, DummyCloud):
                                        nodename=nodeid,
                                        ever_running=True)
             self.vms[nodeid] = node
+            self.scheduler.add_node(nodeid, self._vm_order(node))
 
         # Set simulation settings
         self.max_idle = max_idle
         self.startup_delay = startup_delay
 
-        self.output_file = open(output_file, "wb")
-        self.writer = csv.writer(self.output_file, delimiter=',')
-        self.writer.writerow(
-            ['#TimeStamp', 'Pending Jobs', 'Running Jobs', 'Started VMs', 'Idle VMS'])
+        self.output_options = dict(format=output_format, every=sample_every,
+                                   changes_only=changes_only)
+        self._open_output(output_file)
 
         self.time_interval = int(time_interval)
         self._next_row = None
@@ -92,65 +167,196 @@ class OrchestratorSimulation(Orchestrator, DummyCloud):
 
         # no running jobs at the onset
         self._running = 0
+        self._turning_idle = set()
+
+        # data for the `summary` and `report` methods
+        self.metrics = SimulationMetrics(sla_wait)
+
+        # see `run_until`
+        self._pause_at = None
+        self.finished = False
 
         # if `starting_time` has not been set, then use earliest job
         # submission time as starting point
         self.starting_time = self.batchsys.start_time - self.time_interval
+        self.discrete = discrete
+        self._now = self.starting_time
         log.info("Starting simulation at %s",
                  time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self.starting_time)))
 
 
+    def _open_output(self, output_file):
+        if output_file is not None:
+            self.writer = open_writer(output_file, **self.output_options)
+        else:
+            self.writer = None
+
+
+    def close_output(self):
+        """
+        Close the per-cycle output file; this happens automatically
+        when the simulation ends, but not when it is paused.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # thread pools and open files cannot be pickled; the
+        # per-cycle output is not part of a snapshot
+        for name in '_threadpool', '_shm', '_async', 'writer':
+            state.pop(name, None)
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._threadpool = None
+        self._shm = None
+        self._async = self._run_now
+        self.writer = None
+
+
+    def run_until(self, when):
+        """
+        Run the simulation until simulated time `when` is reached,
+        or it ends.  Return `True` if the simulation has been paused,
+        `False` if it has run to completion.
+
+        A paused simulation continues with ``run(0, resume=True)``
+        (or another call to `run_until`), exactly as if it had never
+        been paused.
+        """
+        self._pause_at = when
+        self.run(0, resume=(self._last_cycle_at is not None))
+        self._pause_at = None
+        return not self.finished
+
+
+    def save_snapshot(self, path):
+        """
+        Save the complete state of the simulation into file `path`;
+        see `load_snapshot`.  The per-cycle output file is flushed,
+        but not included in the snapshot.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        path_new = path + '.NEW'
+        with open(path_new, 'wb') as output:
+            pickle.dump(self, output, pickle.HIGHEST_PROTOCOL)
+        os.rename(path_new, path)
+        log.info("Saved snapshot of simulation at time %s into file '%s'",
+                 self.time(), path)
+
+
+    def set_policy(self, max_vms=None, max_delta=None, max_idle=None, startup_delay=None):
+        """
+        Change the parameters of the simulated policy; parameters
+        that are `None` are left unchanged.  VMs that are already
+        booting keep their original startup delay.
+        """
+        if max_vms is not None:
+            self.max_vms = max_vms
+        if max_delta is not None:
+            self.max_delta = max_delta
+        if max_idle is not None:
+            self.max_idle = max_idle
+        if startup_delay is not None:
+            self.startup_delay = startup_delay
+            self.cloud.boot_time = startup_delay
+            self.vm_start_timeout = self.time_interval * max(startup_delay, 10)
+
+
     def update_job_status(self):
+        # VMs that may turn idle in this cycle
+        self._turning_idle = set(vm.vmid for vm in self.vms.itervalues() if vm.jobs)
+
         # do regular work
         Orchestrator.update_job_status(self)
 
-        # count running jobs
-        self._running = len([ job for job in self.jobs.itervalues()
-                              if job.state == JobInfo.RUNNING ])
-
-        # simulate 'ready' notification from VMs
-        starting_vms = [ vm for vm in self.vms.values() if vm.state == VmInfo.STARTING ]
-        for vm in starting_vms:
-            # we use `vm.last_idle` as a countdown to the `READY` state for VMs:
-            # it is initialized to `-startup_delay` and incremented at every pass
-            if vm.last_idle >= 0:
-                nodename = ("vm-%s" % vm.vmid)
-                self.vm_is_ready(vm.auth, nodename)
-            else:
-                vm.last_idle += 1
-
-        # simulate SGE scheduler starting a new job
-        ready_vms = [ vm for vm in self.vms.values() if vm.state == VmInfo.READY ]
-        for vm in ready_vms:
-            if not vm.jobs:
-                if not self.candidates:
-                    break
-                job = self.candidates.pop()
-                job.state = JobInfo.RUNNING
-                job.exec_node_name = vm.nodename
-                job.running_at = self.time()
-                self._running += 1
-                vm.jobs.add(job.jobid)
-                log.info("Job %s just started running on node %s (%s).",
-                         job.jobid, vm.vmid, vm.nodename)
+        # count running jobs; the ones missing have completed
+        running = len([ job for job in self.jobs.itervalues()
+                        if job.state == JobInfo.RUNNING ])
+        self.metrics.jobs_completed(self._running - running)
+        self._running = running
+        # jobs should only leave the batch system after running
+        self.metrics.jobs_dropped(len([ job for job in self.batchsys.terminated
+                                        if job.state == JobInfo.PENDING ]))
+
+        # let VMs that have finished booting notify us now, so
+        # they can be assigned jobs in this same cycle
+        self.cloud.update_vm_status(self.vms.values())
+
+        if self.discrete:
+            # events happen exactly at the current time, so VMs that
+            # just turned ready or finished their jobs have not been
+            # idle since the previous cycle; offset the time that the
+            # `Orchestrator` main loop is about to add
+            elapsed = self._now - self._last_cycle_at
+            for vm in self.vms.itervalues():
+                if vm.vmid in self._turning_idle and vm.state == VmInfo.READY and not vm.jobs:
+                    vm.last_idle = -elapsed
+
+        # simulate SGE scheduler starting new jobs: free slots are
+        # filled first on the cluster nodes and then on cloud VMs in
+        # the order they were started
+        for job in self.batchsys.submitted:
+            self.scheduler.submit(job)
+        for job in self.batchsys.terminated:
+            self.scheduler.remove(job)
+        for job, vmids in self.scheduler.schedule(self.time()):
+            self.candidates.discard(job)
+            job.state = JobInfo.RUNNING
+            job.exec_node_name = self.vms[vmids[0]].nodename
+            job.running_at = self.time()
+            self.batchsys.job_started(job)
+            self.metrics.job_started(job.running_at - job.submitted_at)
+            self._running += 1
+            for vmid in vmids:
+                self.vms[vmid].jobs.add(job.jobid)
+            log.info("Job %s just started running on node(s) %s.",
+                     job.jobid, str.join(', ', vmids))
+
+
+    @staticmethod
+    def _vm_order(vm):
+        if vm.ever_running:
+            return (0, vm.vmid)
+        else:
+            return (1, int(vm.vmid))
 
 
     def before(self):
         # XXX: this only works with `JobsFromFile`!
-        if len(self.jobs) == 0 and len(self.batchsys.future_jobs) == 0:
+        if len(self.jobs) == 0 and self.batchsys.exhausted:
             log.info("No more jobs, stopping here")
-            self.output_file.close()
-            sys.exit(0)
+            self.close_output()
+            self.finished = True
+            self.stop()
+            return
+        if self._pause_at is not None and self.time() >= self._pause_at:
+            log.info("Pausing simulation at time %s", self.time())
+            self._pause_at = None
+            self.stop()
+            return
 
         vms = [ vm for vm in self.vms.values() if not vm.ever_running ]
         vm_count = len(vms)
         starting_vm_count = len([ vm for vm in vms if vm.state == VmInfo.STARTING ])
         ready_vms_count = len([ vm for vm in vms if vm.state == VmInfo.READY ])
         stopping_vms_count = len([ vm for vm in vms if vm.state == VmInfo.STOPPING ])
-        idle_vm_count = len([ vm for vm in vms if vm.last_idle > 0 ])
-        self.writer.writerow(
-            #  timestamp,  pending jobs,          running jobs,   started VMs,    idle VMs,
-            [self.time(),  len(self.candidates),  self._running,  len(self.vms)-self.cluster_size,  idle_vm_count])
+        idle_vm_count = len([ vm for vm in vms
+                              if vm.state == VmInfo.READY and not vm.jobs ])
+        if self.writer is not None:
+            self.writer.write(
+                #  timestamp,  pending jobs,          running jobs,   started VMs,    idle VMs,
+                [self.time(),  len(self.candidates),  self._running,  len(self.vms)-self.cluster_size,  idle_vm_count])
+
+        # the counts above describe the state reached in the previous
+        # cycle, which lasted until now
+        self.metrics.sample(self.time(), vm_count, idle_vm_count)
 
         log.info(
             "At time %d: pending jobs %d, running jobs %d, total started VMs %d,"
@@ -159,15 +365,114 @@ class OrchestratorSimulation(Orchestrator, DummyCloud):
             starting_vm_count, ready_vms_count, idle_vm_count, stopping_vms_count)
 
 
+    def after(self):
+        if self.discrete:
+            # VMs stopped in this cycle are gone now, not when the
+            # next cycle runs (which could be `time_interval` later)
+            for vm in self.vms.values():
+                if vm.state == VmInfo.DOWN:
+                    del self.vms[vm.vmid]
+            self._now = self._next_event_time()
+
+
+    def _next_event_time(self):
+        """
+        Return the time of the next event in a discrete-event simulation.
+        """
+        now = self._now
+        # evaluate policies at least once every `time_interval` seconds
+        events = [ now + self.time_interval ]
+        # next job submission or termination
+        when = self.batchsys.next_event_time()
+        if when is not None:
+            events.append(when)
+        # next VM ready
+        when = self.cloud.next_event_time()
+        if when is not None:
+            events.append(when)
+        for vm in self.vms.values():
+            if vm.ever_running:
+                continue
+            if vm.state == VmInfo.READY and not vm.jobs:
+                events.append(now + (self.max_idle - vm.last_idle) + self._EPSILON)
+        return min(when for when in events if when > now)
+
+
     def time(self):
         """
         Return the current time in the simulation as UNIX epoch.
         """
-        return self.starting_time + self.cycle * self.time_interval
+        if self.discrete:
+            return self._now
+        else:
+            return self.starting_time + self.cycle * self.time_interval
+
+
+    def summary(self):
+        """
+        Return a dictionary with summary statistics about the simulation:
+
+        ==============  ==========================================================
+        key             meaning
+        ==============  ==========================================================
+        jobs            number of jobs that were started
+        mean_wait       average time (seconds) jobs spent pending
+        p95_wait        95th percentile of the time jobs spent pending (see
+                        `vmmad.metrics.Distribution.quantile`)
+        max_wait        longest time a job spent pending
+        vms_started     number of VMs that were started on the cloud
+        vm_hours        total time cloud VMs were up, in hours
+        idle_fraction   fraction of `vm_hours` that VMs spent idle
+        ==============  ==========================================================
+        """
+        waits = self.metrics.waits
+        return dict(
+            jobs=waits.count,
+            mean_wait=waits.mean,
+            p95_wait=waits.quantile(0.95),
+            max_wait=(waits.max or 0.0),
+            vms_started=self.metrics.vms_started,
+            vm_hours=(self.metrics.vm_seconds / 3600.0),
+            idle_fraction=self.metrics.idle_fraction,
+            )
+
+
+    def report(self):
+        """
+        Return a report on the simulation, as a dictionary of
+        dictionaries; see `vmmad.metrics.SimulationMetrics.report`.
+        Simulation parameters and the total cost of cloud VMs are
+        added to the statistics.
+        """
+        return self.metrics.report(
+            parameters=dict(
+                max_vms=self.max_vms,
+                max_delta=self.max_delta,
+                max_idle=self.max_idle,
+                startup_delay=self.startup_delay,
+                cluster_size=self.cluster_size,
+                time_interval=self.time_interval,
+                discrete=self.discrete,
+                scheduler=self.scheduler_name,
+                ),
+            cost=self.cloud.cost())
+
+
+    @staticmethod
+    def _run_now(func, args):
+        func(*args)
 
 
     def new_vm(self, **attrs):
-        return Orchestrator.new_vm(self, ever_running=False, last_idle=-self.startup_delay)
+        self.metrics.vm_started()
+        return Orchestrator.new_vm(self, ever_running=False)
+
+
+    def _do_stop_vm(self, vm):
+        self.scheduler.remove_node(vm.vmid)
+        Orchestrator._do_stop_vm(self, vm)
+        if vm.state == VmInfo.DOWN:
+            self.metrics.vm_stopped()
 
 
     ##
@@ -178,7 +483,8 @@ class OrchestratorSimulation(Orchestrator, DummyCloud):
         return True
 
     def is_new_vm_needed(self):
-        if len(self.candidates) > 2 * len(self.vms):
+        # each VM (and cluster node) provides one slot
+        if self.num_candidate_slots > 2 * len(self.vms):
             return True
 
     def can_vm_be_stopped(self, vm):
@@ -188,23 +494,28 @@ class OrchestratorSimulation(Orchestrator, DummyCloud):
             return False
 
 
-    ##
-    ## (fake) cloud provider interface
-    ##
-
-    def start_vm(self, vm):
-        DummyCloud.start_vm(self, vm)
+    def _vm_booted(self, vm):
+        # simulate the 'ready' notification from the VM
+        self.vm_is_ready(vm.auth, ("vm-%s" % vm.vmid))
+        # start counting idle time from now
+        vm.last_idle = 0
+        self._turning_idle.add(vm.vmid)
+        self.scheduler.add_node(vm.vmid, self._vm_order(vm))
 
-    def update_vm_status(self, vms):
-        DummyCloud.update_vm_status(self, vms)
 
-    def stop_vm(self, vm):
-        assert not vm.ever_running, (
-            "Request to stop VM %s which is marked as 'ever running'"
-            % vm.vmid)
-        DummyCloud.stop_vm(self, vm)
-        return True
 
+def load_snapshot(path, output_file=None):
+    """
+    Return the `OrchestratorSimulation` saved into file `path` by
+    method `save_snapshot`.  If `output_file` is not `None`, the
+    restored simulation writes its per-cycle data there.
+    """
+    with open(path, 'rb') as input_file:
+        sim = pickle.load(input_file)
+    sim._open_output(output_file)
+    log.info("Loaded snapshot of simulation at time %s from file '%s'",
+             sim.time(), path)
+    return sim
 
 
 if "__main__" == __name__:
@@ -213,12 +524,35 @@ if "__main__" == __name__:
     parser.add_argument('--max-delta', '-md', metavar='N', dest="max_delta", default=1, type=int, help="Cap the number of VMs that can be started or stopped in a single orchestration cycle. Default is %(default)d.")
     parser.add_argument('--max-idle', '-mi', metavar='NUM_SECS', dest="max_idle", default=7200, type=int, help="Maximum idle time (in seconds) before swithing off a VM, default is %(default)s")
     parser.add_argument('--startup-delay', '-s', metavar='NUM_SECS', dest="startup_delay", default=60, type=int, help="Time (in seconds) delay before a started VM is READY. Default is %(default)s")
-    parser.add_argument('--csv-file', '-csvf',  metavar='String', dest="csv_file", default="accounting.csv", help="File containing the CSV information, %(default)s")
-    parser.add_argument('--output-file', '-o',  metavar='String', dest="output_file", default="main_sim.txt", help="File name where the output of the simulation will be stored, %(default)s")
+    parser.add_argument('--csv-file', '-csvf',  metavar='String', dest="csv_file", default="accounting.csv", help="File containing the CSV information (or a trace file created by `vmmad.batchsys.trace`), %(default)s")
+    parser.add_argument('--output-file', '-o',  metavar='String', dest="output_file", default="main_sim.txt", help="File name where the output of the simulation will be stored (gzip-compressed if the name ends with '.gz'), %(default)s")
+    parser.add_argument('--output-format', choices=FORMATS, dest="output_format", default="csv", help="Format of the output file (see `vmmad.output`); default: %(default)s")
+    parser.add_argument('--sample-every', metavar='N', type=int, dest="sample_every", default=1, help="Only write one row of output every N cycles; default: %(default)s")
+    parser.add_argument('--changes-only', action='store_true', dest="changes_only", default=False, help="Only write rows of output where some count has changed since the previous one.")
     parser.add_argument('--cluster-size', '-cs',  metavar='NUM_CPUS', dest="cluster_size", default="20", type=int, help="Number of VMs, used for the simulation of real available cluster: %(default)s")
     parser.add_argument('--start-time', '-stime',  metavar='String', dest="start_time", default=-1, help="Start time for the simulation, default: %(default)s")
+    parser.add_argument('--end-time', '-etime',  metavar='String', dest="end_time", default=None, help="Only simulate jobs submitted until this time; default: all jobs")
     parser.add_argument('--time-interval', '-timei',  metavar='NUM_SECS', type=int, dest="time_interval", default="3600", help="UNIX interval in seconds used as parsing interval for the jobs in the CSV file, default: %(default)s")
+    parser.add_argument('--stream', action='store_true', dest="stream", default=False, help="Read the CSV file (which must be sorted by submission time) while simulating, instead of loading it all at start.")
+    parser.add_argument('--discrete-events', '-D', action='store_true', dest="discrete", default=False, help="Jump to the next job or VM event instead of advancing time in fixed steps; policies are still evaluated at least once per time interval.")
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), dest="scheduler", default="fifo", help="Model of the batch system scheduler (see `vmmad.scheduler`); default: %(default)s")
+    parser.add_argument('--sla-wait', metavar='NUM_SECS', type=int, dest="sla_wait", default=None, help="Report the fraction of jobs that waited at most this long before starting.")
+    parser.add_argument('--vm-cost', metavar='PRICE', type=float, dest="vm_cost", default=0.0, help="Price of one hour of cloud VM time, for computing the total cost; default: %(default)s")
+    parser.add_argument('--snapshot-at', metavar='String', dest="snapshot_at", default=None, help="Stop the simulation at this time, and save its state into the file given with --snapshot; see `vmmad.sweep --from-snapshot`.")
+    parser.add_argument('--snapshot', metavar='String', dest="snapshot", default="simulation.snapshot", help="File where to save the state of the simulation, default: %(default)s")
+    parser.add_argument('--report', '-r', metavar='String', dest="report", default=None, help="Write summary statistics in JSON format to this file, and print them to standard output.")
     parser.add_argument('--version', '-V', action='version',
                         version=("%(prog)s version " + __version__))
     args = parser.parse_args()
-    OrchestratorSimulation(args.max_vms, args.max_delta, args.max_idle, args.startup_delay, args.output_file, args.csv_file, args.start_time, args.time_interval, args.cluster_size).run(0)
+    sim = OrchestratorSimulation(args.max_vms, args.max_delta, args.max_idle, args.startup_delay, args.output_file, args.csv_file, args.start_time, args.time_interval, args.cluster_size, args.stream, args.end_time, args.discrete, args.sla_wait, args.vm_cost, args.scheduler, args.output_format, args.sample_every, args.changes_only)
+    if args.snapshot_at is not None:
+        if sim.run_until(timestamp_to_epoch(args.snapshot_at)):
+            sim.save_snapshot(args.snapshot)
+            sim.close_output()
+    else:
+        sim.run(0)
+    if args.report is not None:
+        report = sim.report()
+        with open(args.report, 'w') as output:
+            write_json(report, output)
+        sys.stdout.write(format_text(report))
@@ -0,0 +1,292 @@
+#! /usr/bin/env python
+#
+"""
+Run `Orchestrator` simulations (see `vmmad.simul`) for many
+combinations of parameters, in parallel, and collect summary
+statistics about them into a single table.
+
+Run this module as a script, giving lists or ranges of values for
+the simulation parameters; e.g.::
+
+  python -m vmmad.sweep --csv-file accounting.csv --max-vms 10,20,40 --max-idle 600:3600:600
+
+runs one simulation for each combination of the given values, using
+all available CPUs, and writes a CSV table with one row per
+simulation.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from __future__ import absolute_import
+
+__docformat__ = 'reStructuredText'
+__version__ = '$Revision$'
+
+
+# stdlib imports
+import argparse
+import csv
+import itertools
+import logging
+import multiprocessing
+import sys
+import types
+
+# local imports
+from vmmad import log
+from vmmad.batchsys.replay import load_jobs
+from vmmad.batchsys.trace import is_trace_file
+from vmmad.scheduler import SCHEDULERS
+from vmmad.simul import OrchestratorSimulation, load_snapshot
+from vmmad.util import timestamp_to_epoch
+
+
+# simulation parameters that can be swept over
+PARAMETERS = ('max_vms', 'max_delta', 'max_idle', 'startup_delay', 'cluster_size')
+
+# parameters that can be changed when branching off a snapshot;
+# see `OrchestratorSimulation.set_policy`
+POLICY_PARAMETERS = ('max_vms', 'max_delta', 'max_idle', 'startup_delay')
+
+# columns of the result table, after the parameters;
+# see `OrchestratorSimulation.summary`
+METRICS = ('jobs', 'mean_wait', 'p95_wait', 'max_wait',
+           'vms_started', 'vm_hours', 'idle_fraction')
+
+
+def parse_values(spec):
+    """
+    Return the list of integer values described by string `spec`.
+
+    The string is a comma-separated list of items, each of which is
+    either an integer or a range ``START:STOP[:STEP]``, where
+    ``STOP`` is included if the range reaches it.
+
+    Examples::
+
+      >>> parse_values('10')
+      [10]
+      >>> parse_values('1,5:20:5')
+      [1, 5, 10, 15, 20]
+    """
+    values = [ ]
+    for item in spec.split(','):
+        bounds = [ int(bound) for bound in item.split(':') ]
+        if len(bounds) == 1:
+            values.append(bounds[0])
+        elif len(bounds) in (2, 3):
+            values.extend(xrange(bounds[0], bounds[1] + 1, *bounds[2:]))
+        else:
+            raise ValueError("Invalid range '%s': must be START:STOP or START:STOP:STEP" % item)
+    return values
+
+
+def grid(**values):
+    """
+    Return a list of dictionaries, one for each combination of the
+    given parameter values.
+
+    Examples::
+
+      >>> grid(max_vms=[10, 20], max_idle=[600]) == [
+      ...     dict(max_vms=10, max_idle=600), dict(max_vms=20, max_idle=600)]
+      True
+    """
+    names = sorted(values.keys())
+    return [ dict(zip(names, combination))
+             for combination in itertools.product(*[ values[name] for name in names ]) ]
+
+
+# the jobs to replay (or the path to a trace file): set before the
+# process pool is created, so that all forked workers share the same
+# copy of it
+_jobs = None
+
+
+def _simulate(args):
+    params, settings = args
+    kwargs = dict(settings)
+    kwargs.update(params)
+    sim = OrchestratorSimulation(output_file=None, csv_file=_jobs, **kwargs)
+    sim.run(0)
+    result = dict(params)
+    result.update(sim.summary())
+    return result
+
+
+def sweep(csv_file, runs, processes=None, start_time=None, end_time=None,
+          time_interval=3600, discrete=False, fast=False, scheduler='fifo'):
+    """
+    Run one simulation for each dictionary of parameters in `runs`,
+    and return a list with their summary statistics, in the same
+    order.
+
+    Each dictionary in `runs` supplies keyword arguments to
+    `OrchestratorSimulation` (among those listed in `PARAMETERS`);
+    parameters not in the dictionary take their default value from
+    the command-line interface of `vmmad.simul`.  Each item in the
+    returned list is a copy of the corresponding parameters
+    dictionary, augmented with the keys returned by
+    `OrchestratorSimulation.summary`.
+
+    Simulations are run in `processes` parallel processes (default:
+    as many as CPUs).  The job history in `csv_file` is only read
+    once, before starting them; if it is a trace file (see
+    `vmmad.batchsys.trace`), then it is memory-mapped by each
+    simulation instead, which has the same effect.
+
+    If `fast` is true, all simulations are run at once, in the
+    calling process, by `vmmad.fastsim.simulate` (which needs NumPy);
+    this is much faster, but cannot run discrete-event simulations,
+    nor use a `scheduler` model other than FIFO.
+    """
+    global _jobs
+    if start_time is not None and isinstance(start_time, types.StringTypes):
+        start_time = timestamp_to_epoch(start_time)
+    if end_time is not None and isinstance(end_time, types.StringTypes):
+        end_time = timestamp_to_epoch(end_time)
+    if fast:
+        if discrete:
+            raise RuntimeError("Discrete-event simulations cannot be run in fast mode.")
+        if scheduler != 'fifo':
+            raise RuntimeError("Only the FIFO scheduler can be simulated in fast mode.")
+        # NumPy is only needed here
+        from vmmad import fastsim
+        log.info("Running %d simulations in fast mode ...", len(runs))
+        return fastsim.simulate(fastsim.load_arrays(csv_file, start_time, end_time),
+                                runs, time_interval, start_time)
+    if is_trace_file(csv_file):
+        _jobs = csv_file
+    else:
+        _jobs = load_jobs(csv_file, start_time, end_time)
+
+    settings = dict(max_vms=10, max_delta=1, max_idle=7200,
+                    startup_delay=60, cluster_size=20,
+                    start_time=start_time, end_time=end_time,
+                    time_interval=time_interval, discrete=discrete,
+                    scheduler=scheduler)
+    tasks = [ (params, settings) for params in runs ]
+    log.info("Running %d simulations ...", len(tasks))
+    return _map(_simulate, tasks, processes)
+
+
+def _map(func, tasks, processes):
+    if processes == 1:
+        return [ func(task) for task in tasks ]
+    # each simulation leaves a few threads behind (see
+    # `Orchestrator.__init__`), so use a new process for each one
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+    try:
+        return pool.map(func, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _branch(args):
+    params, snapshot = args
+    sim = load_snapshot(snapshot)
+    sim.set_policy(**params)
+    sim.run(0, resume=True)
+    result = dict((name, getattr(sim, name)) for name in POLICY_PARAMETERS)
+    result['cluster_size'] = sim.cluster_size
+    result.update(sim.summary())
+    return result
+
+
+def branch(snapshot, runs, processes=None):
+    """
+    Continue the simulation saved in file `snapshot` (see
+    `OrchestratorSimulation.save_snapshot`) once for each dictionary
+    of policy parameters in `runs`, and return a list with their
+    summary statistics, like `sweep` does.
+
+    Each dictionary in `runs` supplies keyword arguments to
+    `OrchestratorSimulation.set_policy` (among those listed in
+    `POLICY_PARAMETERS`); parameters not in the dictionary keep the
+    value they had in the saved simulation, which is reported in the
+    results.  Statistics cover the whole simulated time, including
+    the part before the snapshot.
+    """
+    for params in runs:
+        for name in params:
+            if name not in POLICY_PARAMETERS:
+                raise RuntimeError("Parameter '%s' cannot be changed in a saved simulation"
+                                   % name)
+    tasks = [ (params, snapshot) for params in runs ]
+    log.info("Running %d simulations from snapshot '%s' ...", len(tasks), snapshot)
+    return _map(_branch, tasks, processes)
+
+
+def write_results(results, output):
+    """
+    Write the list of `results` returned by `sweep` to file-like
+    object `output`, as a CSV table with one row per simulation.
+    """
+    writer = csv.writer(output)
+    writer.writerow(PARAMETERS + METRICS)
+    for result in results:
+        writer.writerow([ result.get(column, '') for column in PARAMETERS + METRICS ])
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(
+        description="Run `vmmad.simul` simulations for all combinations of the given parameter values.",
+        epilog="Values of the simulation parameters are given as comma-separated"
+        " lists of integers or START:STOP[:STEP] ranges, e.g., '10,20:50:10'.")
+    # default values of the policy parameters; when continuing a
+    # snapshot, parameters that are not given keep their saved value
+    defaults = dict(max_vms="10", max_delta="1", max_idle="7200", startup_delay="60")
+    parser.add_argument('--max-vms', '-mv', metavar='VALUES', dest="max_vms", default=None, type=parse_values, help="Maximum number of VMs to be started, default is %s" % defaults['max_vms'])
+    parser.add_argument('--max-delta', '-md', metavar='VALUES', dest="max_delta", default=None, type=parse_values, help="Cap the number of VMs that can be started or stopped in a single orchestration cycle. Default is %s." % defaults['max_delta'])
+    parser.add_argument('--max-idle', '-mi', metavar='VALUES', dest="max_idle", default=None, type=parse_values, help="Maximum idle time (in seconds) before swithing off a VM, default is %s" % defaults['max_idle'])
+    parser.add_argument('--startup-delay', '-s', metavar='VALUES', dest="startup_delay", default=None, type=parse_values, help="Time (in seconds) delay before a started VM is READY. Default is %s" % defaults['startup_delay'])
+    parser.add_argument('--cluster-size', '-cs', metavar='VALUES', dest="cluster_size", default="20", type=parse_values, help="Number of VMs, used for the simulation of real available cluster: %(default)s")
+    parser.add_argument('--csv-file', '-csvf', metavar='String', dest="csv_file", default="accounting.csv", help="File containing the CSV information (or a trace file created by `vmmad.batchsys.trace`), %(default)s")
+    parser.add_argument('--start-time', '-stime', metavar='String', dest="start_time", default=None, help="Start time for the simulations; default: first job submission")
+    parser.add_argument('--end-time', '-etime', metavar='String', dest="end_time", default=None, help="Only simulate jobs submitted until this time; default: all jobs")
+    parser.add_argument('--time-interval', '-timei', metavar='NUM_SECS', type=int, dest="time_interval", default=3600, help="Time between two orchestrator cycles, default: %(default)s")
+    parser.add_argument('--discrete-events', '-D', action='store_true', dest="discrete", default=False, help="Run discrete-event simulations (see `vmmad.simul`).")
+    parser.add_argument('--scheduler', choices=sorted(SCHEDULERS), dest="scheduler", default="fifo", help="Model of the batch system scheduler (see `vmmad.scheduler`); default: %(default)s")
+    parser.add_argument('--fast', '-F', action='store_true', dest="fast", default=False, help="Run all simulations at once with `vmmad.fastsim` (requires NumPy); not compatible with --discrete-events.")
+    parser.add_argument('--from-snapshot', metavar='String', dest="snapshot", default=None, help="Continue the simulation saved in this file (see `vmmad.simul --snapshot-at`) with each combination of the policy parameters, instead of simulating from the start; policy parameters that are not given keep their saved value, --cluster-size and the job history options are ignored.")
+    parser.add_argument('--processes', '-j', metavar='N', type=int, dest="processes", default=None, help="Number of simulations to run in parallel; default: number of CPUs")
+    parser.add_argument('--output-file', '-o', metavar='String', dest="output_file", default=None, help="File where to write the table of results; default: standard output")
+    parser.add_argument('--verbose', '-v', action='store_true', default=False, help="Log the progress of each simulation.")
+    parser.add_argument('--version', '-V', action='version',
+                        version=("%(prog)s version " + __version__))
+    args = parser.parse_args()
+    if not args.verbose:
+        log.setLevel(logging.WARNING)
+
+    if args.snapshot is not None:
+        runs = grid(**dict((name, getattr(args, name)) for name in POLICY_PARAMETERS
+                           if getattr(args, name) is not None))
+        results = branch(args.snapshot, runs, args.processes)
+    else:
+        for name, value in defaults.iteritems():
+            if getattr(args, name) is None:
+                setattr(args, name, parse_values(value))
+        runs = grid(**dict((name, getattr(args, name)) for name in PARAMETERS))
+        results = sweep(args.csv_file, runs, args.processes, args.start_time,
+                        args.end_time, args.time_interval, args.discrete, args.fast,
+                        args.scheduler)
+    if args.output_file is None:
+        write_results(results, sys.stdout)
+    else:
+        with open(args.output_file, 'wb') as output:
+            write_results(results, output)
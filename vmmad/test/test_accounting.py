@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.accounting` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# local imports
+from vmmad.batchsys.accounting import AccountingFile, AccountingFollower, parse_accounting_line
+from vmmad.orchestrator import JobInfo, Orchestrator
+
+
+def make_accounting_line(jobid, task=0, submitted_at=1322068800, exit_status=0):
+    fields = ['all.q', 'compute-0-1', 'users', 'cpanse', 'STDIN', str(jobid), 'sge', '0',
+              str(submitted_at), str(submitted_at + 10), str(submitted_at + 70),
+              '0', str(exit_status)] + (['0'] * 21) + ['1', str(task)] + (['0'] * 9)
+    return str.join(':', fields) + '\n'
+
+
+class TestParseAccountingLine(unittest.TestCase):
+
+    def test_job(self):
+        job = parse_accounting_line(make_accounting_line(42, exit_status=1))
+        self.assertEqual(job.jobid, '42')
+        self.assertEqual(job.state, JobInfo.FINISHED)
+        self.assertEqual(job.exec_node_name, 'compute-0-1')
+        self.assertEqual(job.finished_at - job.running_at, 60)
+        self.assertEqual(job.exit_status, 1)
+        self.assertEqual(job.slots, 1)
+
+    def test_array_task(self):
+        job = parse_accounting_line(make_accounting_line(42, task=7))
+        self.assertEqual(job.jobid, '42.7')
+
+    def test_comments_and_never_run(self):
+        self.assertEqual(parse_accounting_line('# Version: 6.2u5\n'), None)
+        self.assertEqual(parse_accounting_line(make_accounting_line(42, submitted_at=0)), None)
+
+
+class TestAccountingFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'accounting')
+        self.state_file = os.path.join(self.tmpdir, 'accounting.state')
+        self.append(make_accounting_line(1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, data, path=None):
+        with open(path or self.path, 'a') as stream:
+            stream.write(data)
+
+    def jobids(self, accounting):
+        return [job.jobid for job in accounting.poll()]
+
+    def test_starts_at_end(self):
+        accounting = AccountingFile(self.path)
+        self.assertEqual(self.jobids(accounting), [ ])
+        self.append(make_accounting_line(2))
+        self.assertEqual(self.jobids(accounting), ['2'])
+        self.assertEqual(self.jobids(accounting), [ ])
+
+    def test_from_start(self):
+        accounting = AccountingFile(self.path, from_start=True)
+        self.assertEqual(self.jobids(accounting), ['1'])
+
+    def test_partial_line(self):
+        accounting = AccountingFile(self.path)
+        line = make_accounting_line(2)
+        self.append(line[:20])
+        self.assertEqual(self.jobids(accounting), [ ])
+        self.append(line[20:])
+        self.assertEqual(self.jobids(accounting), ['2'])
+
+    def test_rotation(self):
+        accounting = AccountingFile(self.path)
+        accounting.poll()
+        self.append(make_accounting_line(2))
+        os.rename(self.path, self.path + '.0')
+        self.append(make_accounting_line(3))
+        self.assertEqual(self.jobids(accounting), ['2', '3'])
+
+    def test_truncation(self):
+        accounting = AccountingFile(self.path)
+        accounting.poll()
+        open(self.path, 'w').close()
+        self.assertEqual(self.jobids(accounting), [ ])
+        self.append(make_accounting_line(2))
+        self.assertEqual(self.jobids(accounting), ['2'])
+
+    def test_state_file(self):
+        accounting = AccountingFile(self.path, self.state_file, from_start=True)
+        self.assertEqual(self.jobids(accounting), ['1'])
+        self.append(make_accounting_line(2))
+        # a new instance picks up where the old one left
+        accounting = AccountingFile(self.path, self.state_file)
+        self.assertEqual(self.jobids(accounting), ['2'])
+
+
+class _FakeBatchSystem(object):
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.polls = 0
+
+    def get_sched_info(self):
+        self.polls += 1
+        return list(self.jobs)
+
+
+class TestAccountingFollower(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'accounting')
+        open(self.path, 'w').close()
+        self.now = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_completed_jobs_are_removed(self):
+        batchsys = _FakeBatchSystem([
+            JobInfo(jobid='1', state=JobInfo.RUNNING, exec_node_name='compute-0-1'),
+            JobInfo(jobid='2', state=JobInfo.RUNNING, exec_node_name='compute-0-1'),
+            ])
+        follower = AccountingFollower(batchsys, self.path, poll_interval=60,
+                                      timer=(lambda: self.now))
+        self.assertEqual(len(follower.get_sched_info()), 2)
+        with open(self.path, 'a') as stream:
+            stream.write(make_accounting_line(1))
+        self.now = 30
+        jobs = follower.get_sched_info()
+        self.assertEqual([job.jobid for job in jobs], ['2'])
+        # the batch system has not been queried again
+        self.assertEqual(batchsys.polls, 1)
+        completed = follower.get_completed_jobs()
+        self.assertEqual([job.jobid for job in completed], ['1'])
+        self.assertEqual(follower.get_completed_jobs(), [ ])
+
+    def test_lagging_listing(self):
+        batchsys = _FakeBatchSystem([
+            JobInfo(jobid='1', state=JobInfo.RUNNING, exec_node_name='compute-0-1'),
+            ])
+        follower = AccountingFollower(batchsys, self.path, poll_interval=60,
+                                      timer=(lambda: self.now))
+        with open(self.path, 'a') as stream:
+            stream.write(make_accounting_line(1))
+        self.assertEqual(follower.get_sched_info(), [ ])
+        # the batch system still lists the job at the next poll
+        self.now = 60
+        self.assertEqual(follower.get_sched_info(), [ ])
+        self.assertEqual(batchsys.polls, 2)
+        # once it is gone, the same ID can be listed again
+        batchsys.jobs = [ ]
+        self.now = 120
+        self.assertEqual(follower.get_sched_info(), [ ])
+        batchsys.jobs = [ JobInfo(jobid='1', state=JobInfo.PENDING, submitted_at=0) ]
+        self.now = 180
+        self.assertEqual([job.jobid for job in follower.get_sched_info()], ['1'])
+
+
+class _CompletingBatchSystem(_FakeBatchSystem):
+
+    def __init__(self, jobs):
+        _FakeBatchSystem.__init__(self, jobs)
+        self.completed = [ ]
+
+    def get_completed_jobs(self):
+        completed = self.completed
+        self.completed = [ ]
+        return completed
+
+
+class TestOrchestratorCompletions(unittest.TestCase):
+
+    def test_record_before_termination(self):
+        job = JobInfo(jobid='1', state=JobInfo.RUNNING, exec_node_name='compute-0-1',
+                      submitted_at=time.time(), running_at=time.time())
+        batchsys = _CompletingBatchSystem([job])
+        orchestrator = Orchestrator(None, batchsys, max_vms=0)
+        orchestrator.update_job_status()
+        # accounting record arrives while the job is still listed
+        batchsys.completed = [ parse_accounting_line(make_accounting_line(1, exit_status=3)) ]
+        orchestrator.update_job_status()
+        self.assertFalse('exit_status' in job)
+        batchsys.jobs = [ ]
+        orchestrator.update_job_status()
+        self.assertEqual(job.exit_status, 3)
+        self.assertEqual(orchestrator._completed, { })
+
+    def test_record_of_unknown_job(self):
+        batchsys = _CompletingBatchSystem([ ])
+        orchestrator = Orchestrator(None, batchsys, max_vms=0)
+        batchsys.completed = [ parse_accounting_line(make_accounting_line(1)) ]
+        orchestrator.update_job_status()
+        self.assertEqual(orchestrator._completed, { })
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
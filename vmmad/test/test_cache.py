@@ -0,0 +1,172 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.cache` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# local imports
+from vmmad.batchsys import BatchSystem
+from vmmad.batchsys.cache import CachedBatchSystem, SnapshotFile
+from vmmad.orchestrator import JobInfo
+
+
+class _CountingBatchSystem(BatchSystem):
+    """Return a new job list at each query, optionally after a delay."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.queries = 0
+
+    def get_sched_info(self):
+        self.queries += 1
+        time.sleep(self.delay)
+        return [ JobInfo(jobid=str(self.queries), state=JobInfo.PENDING) ]
+
+    def get_completed_jobs(self):
+        # the job of the previous query has completed
+        return [ JobInfo(jobid=str(self.queries - 1), state=JobInfo.FINISHED) ]
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachedBatchSystem(unittest.TestCase):
+
+    def test_ttl(self):
+        clock = _Clock()
+        batchsys = _CountingBatchSystem()
+        cached = CachedBatchSystem(batchsys, ttl=30, timer=clock)
+        jobs = cached.get_sched_info()
+        clock.now += 29
+        self.assertEqual(cached.get_sched_info(), jobs)
+        self.assertEqual(batchsys.queries, 1)
+        clock.now += 1
+        self.assertNotEqual(cached.get_sched_info(), jobs)
+        self.assertEqual(batchsys.queries, 2)
+
+    def test_single_flight(self):
+        batchsys = _CountingBatchSystem(delay=0.2)
+        cached = CachedBatchSystem(batchsys, ttl=30)
+        results = [ ]
+        threads = [ threading.Thread(target=lambda: results.append(cached.get_sched_info()))
+                    for _ in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(batchsys.queries, 1)
+        self.assertEqual(len(results), 8)
+
+    def test_callers_get_copies(self):
+        cached = CachedBatchSystem(_CountingBatchSystem(), ttl=30)
+        jobs = cached.get_sched_info()
+        jobs[0].state = JobInfo.RUNNING
+        self.assertEqual(cached.get_sched_info()[0].state, JobInfo.PENDING)
+
+    def test_completed_jobs(self):
+        clock = _Clock()
+        batchsys = _CountingBatchSystem()
+        cached = CachedBatchSystem(batchsys, ttl=30, timer=clock)
+        cached.get_sched_info()
+        clock.now += 30
+        cached.get_sched_info()
+        # every consumer sees the completions of the latest refresh
+        for _ in range(2):
+            completed = cached.get_completed_jobs()
+            self.assertEqual([ (job.jobid, job.state) for job in completed ],
+                             [('1', JobInfo.FINISHED)])
+            completed[0].state = JobInfo.PENDING
+        self.assertEqual(batchsys.queries, 2)
+        clock.now += 30
+        self.assertEqual([ job.jobid for job in cached.get_completed_jobs() ], ['2'])
+        self.assertEqual(batchsys.queries, 3)
+
+
+class TestSnapshotFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.snapshot')
+        self.clock = _Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_published_snapshot(self):
+        batchsys = _CountingBatchSystem()
+        cached = CachedBatchSystem(batchsys, publish=self.path, timer=self.clock)
+        jobs = cached.get_sched_info()
+        reader = SnapshotFile(self.path, max_age=60, timer=self.clock)
+        self.assertEqual(reader.get_sched_info(), jobs)
+        self.assertEqual(os.listdir(self.tmpdir), ['jobs.snapshot'])
+        self.assertEqual(type(reader.get_sched_info()[0].jobid), str)
+
+    def test_snapshot_is_json(self):
+        CachedBatchSystem(_CountingBatchSystem(), publish=self.path,
+                          timer=self.clock).get_sched_info()
+        with open(self.path, 'rb') as snapshot:
+            data = json.load(snapshot)
+        self.assertEqual(data['taken_at'], 1000)
+        self.assertEqual(data['jobs'], [ dict(jobid='1', state=JobInfo.PENDING) ])
+
+    def test_corrupt_snapshot(self):
+        with open(self.path, 'wb') as snapshot:
+            snapshot.write("cos\nsystem\n(S'true'\ntR.")
+        fallback = _CountingBatchSystem()
+        reader = SnapshotFile(self.path, max_age=60, fallback=fallback, timer=self.clock)
+        reader.get_sched_info()
+        self.assertEqual(fallback.queries, 1)
+
+    def test_stale_snapshot(self):
+        CachedBatchSystem(_CountingBatchSystem(), publish=self.path,
+                          timer=self.clock).get_sched_info()
+        self.clock.now += 60
+        self.assertRaises(RuntimeError,
+                          SnapshotFile(self.path, max_age=60, timer=self.clock).get_sched_info)
+        fallback = _CountingBatchSystem()
+        reader = SnapshotFile(self.path, max_age=60, fallback=fallback, timer=self.clock)
+        reader.get_sched_info()
+        self.assertEqual(fallback.queries, 1)
+
+    def test_missing_file(self):
+        self.assertRaises(RuntimeError, SnapshotFile(self.path).get_sched_info)
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
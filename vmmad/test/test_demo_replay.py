@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.demo.replay` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 3rd party modules
+try:
+    import flask
+    from werkzeug.serving import make_server
+    from vmmad.demo.replay import ReplayOrchestrator, ReplayedCluster
+except ImportError:
+    flask = None
+
+# local imports
+from vmmad.orchestrator import JobInfo
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@unittest.skipIf(flask is None, "Flask is not installed")
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+            for jobid in xrange(40):
+                output.write("%d,%d,%d\n" % (jobid+1, 1000 + 10*jobid, 300))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cluster(self):
+        clock = _Clock(1000)
+        cluster = ReplayedCluster(self.path, clock, cluster_size=2)
+        clock.now = 1025
+        jobs = cluster.get_sched_info()
+        self.assertEqual(sorted(job.state for job in jobs),
+                         [JobInfo.PENDING, JobInfo.RUNNING, JobInfo.RUNNING])
+        cluster.add_node('vm-1')
+        clock.now = 1030
+        running = [ job for job in cluster.get_sched_info() if job.state == JobInfo.RUNNING ]
+        self.assertEqual(sorted(job.exec_node_name for job in running),
+                         ['clusternode-0', 'clusternode-1', 'vm-1'])
+
+    def test_replay(self):
+        # VMs notify the orchestrator over HTTP
+        app = flask.Flask(__name__)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        demo = ReplayOrchestrator(
+            self.path, ("http://127.0.0.1:%d/x/ready" % server.server_port),
+            speed=1000, delay=10, max_vms=4, max_idle=60, startup_delay=20, cluster_size=1,
+            chkptfile=os.path.join(self.tmpdir, 'vm-mad.state'))
+        app.register_blueprint(demo)
+        web = threading.Thread(target=server.serve_forever)
+        web.daemon = True
+        web.start()
+        try:
+            demo._daemon.join(30)
+            self.assertFalse(demo._daemon.is_alive())
+        finally:
+            server.shutdown()
+        report = demo.report()
+        self.assertEqual(report['wait']['count'], 40)
+        self.assertEqual(report['latency']['ready']['count'], report['vms_started'])
+        self.assertTrue(report['vms_started'] > 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'vm-mad.state')))
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.distil` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import json
+import random
+from StringIO import StringIO
+
+# stdlib imports
+import csv
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.batchsys.gridengine import GridEngine
+from vmmad.benchmark.qstat import make_qstat_xml
+from vmmad.distil import Distil
+from vmmad.orchestrator import JobInfo
+
+
+def make_accounting_line(jobid, task=0, submitted_at=1322068800):
+    fields = ['all.q', 'compute-0-1', 'users', 'cpanse', 'STDIN', str(jobid), 'sge', '0',
+              str(submitted_at), str(submitted_at + 10), str(submitted_at + 70),
+              '0', '0'] + (['0'] * 21) + ['1', str(task)] + (['0'] * 9)
+    return str.join(':', fields) + '\n'
+
+
+class TestDistil(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.data_dir, 'output.csv')
+        self.state_file = os.path.join(self.data_dir, 'state')
+        self.snapshots = [ ]
+        for n in range(4):
+            self._add_snapshot(n)
+        with open(os.path.join(self.data_dir, 'accounting'), 'w') as accounting:
+            accounting.write(make_accounting_line(1))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def _add_snapshot(self, n):
+        xml_data = make_qstat_xml(20, seed=n)
+        # alternate plain and compressed files
+        filename = os.path.join(self.data_dir, 'qstat.%03d.xml' % n)
+        if n % 2:
+            filename += '.gz'
+            xml_file = gzip.open(filename, 'wb')
+        else:
+            xml_file = open(filename, 'wb')
+        with xml_file:
+            xml_file.write(xml_data)
+        self.snapshots.append(xml_data)
+
+    def _run(self, **kwargs):
+        Distil(self.data_dir, self.output_file, True, 'accounting', **kwargs).run()
+        with open(self.output_file, 'r') as output:
+            return list(csv.reader(output))
+
+    def _pending(self, xml_data):
+        return [ job.jobid for job in GridEngine.parse_qstat_xml_output(xml_data)
+                 if job.state == JobInfo.PENDING ]
+
+    def test_pending_jobs(self):
+        rows = self._run(processes=1)
+        self.assertEqual(rows[0][0], 'JOBID')
+        # snapshots are processed in reverse order, then accounting data
+        expected = [ ]
+        for xml_data in reversed(self.snapshots):
+            expected += self._pending(xml_data)
+        self.assertEqual([ row[0] for row in rows[1:-1] ], expected)
+        self.assertEqual(rows[-1][0], '1')
+
+    def test_array_tasks(self):
+        with open(os.path.join(self.data_dir, 'accounting'), 'a') as accounting:
+            accounting.write(make_accounting_line(2, task=1))
+            accounting.write(make_accounting_line(2, task=2))
+        rows = self._run(processes=1)
+        self.assertEqual([ row[0] for row in rows[-3:] ], ['1', '2', '2'])
+
+    def test_parallel(self):
+        serial = self._run(processes=1)
+        parallel = self._run(processes=2)
+        # the wait duration depends on the time of the run
+        self.assertEqual([ row[:2] for row in serial ], [ row[:2] for row in parallel ])
+
+    def test_incremental(self):
+        first = self._run(processes=1, state_file=self.state_file)
+        # new data arrives
+        self._add_snapshot(4)
+        with open(os.path.join(self.data_dir, 'accounting'), 'a') as accounting:
+            accounting.write(make_accounting_line(2))
+        rows = self._run(processes=1, state_file=self.state_file)
+        self.assertEqual(rows[:len(first)], first)
+        self.assertEqual([ row[0] for row in rows[len(first):] ],
+                         self._pending(self.snapshots[4]) + ['2'])
+        # nothing new: nothing added
+        self.assertEqual(self._run(processes=1, state_file=self.state_file), rows)
+
+    def test_rotated_accounting_file(self):
+        path = os.path.join(self.data_dir, 'accounting')
+        first = self._run(processes=1, state_file=self.state_file)
+        # the file is rotated, and the new one is shorter than the
+        # position reached in the old one
+        os.rename(path, path + '.0')
+        with open(path, 'w') as accounting:
+            accounting.write(make_accounting_line(2))
+        rows = self._run(processes=1, state_file=self.state_file)
+        self.assertEqual(rows[:len(first)], first)
+        self.assertEqual([ row[0] for row in rows[len(first):] ], ['2'])
+        # a rotated file as long as the old one is detected too
+        os.rename(path, path + '.1')
+        with open(path, 'w') as accounting:
+            accounting.write(make_accounting_line(3) + make_accounting_line(4))
+        rows = self._run(processes=1, state_file=self.state_file)
+        self.assertEqual([ row[0] for row in rows[-2:] ], ['3', '4'])
+
+    def test_no_state_overwrites(self):
+        first = self._run(processes=1, state_file=self.state_file)
+        os.remove(self.output_file)
+        self.assertEqual(len(self._run(processes=1, state_file=self.state_file)), len(first))
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.fastsim` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# 3rd party modules
+try:
+    import numpy
+    from vmmad import fastsim
+except ImportError:
+    numpy = None
+
+# local imports
+from vmmad.batchsys.trace import convert_csv
+from vmmad.sweep import grid, sweep
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestFastSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+            for n in xrange(60):
+                # bursts of jobs, with quiet periods in between
+                output.write("%d,%d,%d\n" % (n+1, 1000 + 15*n + 3000*(n // 20), 300 + 37*(n % 7)))
+        self.runs = grid(max_vms=[4, 22], max_delta=[1, 3], max_idle=[60, 600],
+                         startup_delay=[60, 400], cluster_size=[1, 20])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertSameResults(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for slow, fast in zip(expected, actual):
+            self.assertEqual(sorted(slow.keys()), sorted(fast.keys()))
+            for key, value in slow.iteritems():
+                if key == 'p95_wait':
+                    # computed from a histogram
+                    self.assertTrue(abs(fast[key] - value) <= 1e-3*value + 1e-9, key)
+                elif isinstance(value, float):
+                    self.assertAlmostEqual(fast[key], value, places=6, msg=key)
+                else:
+                    self.assertEqual(fast[key], value, key)
+
+    def test_same_as_simulation(self):
+        for time_interval in 60, 300:
+            self.assertSameResults(
+                sweep(self.path, self.runs, processes=1, time_interval=time_interval),
+                fastsim.simulate(fastsim.load_arrays(self.path), self.runs, time_interval))
+
+    def test_time_window(self):
+        self.assertSameResults(
+            sweep(self.path, self.runs, processes=1, time_interval=60,
+                  start_time=1100, end_time=4500),
+            fastsim.simulate(fastsim.load_arrays(self.path, 1100, 4500), self.runs,
+                             time_interval=60, start_time=1100))
+
+    def test_trace_file(self):
+        trace_path = os.path.join(self.tmpdir, 'jobs.trace')
+        convert_csv(self.path, trace_path)
+        for csv_array, trace_array in zip(fastsim.load_arrays(self.path, 1100, 4500),
+                                          fastsim.load_arrays(trace_path, 1100, 4500)):
+            self.assertEqual(list(csv_array), list(trace_array))
+
+    def test_sweep_fast(self):
+        self.assertEqual(sweep(self.path, self.runs, time_interval=60, fast=True),
+                         fastsim.simulate(fastsim.load_arrays(self.path), self.runs, 60))
+        self.assertRaises(RuntimeError, sweep, self.path, self.runs, fast=True, discrete=True)
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
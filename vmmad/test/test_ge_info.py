@@ -29,10 +29,17 @@ cannot be enforced nor tested except at program run time...
 __docformat__ = 'reStructuredText'
 
 # stdlib imports
+import cStringIO as StringIO
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 # local imports
-from vmmad.batchsys.gridengine import GridEngine
+from vmmad.batchsys.gridengine import GridEngine, count_tasks
+from vmmad.benchmark.qstat import make_qstat_text, make_qstat_xml
 from vmmad.orchestrator import JobInfo
 
 
@@ -141,6 +148,375 @@ class TestGEInfo(unittest.TestCase):
         self.assertEqual(job.exec_node_name, None)
 
 
+# qstat -u '*' -xml, with an array job
+EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB = """<?xml version='1.0'?>
+  <job_info  xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+    <queue_info>
+      <job_list state="running">
+        <JB_job_number>400001</JB_job_number>
+        <JAT_prio>0.50500</JAT_prio>
+        <JB_name>array</JB_name>
+        <JB_owner>cpanse</JB_owner>
+        <state>r</state>
+        <JAT_start_time>2011-11-23T17:20:34</JAT_start_time>
+        <queue_name>all.q@compute-0-1</queue_name>
+        <slots>1</slots>
+        <tasks>1</tasks>
+      </job_list>
+      <job_list state="running">
+        <JB_job_number>400001</JB_job_number>
+        <JAT_prio>0.50500</JAT_prio>
+        <JB_name>array</JB_name>
+        <JB_owner>cpanse</JB_owner>
+        <state>r</state>
+        <JAT_start_time>2011-11-23T17:20:34</JAT_start_time>
+        <queue_name>all.q@compute-0-2</queue_name>
+        <slots>1</slots>
+        <tasks>2</tasks>
+      </job_list>
+    </queue_info>
+    <job_info>
+      <job_list state="pending">
+        <JB_job_number>400001</JB_job_number>
+        <JAT_prio>0.50500</JAT_prio>
+        <JB_name>array</JB_name>
+        <JB_owner>cpanse</JB_owner>
+        <state>qw</state>
+        <JB_submission_time>2011-11-23T17:20:00</JB_submission_time>
+        <queue_name></queue_name>
+        <slots>1</slots>
+        <tasks>3-9999:1</tasks>
+      </job_list>
+      <job_list state="pending">
+        <JB_job_number>400001</JB_job_number>
+        <JAT_prio>0.50500</JAT_prio>
+        <JB_name>array</JB_name>
+        <JB_owner>cpanse</JB_owner>
+        <state>qw</state>
+        <JB_submission_time>2011-11-23T17:20:00</JB_submission_time>
+        <queue_name></queue_name>
+        <slots>1</slots>
+        <tasks>10000</tasks>
+      </job_list>
+      <job_list state="pending">
+        <JB_job_number>400001</JB_job_number>
+        <JAT_prio>0.50500</JAT_prio>
+        <JB_name>array</JB_name>
+        <JB_owner>cpanse</JB_owner>
+        <state>hqw</state>
+        <JB_submission_time>2011-11-23T17:20:00</JB_submission_time>
+        <queue_name></queue_name>
+        <slots>1</slots>
+        <tasks>10001-10010:1</tasks>
+      </job_list>
+    </job_info>
+  </job_info>
+"""
+
+
+class TestArrayJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.jobs = GridEngine.parse_qstat_xml_output(EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB)
+
+    def test_running_tasks(self):
+        running = [job for job in self.jobs if job.state == JobInfo.RUNNING]
+        self.assertEqual([job.jobid for job in running], ['400001.1', '400001.2'])
+        for job in running:
+            self.assertEqual(job.array_jobid, '400001')
+            self.assertEqual(job.num_tasks(), 1)
+
+    def test_pending_tasks_are_aggregated(self):
+        pending = [job for job in self.jobs if job.state == JobInfo.PENDING]
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0].jobid, '400001')
+        self.assertEqual(pending[0].num_tasks(), 9998)
+
+    def test_other_tasks(self):
+        other = [job for job in self.jobs if job.state == JobInfo.OTHER]
+        self.assertEqual(len(other), 1)
+        self.assertEqual(other[0].jobid, '400001.10001-10010:1')
+        self.assertEqual(other[0].num_tasks(), 10)
+
+    def test_same_as_reference_parser(self):
+        self.assertEqual(
+            self.jobs,
+            GridEngine.parse_qstat_xml_output_sax(EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB))
+
+    def test_count_tasks(self):
+        self.assertEqual(count_tasks('7'), 1)
+        self.assertEqual(count_tasks('1-10000:1'), 10000)
+        self.assertEqual(count_tasks('1-10'), 10)
+        self.assertEqual(count_tasks('1,3,5-9:2'), 5)
+
+
+class _FakeGridEngine(GridEngine):
+    """Return canned `qstat` output instead of running the command."""
+
+    OUTPUTS = {
+        ('cpanse', None):  EXAMPLE_QSTAT_XML_OUTPUT,
+        ('bfabric', None): EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB,
+        # each queue lists part of the pending tasks of the array job
+        ('bfabric', 'q1'): EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB.replace(
+            '<tasks>10000</tasks>', '<tasks>3-9999:1</tasks>'),
+        ('bfabric', 'q2'): EXAMPLE_QSTAT_XML_OUTPUT_WITH_ARRAY_JOB.replace(
+            '<tasks>3-9999:1</tasks>', '<tasks>10000</tasks>'),
+        }
+
+    def run_qstat(self, user=None, queue=None, xml=True):
+        self.queries.append((user, queue))
+        if xml:
+            return self.OUTPUTS[(user, queue)]
+        else:
+            return make_qstat_text(20, seed=42)
+
+
+class TestShardedPolling(unittest.TestCase):
+
+    def test_single_query(self):
+        ge = _FakeGridEngine(user='cpanse')
+        ge.queries = [ ]
+        jobs = ge.get_sched_info()
+        self.assertEqual(ge.queries, [('cpanse', None)])
+        self.assertEqual(len(jobs), 3)
+
+    def test_one_query_per_user(self):
+        ge = _FakeGridEngine(users=['cpanse', 'bfabric', 'cpanse'])
+        ge.queries = [ ]
+        jobs = ge.get_sched_info()
+        self.assertEqual(len(ge.queries), 3)
+        jobids = [job.jobid for job in jobs]
+        # jobs are not duplicated
+        self.assertEqual(len(jobids), len(set(jobids)))
+        self.assertEqual(len(jobids), 3 + 4)
+
+    def test_array_job_split_among_shards(self):
+        ge = _FakeGridEngine(users=['bfabric'], queues=['q1', 'q2'])
+        ge.queries = [ ]
+        jobs = ge.get_sched_info()
+        self.assertEqual(len(ge.queries), 2)
+        pending = [ job for job in jobs if job.state == JobInfo.PENDING ]
+        self.assertEqual([ (job.jobid, job.num_tasks()) for job in pending ],
+                         [('400001', 9998)])
+
+    def test_shards(self):
+        ge = GridEngine(users=['a', 'b'], queues=['q1', 'q2', 'q3'], threads=4)
+        self.assertEqual(len(ge.shards), 6)
+        self.assertEqual(ge.threads, 4)
+        self.assertEqual(GridEngine(queues=['q1']).shards, [('*', 'q1')])
+
+
+class TestQstatExecution(unittest.TestCase):
+    """Run a fake `qstat` script placed first in the search path."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.tmpdir + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def _make_qstat(self, script):
+        qstat = os.path.join(self.tmpdir, 'qstat')
+        with open(qstat, 'w') as out:
+            out.write("#! /bin/sh\n" + script)
+        os.chmod(qstat, 0755)
+
+    def test_output(self):
+        output = os.path.join(self.tmpdir, 'output.xml')
+        with open(output, 'w') as out:
+            out.write(EXAMPLE_QSTAT_XML_OUTPUT)
+        self._make_qstat("cat '%s'\n" % output)
+        jobs = GridEngine(timeout=10).get_sched_info()
+        self.assertEqual(len(jobs), 3)
+
+    def test_nonzero_exit(self):
+        self._make_qstat("echo 'error: failed receiving gdi request' >&2; exit 1\n")
+        self.assertRaises(RuntimeError, GridEngine().get_sched_info)
+
+    def test_timeout(self):
+        # the background `sleep` keeps stdout open: it must be killed too
+        self._make_qstat("sleep 30 &\nwait\n")
+        ge = GridEngine(timeout=0.5)
+        t0 = time.time()
+        self.assertRaises(RuntimeError, ge.get_sched_info)
+        self.assertTrue(time.time() - t0 < 10)
+
+    def test_job_details(self):
+        log = os.path.join(self.tmpdir, 'log')
+        self._make_qstat(r"""
+echo "$@" >> '%s'
+rc=0
+for id in $(echo $2 | tr , ' '); do
+  if [ $id = 99 ]; then
+    echo "Following jobs do not exist: 99" >&2; rc=1; continue
+  fi
+  echo ==============================================================
+  echo "job_number:                 $id"
+  echo "hard resource_list:         h_vmem=${id}G"
+done
+exit $rc
+""" % log)
+        ge = GridEngine(details_batch=2, timeout=10)
+        jobs = [ JobInfo(jobid=jobid, state=JobInfo.PENDING)
+                 for jobid in ['1', '2', '3.1', '99'] ]
+        jobs[2].array_jobid = '3'
+        details = ge.get_job_details(jobs)
+        self.assertEqual(sorted(details.keys()), ['1', '2', '3.1'])
+        self.assertEqual(details['3.1']['hard resource_list'], {'h_vmem':'3G'})
+        # details are cached ...
+        ge.get_job_details(jobs[:3])
+        self.assertEqual(len(open(log).readlines()), 2)
+        # ... until the job leaves the queue
+        output = os.path.join(self.tmpdir, 'output.xml')
+        with open(output, 'w') as out:
+            out.write(make_qstat_xml(0))
+        self._make_qstat("cat '%s'\n" % output)
+        ge.get_sched_info()
+        self.assertEqual(ge._details, { })
+
+
+class _SlowGridEngine(_FakeGridEngine):
+    """Block in `run_qstat` until `self.go` is set."""
+
+    def run_qstat(self, user=None, queue=None, xml=True):
+        self.go.wait()
+        self.go.clear()
+        return _FakeGridEngine.run_qstat(self, self.next_user, queue, xml)
+
+
+class TestBackgroundPolling(unittest.TestCase):
+
+    def test_last_snapshot(self):
+        ge = _SlowGridEngine(background=True)
+        ge.queries = [ ]
+        ge.go = threading.Event()
+        ge.next_user = 'cpanse'
+        # first call blocks until there is a job list
+        ge.go.set()
+        self.assertEqual(len(ge.get_sched_info()), 3)
+        # following calls return immediately
+        ge.next_user = 'bfabric'
+        self.assertEqual(len(ge.get_sched_info()), 3)
+        self.assertEqual(len(ge.get_sched_info()), 3)
+        # ... until the background query is done
+        ge.go.set()
+        ge._refresh_thread.join()
+        self.assertEqual(len(ge.get_sched_info()), 4)
+        ge.go.set()
+        ge._refresh_thread.join()
+
+    def test_errors_are_not_fatal(self):
+        ge = _SlowGridEngine(background=True)
+        ge.queries = [ ]
+        ge.go = threading.Event()
+        ge.next_user = 'cpanse'
+        ge.go.set()
+        jobs = ge.get_sched_info()
+        ge.next_user = 'nobody'
+        ge.get_sched_info()
+        ge.go.set()
+        ge._refresh_thread.join()
+        self.assertEqual(ge.get_sched_info(), jobs)
+        ge.go.set()
+        ge._refresh_thread.join()
+
+
+class TestQstatDetailsParser(unittest.TestCase):
+
+    def test_parse(self):
+        details = GridEngine.parse_qstat_details_output("""\
+==============================================================
+job_number:                 715
+submission_time:            Wed Nov 23 18:20:34 2011
+owner:                      cpanse
+hard resource_list:         h_vmem=2G,h_rt=3600
+env_list:                   HOME=/home/cpanse,PATH=/bin:/usr/bin
+scheduling info:            queue instance "all.q@compute-0-1" dropped because it is full
+                            queue instance "all.q@compute-0-2" dropped because it is full
+==============================================================
+job_number:                 716
+owner:                      bfabric
+""")
+        self.assertEqual(sorted(details.keys()), ['715', '716'])
+        self.assertEqual(details['715']['submission_time'], 'Wed Nov 23 18:20:34 2011')
+        self.assertEqual(details['715']['env_list']['PATH'], '/bin:/usr/bin')
+        self.assertEqual(details['715']['hard resource_list'],
+                         {'h_vmem':'2G', 'h_rt':'3600'})
+        self.assertTrue(details['715']['scheduling info'].endswith(
+            '"all.q@compute-0-2" dropped because it is full'))
+        self.assertEqual(details['716']['owner'], 'bfabric')
+
+
+class TestQstatXmlParsers(unittest.TestCase):
+    """Check that the fast parser agrees with the SAX reference implementation."""
+
+    def test_example_output(self):
+        self.assertEqual(
+            GridEngine.parse_qstat_xml_output(EXAMPLE_QSTAT_XML_OUTPUT),
+            GridEngine.parse_qstat_xml_output_sax(EXAMPLE_QSTAT_XML_OUTPUT))
+
+    def test_synthetic_output(self):
+        xml_data = make_qstat_xml(500, seed=42)
+        jobs = GridEngine.parse_qstat_xml_output(xml_data)
+        self.assertEqual(len(jobs), 500)
+        self.assertEqual(jobs, GridEngine.parse_qstat_xml_output_sax(xml_data))
+
+    def test_stream_input(self):
+        xml_data = make_qstat_xml(50, seed=42)
+        self.assertEqual(
+            GridEngine.parse_qstat_xml_stream(StringIO.StringIO(xml_data)),
+            GridEngine.parse_qstat_xml_output(xml_data))
+
+    def test_synthetic_array_jobs(self):
+        xml_data = make_qstat_xml(500, seed=42, array_fraction=0.5)
+        self.assertEqual(GridEngine.parse_qstat_xml_output(xml_data),
+                         GridEngine.parse_qstat_xml_output_sax(xml_data))
+
+    def test_no_jobs(self):
+        xml_data = make_qstat_xml(0)
+        self.assertEqual(GridEngine.parse_qstat_xml_output(xml_data), [ ])
+
+
+class TestQstatTextParser(unittest.TestCase):
+
+    def _check_same_as_xml(self, num_jobs, **kwargs):
+        xml_jobs = GridEngine.parse_qstat_xml_output(
+            make_qstat_xml(num_jobs, seed=42, **kwargs))
+        text_jobs = GridEngine.parse_qstat_text_output(
+            make_qstat_text(num_jobs, seed=42, **kwargs))
+        self.assertEqual(len(text_jobs), len(xml_jobs))
+        for xml_job, text_job in zip(xml_jobs, text_jobs):
+            for field in GridEngine.TEXT_FIELDS:
+                self.assertEqual(text_job.get(field), xml_job.get(field))
+
+    def test_synthetic_output(self):
+        self._check_same_as_xml(500)
+
+    def test_synthetic_array_jobs(self):
+        self._check_same_as_xml(500, array_fraction=0.5)
+
+    def test_no_jobs(self):
+        self.assertEqual(GridEngine.parse_qstat_text_output(make_qstat_text(0)), [ ])
+
+    def test_text_mode(self):
+        ge = _FakeGridEngine(user='cpanse', text=True)
+        ge.queries = [ ]
+        jobs = ge.get_sched_info()
+        self.assertEqual(len(jobs), 20)
+        self.assertEqual(ge.queries, [('cpanse', None)])
+
+    def test_fallback_to_xml(self):
+        # job names are truncated in the text listing
+        ge = _FakeGridEngine(user='cpanse', text=True, fields=['state', 'name'])
+        self.assertFalse(ge.text)
+        ge.queries = [ ]
+        self.assertEqual(ge.get_sched_info(),
+                         GridEngine.parse_qstat_xml_output(EXAMPLE_QSTAT_XML_OUTPUT))
+
+
 ## main: run tests
 
 if __name__ == "__main__":
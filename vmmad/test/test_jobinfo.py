@@ -53,6 +53,14 @@ class TestJobInfo(unittest.TestCase):
         self.assertFalse(job2.is_running())
 
 
+    def test_get_detail(self):
+        job = JobInfo(jobid=1, state=JobInfo.PENDING)
+        self.assertEqual(job.get_detail('cwd'), None)
+        job.details = { 'cwd':'/home/cpanse' }
+        self.assertEqual(job.get_detail('cwd'), '/home/cpanse')
+        self.assertEqual(job.get_detail('owner', 'nobody'), 'nobody')
+
+
 ## main: run tests
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.metrics` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import json
+import random
+from StringIO import StringIO
+import unittest
+
+# local imports
+from vmmad.metrics import Distribution, SimulationMetrics, format_text, write_json
+
+
+class TestDistribution(unittest.TestCase):
+
+    def test_empty(self):
+        d = Distribution()
+        self.assertEqual(d.count, 0)
+        self.assertEqual(d.mean, 0.0)
+        self.assertEqual(d.quantile(0.95), 0.0)
+
+    def test_quantiles(self):
+        rng = random.Random(42)
+        values = [ rng.expovariate(1/600.0) for _ in xrange(20000) ]
+        d = Distribution(resolution=1e-3)
+        for value in values:
+            d.add(value)
+        values.sort()
+        self.assertEqual(d.count, len(values))
+        self.assertAlmostEqual(d.mean, sum(values) / len(values))
+        self.assertEqual(d.min, values[0])
+        self.assertEqual(d.max, values[-1])
+        for q in 0.01, 0.5, 0.95, 0.99, 1.0:
+            exact = values[int(q * len(values)) - 1]
+            self.assertTrue(abs(d.quantile(q) - exact) <= 1e-3 * exact, q)
+
+    def test_bounded_memory(self):
+        d = Distribution(resolution=1e-2)
+        for n in xrange(100000):
+            d.add(n % 3600)
+        self.assertTrue(len(d._bins) < 1000)
+
+
+class TestSimulationMetrics(unittest.TestCase):
+
+    def test_report(self):
+        metrics = SimulationMetrics(sla_wait=60)
+        for wait in 0, 30, 120, 600:
+            metrics.job_started(wait)
+        metrics.jobs_completed(3)
+        metrics.jobs_dropped()
+        metrics.vm_started()
+        metrics.vm_started()
+        metrics.vm_stopped()
+        metrics.sample(1000, 0, 0)
+        metrics.sample(2800, 2, 1)
+        metrics.sample(4600, 1, 1)
+        report = metrics.report(cost=1.5)
+        self.assertEqual(report['duration'], 3600)
+        self.assertEqual(report['cost'], 1.5)
+        self.assertEqual(report['jobs']['started'], 4)
+        self.assertEqual(report['jobs']['completed'], 3)
+        self.assertEqual(report['jobs']['dropped'], 1)
+        self.assertEqual(report['jobs']['sla_attainment'], 0.5)
+        self.assertEqual(report['jobs']['wait']['max'], 600)
+        self.assertEqual(report['vms']['started'], 2)
+        self.assertEqual(report['vms']['stopped'], 1)
+        self.assertEqual(report['vms']['hours'], 1.5)
+        self.assertEqual(report['vms']['idle_fraction'], 2/3.0)
+
+    def test_output(self):
+        metrics = SimulationMetrics()
+        metrics.job_started(10)
+        report = metrics.report()
+        output = StringIO()
+        write_json(report, output)
+        self.assertEqual(json.loads(output.getvalue()), report)
+        self.assertTrue('jobs.wait.p95' in format_text(report))
+        self.assertTrue('jobs.dropped' in format_text(report))
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
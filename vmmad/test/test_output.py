@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.output` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.output import ColumnarWriter, open_writer, read_columns, read_output
+
+
+ROWS = [ (1000.0 + 60*n, n // 3, 2, 0, n % 2) for n in xrange(10) ]
+
+
+class TestOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, rows, **kwargs):
+        path = os.path.join(self.tmpdir, name)
+        writer = open_writer(path, **kwargs)
+        for row in rows:
+            writer.write(row)
+        writer.close()
+        return path
+
+    def test_formats(self):
+        for name in 'out.csv', 'out.csv.gz':
+            self.assertEqual(list(read_output(self.write(name, ROWS))), ROWS)
+        for name in 'out.bin', 'out.bin.gz':
+            path = self.write(name, ROWS, format='columnar')
+            self.assertEqual(list(read_output(path)), ROWS)
+
+    def test_blocks(self):
+        path = os.path.join(self.tmpdir, 'out.bin')
+        writer = ColumnarWriter(path, block_size=4)
+        for row in ROWS:
+            writer.write(row)
+        # flushing writes an incomplete block
+        writer.flush()
+        self.assertEqual(list(read_output(path)), ROWS)
+        writer.write(ROWS[0])
+        writer.close()
+        self.assertEqual(list(read_output(path)), ROWS + ROWS[:1])
+
+    def test_csv_header(self):
+        with open(self.write('out.csv', ROWS[:1]), 'r') as input_file:
+            self.assertEqual(input_file.read(),
+                             "#TimeStamp,Pending Jobs,Running Jobs,Started VMs,Idle VMS\r\n"
+                             "1000.0,0,2,0,0\r\n")
+
+    def test_read_columns(self):
+        columns = read_columns(self.write('out', ROWS, format='columnar'))
+        self.assertEqual(list(columns['timestamp']), [ row[0] for row in ROWS ])
+        self.assertEqual(list(columns['pending_jobs']), [ row[1] for row in ROWS ])
+
+    def test_sampling(self):
+        # the last row is always written
+        path = self.write('out.csv', ROWS, every=4)
+        self.assertEqual(list(read_output(path)), [ROWS[0], ROWS[4], ROWS[8], ROWS[9]])
+        rows = [ (n, 0, 1, 0, 0) for n in xrange(5) ] + [ (5, 1, 1, 0, 0) ]
+        path = self.write('out.csv', rows, changes_only=True)
+        self.assertEqual(list(read_output(path)), [rows[0], rows[5]])
+        path = self.write('out.csv', rows[:-1], changes_only=True)
+        self.assertEqual(list(read_output(path)), [rows[0], rows[4]])
+
+    def test_unknown_format(self):
+        self.assertRaises(RuntimeError, open_writer,
+                          os.path.join(self.tmpdir, 'out'), format='xml')
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,118 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.randomjobs` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import itertools
+import random
+import unittest
+
+# local imports
+from vmmad.batchsys import randomjobs
+from vmmad.batchsys.randomjobs import NormallyDistributedInRange, RandomJobs
+from vmmad.orchestrator import JobInfo
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestDistributions(unittest.TestCase):
+
+    def test_normal_in_range(self):
+        values = NormallyDistributedInRange(10, 20, 0.5, 1.0, random.Random(1))
+        for _ in xrange(1000):
+            self.assertTrue(10 <= values.next() <= 20)
+
+
+class TestRandomJobs(unittest.TestCase):
+
+    def test_seeded(self):
+        def jobs(seed):
+            clock = _Clock()
+            batchsys = RandomJobs(5, 0.5, 3600, clock, seed=seed, cluster_size=5)
+            result = [ ]
+            for clock.now in xrange(0, 6000, 60):
+                result.append(sorted((job.jobid, job.duration, job.state)
+                                     for job in batchsys.get_sched_info()))
+            return result
+        self.assertEqual(jobs(42), jobs(42))
+        self.assertNotEqual(jobs(42), jobs(43))
+
+    def test_jobs_run_and_terminate(self):
+        clock = _Clock()
+        batchsys = RandomJobs(5, 0.5, 600, clock, seed=1, cluster_size=20)
+        for clock.now in xrange(0, 36000, 60):
+            jobs = batchsys.get_sched_info()
+            running = [ job for job in jobs if job.state == JobInfo.RUNNING ]
+            self.assertTrue(len(running) <= 20)
+            for job in running:
+                self.assertTrue(job.running_at + job.duration > clock.now)
+        # about 2.5 jobs per minute, lasting 5 minutes on average:
+        # 20 nodes suffice to run all of them
+        self.assertTrue(len(jobs) < 50)
+        self.assertTrue(batchsys.next_jobid > 1000)
+
+    def test_pending_jobs_wait_for_nodes(self):
+        clock = _Clock()
+        batchsys = RandomJobs(5, 0.5, 600, clock, seed=1)
+        for clock.now in xrange(0, 6000, 60):
+            jobs = batchsys.get_sched_info()
+        # no nodes: no job has run, and none has left
+        self.assertEqual(len(jobs), batchsys.next_jobid)
+        self.assertTrue(all(job.state == JobInfo.PENDING for job in jobs))
+        batchsys.add_node('vm-1')
+        clock.now += 60
+        running = [ job for job in batchsys.get_sched_info()
+                    if job.state == JobInfo.RUNNING ]
+        self.assertEqual([ job.exec_node_name for job in running ], ['vm-1'])
+
+    def test_duration_iterator(self):
+        clock = _Clock()
+        batchsys = RandomJobs(5, 0.0, iter(itertools.repeat(100)), clock, seed=1)
+        self.assertEqual([ job.duration for job in batchsys.get_sched_info() ], [100] * 5)
+
+
+class TestRandomJobsWithoutNumPy(TestRandomJobs):
+    """
+    Run the same tests drawing random values with module `random`.
+    """
+
+    def setUp(self):
+        self._numpy = randomjobs.numpy
+        randomjobs.numpy = None
+
+    def tearDown(self):
+        randomjobs.numpy = self._numpy
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,280 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.replay` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.batchsys.replay import JobsFromFile, TraceIndex, build_index, sort_trace
+
+
+# deliberately out of submission order
+TRACE = """\
+JOBID,SUBMITTED_AT,RUN_DURATION,QUEUE
+3,1020,15,all.q
+1,1000,5,all.q
+2,1000,50,all.q
+4,1030,100,all.q
+"""
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestJobsFromFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(self.path, 'w') as output:
+            output.write(TRACE)
+        self.clock = _Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def jobids(self, batchsys, now):
+        self.clock.now = now
+        jobs = batchsys.get_sched_info()
+        # start jobs as soon as they are seen, as on a cluster with
+        # unlimited slots
+        for job in batchsys.submitted:
+            job.running_at = now
+            batchsys.job_started(job)
+        return sorted(job.jobid for job in jobs)
+
+    def test_start_time(self):
+        self.assertEqual(JobsFromFile(self.path, self.clock).start_time, 1000)
+        self.assertEqual(JobsFromFile(self.path, self.clock, None).start_time, 1000)
+        batchsys = JobsFromFile(self.path, self.clock, 1010)
+        self.assertEqual(batchsys.start_time, 1010)
+        self.assertEqual(self.jobids(batchsys, 1100), ['3', '4'])
+        self.assertEqual(batchsys.num_submitted, 2)
+
+    def _check_replay(self, batchsys):
+        self.assertEqual(self.jobids(batchsys, 999), [ ])
+        self.assertEqual(self.jobids(batchsys, 1000), ['1', '2'])
+        # jobs terminate at `running_at + duration`
+        self.assertEqual(self.jobids(batchsys, 1004), ['1', '2'])
+        self.assertEqual(self.jobids(batchsys, 1005), ['2'])
+        self.assertFalse(batchsys.exhausted)
+        self.assertEqual(self.jobids(batchsys, 1030), ['2', '3', '4'])
+        self.assertTrue(batchsys.exhausted)
+        self.assertEqual(self.jobids(batchsys, 1045), ['2', '4'])
+        # every terminated job is removed, even if adjacent to another one
+        self.assertEqual(self.jobids(batchsys, 1051), ['4'])
+        self.assertEqual(self.jobids(batchsys, 1200), [ ])
+
+    def test_replay(self):
+        self._check_replay(JobsFromFile(self.path, self.clock))
+
+    def test_stream(self):
+        # the trace is almost sorted: a lookahead of 1 job suffices
+        self._check_replay(JobsFromFile(self.path, self.clock, stream=True, lookahead=1))
+
+    def test_stream_out_of_order(self):
+        batchsys = JobsFromFile(self.path, self.clock, stream=True, lookahead=0)
+        self.assertEqual(batchsys.start_time, 1020)
+        # job 3 is submitted at its time, the earlier jobs are late
+        self.assertEqual(self.jobids(batchsys, 1020), ['1', '2', '3'])
+        self.assertEqual(batchsys.num_submitted, 3)
+
+    def test_sort_trace(self):
+        sorted_path = os.path.join(self.tmpdir, 'sorted.csv')
+        sort_trace(self.path, sorted_path, chunk_size=3, tmpdir=self.tmpdir)
+        # temporary files have been removed
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['jobs.csv', 'sorted.csv'])
+        lines = [ line.strip() for line in open(sorted_path) ]
+        self.assertEqual(lines, [
+            'JOBID,SUBMITTED_AT,RUN_DURATION,QUEUE',
+            '1,1000,5,all.q',
+            '2,1000,50,all.q',
+            '3,1020,15,all.q',
+            '4,1030,100,all.q',
+            ])
+        self._check_replay(JobsFromFile(sorted_path, self.clock, stream=True, lookahead=0))
+
+    def test_job_attributes(self):
+        self.clock.now = 1000
+        job = [ job for job in JobsFromFile(self.path, self.clock).get_sched_info()
+                if job.jobid == '2' ][0]
+        self.assertEqual(job.submitted_at, 1000.0)
+        self.assertEqual(job.duration, 50.0)
+
+    def test_end_time(self):
+        batchsys = JobsFromFile(self.path, self.clock, end_time=1020)
+        self.assertEqual(self.jobids(batchsys, 1030), ['1', '2', '3'])
+        self.assertTrue(batchsys.exhausted)
+
+    def test_empty_trace(self):
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+        for stream in False, True:
+            batchsys = JobsFromFile(self.path, self.clock, stream=stream)
+            self.assertEqual(batchsys.start_time, 0)
+            self.assertTrue(batchsys.exhausted)
+            self.assertEqual(batchsys.get_sched_info(), [ ])
+
+    def test_duplicate_jobids(self):
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n'
+                         '7,1000,10\n'
+                         '7,1000,50\n'
+                         '7,1005,50\n')
+        batchsys = JobsFromFile(self.path, self.clock)
+        self.assertEqual(self.jobids(batchsys, 1000), ['7', '7.1'])
+        self.assertEqual(self.jobids(batchsys, 1005), ['7', '7.1', '7.2'])
+        self.assertEqual(self.jobids(batchsys, 1010), ['7.1', '7.2'])
+        self.assertEqual([ job.duration for job in batchsys.terminated ], [10.0])
+        self.assertEqual(self.jobids(batchsys, 1050), ['7.2'])
+        self.assertEqual(self.jobids(batchsys, 1055), [ ])
+
+    def test_pending_jobs_do_not_terminate(self):
+        batchsys = JobsFromFile(self.path, self.clock)
+        self.clock.now = 1000
+        batchsys.get_sched_info()
+        # job 1 waits longer than its duration, and then runs in full
+        self.clock.now = 1010
+        self.assertEqual(len(batchsys.get_sched_info()), 2)
+        self.assertEqual(batchsys.terminated, [ ])
+        first = batchsys.jobs['1']
+        first.running_at = 1010
+        batchsys.job_started(first)
+        self.assertEqual(batchsys.next_event_time(), 1015)
+        self.clock.now = 1014
+        self.assertTrue(first in batchsys.get_sched_info())
+        self.clock.now = 1015
+        self.assertFalse(first in batchsys.get_sched_info())
+        self.assertEqual(batchsys.terminated, [ first ])
+
+    def test_resume(self):
+        for stream in False, True:
+            batchsys = JobsFromFile(self.path, self.clock, stream=stream, lookahead=1)
+            self.assertEqual(self.jobids(batchsys, 1000), ['1', '2'])
+            restored = pickle.loads(pickle.dumps(batchsys, pickle.HIGHEST_PROTOCOL))
+            self.clock = restored.timer
+            self.assertEqual(self.jobids(restored, 1030), ['2', '3', '4'])
+            self.assertEqual(restored.num_submitted, 4)
+            self.assertTrue(restored.exhausted)
+
+    def test_resume_reads_from_index(self):
+        sorted_path = os.path.join(self.tmpdir, 'sorted.csv')
+        sort_trace(self.path, sorted_path)
+        build_index(sorted_path, bucket=10)
+        batchsys = JobsFromFile(sorted_path, self.clock)
+        self.jobids(batchsys, 1020)
+        snapshot = pickle.dumps(batchsys, pickle.HIGHEST_PROTOCOL)
+        # garble the jobs already submitted, keeping size and time
+        # stamp, so that the index is still valid
+        stat = os.stat(sorted_path)
+        with open(sorted_path, 'r+') as trace:
+            trace.readline()
+            trace.write('x,xxxx,x,xxxxx\nx,xxxx,xx,xxxxx\n')
+        os.utime(sorted_path, (stat.st_atime, stat.st_mtime))
+        restored = pickle.loads(snapshot)
+        self.clock = restored.timer
+        self.assertEqual(self.jobids(restored, 1030), ['2', '3', '4'])
+
+
+class TestTraceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        self.clock = _Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, rows):
+        with open(self.path, 'w') as output:
+            output.write("JOBID,SUBMITTED_AT,RUN_DURATION\n")
+            for row in rows:
+                output.write("%s,%s,%s\n" % row)
+
+    def _replay(self, start_time, end_time, **kwargs):
+        batchsys = JobsFromFile(self.path, self.clock, start_time,
+                                end_time=end_time, **kwargs)
+        self.clock.now = 10**6
+        batchsys.get_sched_info()
+        return batchsys.num_submitted
+
+    def test_window(self):
+        # one job every 10 minutes, for 10 days
+        self._write([ (n, 600*n, 1) for n in range(1, 1441) ])
+        build_index(self.path, bucket=3600)
+        index = TraceIndex.load(self.path)
+        self.assertEqual(index.bucket, 3600)
+        # jobs outside the time buckets of the window are not read
+        # at all: make them invalid, without changing the file size
+        # and time stamp
+        stat = os.stat(self.path)
+        with open(self.path, 'r+') as data:
+            lines = data.readlines()
+            data.seek(0)
+            for n, line in enumerate(lines):
+                if n > 0 and not (86400 <= 600*n < 2*86400 + 3600):
+                    line = ('x' * (len(line) - 1)) + '\n'
+                data.write(line)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime))
+        self.assertNotEqual(TraceIndex.load(self.path), None)
+        self.assertEqual(self._replay(86400, 2*86400), 144)
+
+    def test_unsorted(self):
+        rows = [ (n, 600*n, 1) for n in range(1, 1441) ]
+        rows.reverse()
+        self._write(rows)
+        build_index(self.path, bucket=3600)
+        self.assertEqual(self._replay(86400, 2*86400), 144)
+        self.assertEqual(self._replay(-1, None), 1440)
+        self.assertEqual(self._replay(10**6, None), 0)
+
+    def test_stale_index(self):
+        self._write([ (n, 600*n, 1) for n in range(1, 1441) ])
+        build_index(self.path)
+        self._write([ (n, 600*n, 1) for n in range(1, 11) ])
+        self.assertEqual(TraceIndex.load(self.path), None)
+        self.assertEqual(self._replay(-1, None), 10)
+
+    def test_stream_stops_early(self):
+        self._write([ (n, 600*n, 1) for n in range(1, 1441) ] + [ ('x', 'x', 'x') ])
+        # the invalid last line is never read
+        self.assertEqual(self._replay(86400, 2*86400, stream=True, lookahead=10), 144)
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.scheduler` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import heapq
+import random
+import unittest
+
+# local imports
+from vmmad.orchestrator import JobInfo
+from vmmad.scheduler import BackfillScheduler, FifoScheduler, PriorityScheduler
+
+
+def job(jobid, submitted_at, duration=100, slots=1, **kwargs):
+    return JobInfo(jobid=jobid, state=JobInfo.PENDING, submitted_at=submitted_at,
+                   duration=duration, slots=slots, **kwargs)
+
+
+def started(assignments):
+    return [ (job.jobid, nodes) for job, nodes in assignments ]
+
+
+class TestFifoScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = FifoScheduler()
+        for n in xrange(3):
+            self.scheduler.add_node('node%d' % n, n)
+
+    def test_order(self):
+        for j in (job('b', 20), job('a', 10), job('c', 30), job('d', 40)):
+            self.scheduler.submit(j)
+        self.assertEqual(started(self.scheduler.schedule(50)),
+                         [('a', ['node0']), ('b', ['node1']), ('c', ['node2'])])
+        self.assertEqual(self.scheduler.free_slots, 0)
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.schedule(60), [ ])
+
+    def test_release(self):
+        a, b = job('a', 10), job('b', 20)
+        self.scheduler.submit(a)
+        self.scheduler.submit(b)
+        self.scheduler.schedule(30)
+        self.scheduler.remove(a)
+        self.scheduler.submit(job('c', 40))
+        self.assertEqual(started(self.scheduler.schedule(50)), [('c', ['node0'])])
+
+    def test_cancel(self):
+        a = job('a', 10, slots=3)
+        self.scheduler.remove_node('node2')
+        self.scheduler.submit(a)
+        self.scheduler.submit(job('b', 20))
+        # the first job does not fit, and blocks the queue
+        self.assertEqual(self.scheduler.schedule(30), [ ])
+        self.scheduler.remove(a)
+        self.assertEqual(started(self.scheduler.schedule(40)), [('b', ['node0'])])
+
+    def test_slots(self):
+        self.scheduler.add_node('big', 10, slots=4)
+        self.scheduler.submit(job('a', 10, slots=5))
+        self.scheduler.submit(job('b', 20, slots=2))
+        self.assertEqual(started(self.scheduler.schedule(30)),
+                         [('a', ['node0', 'node1', 'node2', 'big']), ('b', ['big'])])
+        self.assertEqual(self.scheduler.free_slots, 0)
+
+
+class TestPriorityScheduler(unittest.TestCase):
+
+    def test_order(self):
+        scheduler = PriorityScheduler()
+        scheduler.add_node('node0', 0)
+        scheduler.submit(job('a', 10, JAT_prio=0.5))
+        scheduler.submit(job('b', 20, JAT_prio=0.7))
+        self.assertEqual(started(scheduler.schedule(30)), [('b', ['node0'])])
+
+
+class TestBackfillScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = BackfillScheduler()
+        for n in xrange(4):
+            self.scheduler.add_node('node%d' % n, n)
+        # three nodes busy until time 1000 (two) and 2000 (one)
+        self.scheduler.submit(job('x', 0, duration=1000, slots=2))
+        self.scheduler.submit(job('y', 0, duration=2000))
+        self.scheduler.schedule(0)
+
+    def test_backfill(self):
+        self.scheduler.submit(job('wide', 10, slots=3))
+        # ends before the reservation at time 1000
+        self.scheduler.submit(job('short', 20, duration=900))
+        # would delay the wide job
+        self.scheduler.submit(job('long', 30, duration=5000))
+        self.assertEqual(started(self.scheduler.schedule(40)), [('short', ['node3'])])
+
+    def test_extra_slots(self):
+        # at time 1000, 3 slots are free: one more than needed
+        self.scheduler.submit(job('wide', 10, slots=2))
+        self.scheduler.submit(job('long', 20, duration=5000))
+        self.scheduler.submit(job('long2', 30, duration=5000))
+        self.assertEqual(started(self.scheduler.schedule(40)), [('long', ['node3'])])
+
+    def test_in_order(self):
+        rng = random.Random(42)
+        heap = [ rng.random() for _ in xrange(100) ]
+        heapq.heapify(heap)
+        saved = list(heap)
+        self.assertEqual(list(BackfillScheduler._in_order(heap)), sorted(heap))
+        self.assertEqual(heap, saved)
+
+    def test_end_times_do_not_pile_up(self):
+        scheduler = BackfillScheduler()
+        scheduler.add_node('node0', 0)
+        scheduler.add_node('node1', 1)
+        # stays at the top of the heap of end times
+        scheduler.submit(job('short', 0, duration=1))
+        scheduler.schedule(0)
+        for n in xrange(1000):
+            # terminates before its end time
+            long_job = job('long%d' % n, n, duration=10000)
+            scheduler.submit(long_job)
+            scheduler.schedule(n)
+            scheduler.remove(long_job)
+        self.assertTrue(len(scheduler._ends) < 100)
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.simul` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.batchsys.trace import convert_csv
+from vmmad.orchestrator import JobInfo
+from vmmad.output import read_output
+from vmmad.simul import OrchestratorSimulation, load_snapshot
+
+
+class TestDiscreteEvents(unittest.TestCase):
+    """
+    Check that the discrete-event simulation agrees with a fixed-step
+    one run at 1-second resolution on the same trace.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        # bursts of jobs, with integer times so that the fixed-step
+        # simulation sees every event at the exact second it happens
+        rnd = random.Random(42)
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+            jobid = 0
+            for burst in xrange(4):
+                for _ in xrange(rnd.randint(5, 15)):
+                    jobid += 1
+                    output.write("%d,%d,%d\n" % (jobid, 1000 + 600*burst + rnd.randint(0, 30),
+                                                 rnd.randint(20, 300)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def simulate(self, time_interval, discrete):
+        output_file = os.path.join(self.tmpdir, 'out.csv')
+        sim = OrchestratorSimulation(
+            max_vms=10, max_delta=10, max_idle=120, startup_delay=30,
+            output_file=output_file, csv_file=self.path, start_time=None,
+            time_interval=time_interval, cluster_size=2, discrete=discrete)
+        sim.run(0)
+        rows = list(read_output(output_file))
+        # each row records the state reached in the previous cycle,
+        # which lasted until the time of the row itself
+        totals = [0.0] * 4
+        for prev, row in zip(rows, rows[1:]):
+            for n in xrange(4):
+                totals[n] += row[n+1] * (row[0] - prev[0])
+        return len(rows), sim._vmid, totals
+
+    def test_agrees_with_fixed_step(self):
+        fixed_cycles, fixed_vms, fixed_totals = self.simulate(1, False)
+        des_cycles, des_vms, des_totals = self.simulate(60, True)
+        self.assertTrue(des_cycles < fixed_cycles / 10)
+        self.assertEqual(des_vms, fixed_vms)
+        # time-integrals of pending jobs, running jobs, started VMs, idle VMs
+        for fixed, des in zip(fixed_totals, des_totals):
+            self.assertTrue(abs(fixed - des) <= 0.02 * fixed + 1,
+                            "fixed-step: %s, discrete-event: %s" % (fixed_totals, des_totals))
+
+
+class TestSnapshot(unittest.TestCase):
+    """
+    Check that a simulation restored from a snapshot ends up exactly
+    as one that was never interrupted.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        rnd = random.Random(7)
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+            for jobid in xrange(80):
+                output.write("%d,%d,%d\n" % (jobid+1, 1000 + 40*jobid + rnd.randint(0, 30),
+                                             rnd.randint(100, 900)))
+        self.snapshot = os.path.join(self.tmpdir, 'sim.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def simulation(self, csv_file, discrete, **kwargs):
+        return OrchestratorSimulation(
+            max_vms=8, max_delta=2, max_idle=300, startup_delay=90,
+            output_file=None, csv_file=csv_file, start_time=None,
+            time_interval=60, cluster_size=2, discrete=discrete, **kwargs)
+
+    def check_resume(self, csv_file, discrete=False, **kwargs):
+        whole = self.simulation(csv_file, discrete, **kwargs)
+        whole.run(0)
+        paused = self.simulation(csv_file, discrete, **kwargs)
+        self.assertTrue(paused.run_until(2500))
+        paused.save_snapshot(self.snapshot)
+        restored = load_snapshot(self.snapshot)
+        restored.run(0, resume=True)
+        self.assertEqual(restored.summary(), whole.summary())
+        self.assertEqual(restored.cycle, whole.cycle)
+
+    def test_resume(self):
+        self.check_resume(self.path)
+
+    def test_resume_discrete(self):
+        self.check_resume(self.path, discrete=True)
+
+    def test_resume_stream(self):
+        self.check_resume(self.path, stream=True)
+
+    def test_resume_trace(self):
+        trace_path = os.path.join(self.tmpdir, 'jobs.trace')
+        convert_csv(self.path, trace_path)
+        self.check_resume(trace_path, discrete=True)
+
+    def test_resume_backfill(self):
+        self.check_resume(self.path, scheduler='backfill')
+
+    def test_set_policy(self):
+        paused = self.simulation(self.path, False)
+        paused.run_until(1500)
+        paused.save_snapshot(self.snapshot)
+        results = [ ]
+        for max_vms in 4, 8:
+            sim = load_snapshot(self.snapshot)
+            sim.set_policy(max_vms=max_vms)
+            sim.run(0, resume=True)
+            results.append(sim.summary())
+        self.assertTrue(results[0]['vms_started'] < results[1]['vms_started'])
+        self.assertFalse(paused.run_until(1e12))
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Check that simulations honor the slots requested by jobs.
+    """
+
+    def simulate(self, scheduler):
+        # 4 cluster nodes, busy with 1-slot jobs until time 1500; then
+        # a 4-slot job, and short 1-slot jobs that can be backfilled
+        jobs = [ (1000.0 + n, 500.0, 'busy%d' % n, 1) for n in xrange(3) ]
+        jobs.append((1010.0, 2000.0, 'wide', 4))
+        jobs.extend((1020.0 + n, 100.0, 'short%d' % n, 1) for n in xrange(3))
+        sim = OrchestratorSimulation(
+            max_vms=4, max_delta=1, max_idle=300, startup_delay=60,
+            output_file=None, csv_file=jobs, start_time=None,
+            time_interval=60, cluster_size=4, scheduler=scheduler)
+        sim.run(0)
+        # every job has run
+        self.assertEqual(sim.report()['jobs']['dropped'], 0)
+        return sim.summary()
+
+    def test_fifo(self):
+        summary = self.simulate('fifo')
+        # short jobs wait behind the wide one, much longer than their
+        # duration, and still run
+        self.assertEqual(summary['jobs'], 7)
+        self.assertTrue(summary['max_wait'] > 2000)
+
+    def test_backfill(self):
+        summary = self.simulate('backfill')
+        # short jobs run, one after the other, on the free node
+        self.assertEqual(summary['jobs'], 7)
+        self.assertTrue(summary['max_wait'] < 600)
+
+    def test_vms_for_wide_jobs(self):
+        sim = OrchestratorSimulation(
+            max_vms=4, max_delta=1, max_idle=300, startup_delay=60,
+            output_file=None, csv_file=[ (1000.0, 100.0, '1', 1) ], start_time=None,
+            time_interval=60, cluster_size=1)
+        # VMs are needed for the slots that candidates request
+        sim.candidates = set([ JobInfo(jobid='narrow', state=JobInfo.PENDING, slots=2) ])
+        self.assertFalse(sim.is_new_vm_needed())
+        sim.candidates = set([ JobInfo(jobid='wide', state=JobInfo.PENDING, slots=4) ])
+        self.assertTrue(sim.is_new_vm_needed())
+
+    def test_unknown_scheduler(self):
+        self.assertRaises(RuntimeError, self.simulate, 'lottery')
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,147 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.provider.simulated` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import unittest
+
+# local imports
+from vmmad.orchestrator import VmInfo
+from vmmad.provider.simulated import SimulatedCloud
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class _BootTimes(object):
+
+    def __init__(self, *values):
+        self.values = iter(values)
+
+    def next(self):
+        return next(self.values)
+
+
+class TestSimulatedCloud(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.ready = [ ]
+
+    def cloud(self, **kwargs):
+        return SimulatedCloud(on_ready=self.ready.append, timer=self.clock, **kwargs)
+
+    def vm(self, vmid):
+        return VmInfo(vmid=str(vmid), state=VmInfo.STARTING, auth=str(vmid))
+
+    def test_boot(self):
+        cloud = self.cloud(boot_time=_BootTimes(30, 10))
+        vm1, vm2 = self.vm(1), self.vm(2)
+        cloud.start_vm(vm1)
+        cloud.start_vm(vm2)
+        self.assertEqual(cloud.num_running, 2)
+        self.assertEqual(cloud.next_event_time(), 10)
+        self.clock.now = 10
+        cloud.update_vm_status([vm1, vm2])
+        self.assertEqual(self.ready, [vm2])
+        self.assertEqual(cloud.next_event_time(), 30)
+        self.clock.now = 100
+        cloud.update_vm_status([vm1, vm2])
+        self.assertEqual(self.ready, [vm2, vm1])
+        self.assertEqual(cloud.next_event_time(), None)
+
+    def test_stop_while_booting(self):
+        cloud = self.cloud(boot_time=30)
+        vm = self.vm(1)
+        cloud.start_vm(vm)
+        cloud.stop_vm(vm)
+        self.assertEqual(vm.state, VmInfo.DOWN)
+        self.assertEqual(cloud.num_running, 0)
+        self.assertEqual(cloud.next_event_time(), None)
+        self.clock.now = 100
+        cloud.update_vm_status([vm])
+        self.assertEqual(self.ready, [ ])
+        # cannot stop twice
+        self.assertRaises(RuntimeError, cloud.stop_vm, vm)
+
+    def test_start_failure(self):
+        cloud = self.cloud(start_failure_rate=1.0)
+        self.assertRaises(RuntimeError, cloud.start_vm, self.vm(1))
+        self.assertEqual(cloud.num_running, 0)
+        self.assertEqual(cloud.num_failed, 1)
+
+    def test_boot_failure(self):
+        cloud = self.cloud(boot_time=30, boot_failure_rate=1.0)
+        vm = self.vm(1)
+        cloud.start_vm(vm)
+        self.clock.now = 30
+        cloud.update_vm_status([vm])
+        self.assertEqual(self.ready, [ ])
+        self.assertEqual(vm.state, VmInfo.DOWN)
+        self.assertEqual(cloud.num_running, 0)
+
+    def test_stop_failure(self):
+        cloud = self.cloud(stop_failure_rate=1.0)
+        vm = self.vm(1)
+        cloud.start_vm(vm)
+        self.assertRaises(RuntimeError, cloud.stop_vm, vm)
+        self.assertEqual(cloud.num_running, 1)
+
+    def test_costs(self):
+        cloud = self.cloud(kind='small', costs={'small': 1.0, 'large': 4.0})
+        vm1, vm2 = self.vm(1), self.vm(2)
+        vm2.kind = 'large'
+        cloud.start_vm(vm1)
+        cloud.start_vm(vm2)
+        self.clock.now = 1800
+        cloud.stop_vm(vm2)
+        self.assertEqual(cloud.cost(), 0.5 + 2.0)
+        self.clock.now = 3600
+        self.assertEqual(cloud.cost(), 1.0 + 2.0)
+
+    def test_seeded_failures(self):
+        def failures(seed):
+            cloud = self.cloud(start_failure_rate=0.5, seed=seed)
+            result = [ ]
+            for n in xrange(20):
+                try:
+                    cloud.start_vm(self.vm(n))
+                    result.append(False)
+                except RuntimeError:
+                    result.append(True)
+            return result
+        self.assertEqual(failures(1), failures(1))
+        self.assertTrue(any(failures(1)) and not all(failures(1)))
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
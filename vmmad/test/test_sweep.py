@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.sweep` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.batchsys.trace import convert_csv
+from vmmad.simul import OrchestratorSimulation
+from vmmad.sweep import METRICS, branch, grid, parse_values, sweep
+
+
+class TestParseValues(unittest.TestCase):
+
+    def test_single(self):
+        self.assertEqual(parse_values('7'), [7])
+
+    def test_list_and_ranges(self):
+        self.assertEqual(parse_values('1,10:12,20:40:10'), [1, 10, 11, 12, 20, 30, 40])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parse_values, '1:2:3:4')
+        self.assertRaises(ValueError, parse_values, 'x')
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(self.path, 'w') as output:
+            output.write('JOBID,SUBMITTED_AT,RUN_DURATION\n')
+            for n in xrange(40):
+                output.write("%d,%d,%d\n" % (n+1, 1000 + 15*n, 600 + 10*n))
+        self.runs = grid(max_vms=[2, 6], max_idle=[60, 600], cluster_size=[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_grid(self):
+        self.assertEqual(len(self.runs), 4)
+        self.assertEqual(set((run['max_vms'], run['max_idle']) for run in self.runs),
+                         set([(2, 60), (2, 600), (6, 60), (6, 600)]))
+
+    def test_sweep(self):
+        results = sweep(self.path, self.runs, processes=1, time_interval=60,
+                        discrete=True)
+        self.assertEqual(len(results), 4)
+        for run, result in zip(self.runs, results):
+            self.assertEqual(result['max_vms'], run['max_vms'])
+            self.assertEqual(result['max_idle'], run['max_idle'])
+            self.assertTrue(result['jobs'] > 0)
+            self.assertTrue(0 <= result['mean_wait'] <= result['p95_wait'] <= result['max_wait'])
+            self.assertTrue(0 <= result['idle_fraction'] <= 1)
+            self.assertTrue(0 < result['vms_started'])
+            if run['max_idle'] == 600:
+                # the cluster node counts against `max_vms`, and no VM is stopped
+                self.assertEqual(result['vms_started'], run['max_vms'] - 1)
+
+    def test_parallel(self):
+        runs = grid(max_vms=[4, 22], max_idle=[60, 600], cluster_size=[1, 20])
+        serial = sweep(self.path, runs, processes=1, time_interval=60, discrete=True)
+        parallel = sweep(self.path, runs, processes=2, time_interval=60, discrete=True)
+        self.assertEqual(parallel, serial)
+        self.assertTrue(max(result['vms_started'] for result in serial) > 0)
+
+    def test_trace_file(self):
+        trace_path = os.path.join(self.tmpdir, 'jobs.trace')
+        convert_csv(self.path, trace_path)
+        self.assertEqual(sweep(trace_path, self.runs, processes=2, time_interval=60),
+                         sweep(self.path, self.runs, processes=1, time_interval=60))
+
+    def test_branch(self):
+        sim = OrchestratorSimulation(
+            max_vms=2, max_delta=1, max_idle=60, startup_delay=60,
+            output_file=None, csv_file=self.path, start_time=None,
+            time_interval=60, cluster_size=1)
+        self.assertTrue(sim.run_until(1300))
+        snapshot = os.path.join(self.tmpdir, 'sim.snapshot')
+        sim.save_snapshot(snapshot)
+        runs = grid(max_vms=[2, 6], max_idle=[60, 600])
+        results = branch(snapshot, runs, processes=2)
+        # the branch that keeps the policy unchanged ends as the whole simulation does
+        unchanged = results[runs.index(dict(max_vms=2, max_idle=60))]
+        whole = sweep(self.path, [dict(max_vms=2, max_idle=60, cluster_size=1)],
+                      processes=1, time_interval=60)[0]
+        for key in METRICS:
+            self.assertEqual(unchanged[key], whole[key])
+        # parameters not given keep (and report) their saved value
+        kept = branch(snapshot, [dict(max_idle=60)], processes=1)[0]
+        self.assertEqual((kept['max_vms'], kept['max_delta']), (2, 1))
+        for key in METRICS:
+            self.assertEqual(kept[key], whole[key])
+        self.assertRaises(RuntimeError, branch, snapshot, [dict(cluster_size=3)])
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.trace` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+# local imports
+from vmmad.batchsys.replay import JobsFromFile
+from vmmad.batchsys.trace import JobsFromTrace, TraceFile, convert_csv, is_trace_file
+
+
+# deliberately out of submission order
+TRACE = """\
+JOBID,SUBMITTED_AT,RUNNING_AT,RUN_DURATION,SLOTS
+3,1020,1025,10,4
+1,1000,1001,5,1
+2.17,1000,,50,2
+4,1030,1090,100,1
+"""
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTraceFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(self.csv_path, 'w') as output:
+            output.write(TRACE)
+        self.path = os.path.join(self.tmpdir, 'jobs.trace')
+        self.assertEqual(convert_csv(self.csv_path, self.path), 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_is_trace_file(self):
+        self.assertTrue(is_trace_file(self.path))
+        self.assertFalse(is_trace_file(self.csv_path))
+        self.assertRaises(RuntimeError, TraceFile, self.csv_path)
+
+    def test_columns(self):
+        trace = TraceFile(self.path)
+        self.assertEqual(len(trace), 4)
+        self.assertEqual([ trace.jobid(i) for i in range(4) ], ['1', '2.17', '3', '4'])
+        self.assertEqual(trace.submitted_at(2), 1020.0)
+        self.assertEqual(trace.running_at(2), 1025.0)
+        self.assertTrue(math.isnan(trace.running_at(1)))
+        self.assertEqual(trace.run_duration(3), 100.0)
+        self.assertEqual(trace.slots(2), 4)
+        self.assertEqual(trace.read(1, 10),
+                         [(1000.0, 50.0, '2.17', 2), (1020.0, 10.0, '3', 4), (1030.0, 100.0, '4', 1)])
+        trace.close()
+
+    def test_find(self):
+        trace = TraceFile(self.path)
+        self.assertEqual(trace.find(-1), 0)
+        self.assertEqual(trace.find(1000), 2)
+        self.assertEqual(trace.find(1025), 3)
+        self.assertEqual(trace.find(2000), 4)
+        trace.close()
+
+    def test_same_as_csv_replay(self):
+        clock = _Clock()
+        from_csv = JobsFromFile(self.csv_path, clock)
+        from_trace = JobsFromTrace(self.path, clock)
+        self.assertEqual(from_trace.start_time, from_csv.start_time)
+        for now in range(990, 1200, 5):
+            clock.now = now
+            self.assertEqual(sorted(dict(job) for job in from_trace.get_sched_info()),
+                             sorted(dict(job) for job in from_csv.get_sched_info()))
+            # start jobs as soon as they are seen
+            for batchsys in from_trace, from_csv:
+                for job in batchsys.submitted:
+                    job.running_at = now
+                    batchsys.job_started(job)
+        self.assertTrue(from_trace.exhausted)
+
+    def test_start_time(self):
+        clock = _Clock(1100)
+        batchsys = JobsFromTrace(self.path, clock, 1010)
+        self.assertEqual(batchsys.start_time, 1010)
+        self.assertEqual(sorted(job.jobid for job in batchsys.get_sched_info()), ['3', '4'])
+
+    def test_end_time(self):
+        clock = _Clock(1100)
+        batchsys = JobsFromTrace(self.path, clock, 1000, 1020)
+        self.assertEqual([ job.jobid for job in batchsys.get_sched_info() ], ['3'])
+        self.assertEqual(batchsys.num_submitted, 1)
+        self.assertTrue(batchsys.exhausted)
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
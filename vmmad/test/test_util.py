@@ -23,6 +23,8 @@ Run tests for the `vmmad.util` module.
 __docformat__ = 'reStructuredText'
 
 # stdlib imports
+import cPickle as pickle
+import time
 import unittest
 
 # local imports
@@ -47,6 +49,74 @@ class TestRandomPassword(unittest.TestCase):
         self.assertTrue(used_letters.issubset(letters))
 
 
+class TestTimestampConverter(unittest.TestCase):
+
+    def test_same_as_strptime(self):
+        to_epoch = vmmad.util.TimestampConverter('%Y-%m-%dT%H:%M:%S')
+        for timestr in ['2011-11-23T17:20:34', '2012-02-29T00:00:00',
+                        '2011-12-31T23:59:59', '2012-03-25T02:30:00']:
+            self.assertEqual(
+                to_epoch(timestr),
+                time.mktime(time.strptime(timestr, '%Y-%m-%dT%H:%M:%S')))
+
+    def test_other_format(self):
+        to_epoch = vmmad.util.TimestampConverter('%m/%d/%Y %H:%M:%S')
+        self.assertEqual(
+            to_epoch('11/26/2011 08:41:59'),
+            time.mktime(time.strptime('2011-11-26T08:41:59', '%Y-%m-%dT%H:%M:%S')))
+
+    def test_invalid_input(self):
+        to_epoch = vmmad.util.TimestampConverter('%Y-%m-%dT%H:%M:%S')
+        for timestr in ['2011-02-30T00:00:00', '2011-13-01T00:00:00',
+                        '2011-11-23 17:20:34', 'garbage']:
+            self.assertRaises(ValueError, to_epoch, timestr)
+
+    def test_cache_is_bounded(self):
+        to_epoch = vmmad.util.TimestampConverter('%Y-%m-%dT%H:%M:%S', maxsize=10)
+        for n in range(60):
+            to_epoch('2011-11-23T17:20:%02d' % n)
+        self.assertTrue(len(to_epoch._cache) <= 10)
+
+
+class _Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class _Timed(object):
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __getstate__(self):
+        return vmmad.util.pack_methods(self.__dict__)
+
+    def __setstate__(self, state):
+        self.__dict__.update(vmmad.util.unpack_methods(state))
+
+
+class TestPackMethods(unittest.TestCase):
+
+    def test_round_trip(self):
+        timed = pickle.loads(pickle.dumps(_Timed(_Clock(42).time), pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(timed.timer(), 42)
+
+    def test_shared_target(self):
+        clock = _Clock(42)
+        clock2, timed = pickle.loads(pickle.dumps((clock, _Timed(clock.time))))
+        clock2.now = 7
+        self.assertEqual(timed.timer(), 7)
+
+    def test_bound_methods_unchanged(self):
+        import vmmad.simul
+        self.assertRaises((pickle.PicklingError, TypeError),
+                          pickle.dumps, _Clock(42).time)
+
+
 ## main: run tests
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Run tests for the `vmmad.batchsys.workload` module.
+"""
+# Copyright (C) 2011, 2012 ETH Zurich and University of Zurich. All rights reserved.
+#
+# Authors:
+#   Riccardo Murri <riccardo.murri@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+__docformat__ = 'reStructuredText'
+
+# stdlib imports
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import unittest
+
+# 3rd party modules
+try:
+    import numpy
+    from vmmad.batchsys.workload import \
+         Workload, JobsFromWorkload, fit_model, load_model, save_model
+except ImportError:
+    numpy = None
+
+# local imports
+from vmmad.batchsys.randomjobs import \
+     EmpiricallyDistributed, ExponentiallyDistributed, UniformlyInRange
+from vmmad.batchsys.replay import load_jobs
+from vmmad.batchsys.trace import TraceFile
+
+
+class _Clock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestWorkload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_reproducible(self):
+        def jobs(seed):
+            return Workload(0.5, ExponentiallyDistributed(60), seed=seed, chunk=1000).arrays(5000)
+        for first, second in zip(jobs(1), jobs(1)):
+            self.assertEqual(list(first), list(second))
+        self.assertNotEqual(list(jobs(1)[0]), list(jobs(2)[0]))
+
+    def test_rate(self):
+        submitted_at, duration, jobid = Workload(
+            2.0, UniformlyInRange(10, 20), start_time=1000, seed=1).arrays(end_time=101000)
+        self.assertTrue(abs(len(submitted_at) - 200000) < 2000)
+        self.assertTrue(1000 < submitted_at[0] and submitted_at[-1] <= 101000)
+        self.assertTrue((numpy.diff(submitted_at) >= 0).all())
+        self.assertTrue(10 <= duration.min() and duration.max() <= 20)
+        self.assertEqual(list(jobid[:3]), [1, 2, 3])
+
+    def test_bursts_and_profile(self):
+        profile = [0]*12 + [1]*12
+        submitted_at, _, _ = Workload(
+            1.0, ExponentiallyDistributed(60), burst_size=5, profile=profile,
+            seed=1).arrays(end_time=10*86400)
+        self.assertTrue(abs(len(submitted_at) - 864000) < 864000 * 0.05)
+        # no jobs in the first half of the day
+        self.assertTrue(((submitted_at % 86400) >= 43200).all())
+        # jobs in a burst share the submission time
+        self.assertTrue(len(numpy.unique(submitted_at)) < len(submitted_at) / 3)
+
+    def test_weekly_profile(self):
+        # no jobs on Saturdays and Sundays; 4 Jan 1970 was a Sunday
+        profile = [1]*(5*24) + [0]*(2*24)
+        submitted_at, _, _ = Workload(
+            1.0, ExponentiallyDistributed(60), profile=profile,
+            seed=1).arrays(end_time=14*86400)
+        weekday = ((submitted_at // 86400) + 3) % 7
+        self.assertTrue((weekday < 5).all())
+        self.assertTrue(abs(len(submitted_at) - 14*86400) < 14*86400 * 0.05)
+
+    def test_fit_model(self):
+        profile = [ 1 + (hour // 24) for hour in xrange(168) ]
+        workload = Workload(0.2, ExponentiallyDistributed(600), start_time=1000,
+                            burst_size=3, profile=profile, seed=1)
+        submitted_at, duration, _ = workload.arrays(end_time=1000 + 8*7*86400)
+        model = fit_model(submitted_at, duration)
+        self.assertTrue(abs(model['rate'] - 0.2) < 0.2 * 0.05)
+        self.assertEqual(len(model['profile']), 168)
+        # rate on Sundays is 7 times the one on Mondays
+        monday = numpy.mean(model['profile'][:24])
+        sunday = numpy.mean(model['profile'][-24:])
+        self.assertTrue(abs(sunday / monday - 7) < 7 * 0.1)
+        self.assertTrue(abs(model['burst_size'] - 3) < 0.1)
+        self.assertTrue(abs(model['duration']['quantiles'][50] - 600*numpy.log(2)) < 30)
+
+        # a day of history is only enough for a daily profile
+        day = submitted_at < submitted_at[0] + 86400
+        self.assertEqual(len(fit_model(submitted_at[day], duration[day])['profile']), 24)
+
+    def test_model_file(self):
+        submitted_at, duration, _ = Workload(
+            0.1, ExponentiallyDistributed(600), seed=1).arrays(end_time=3*86400)
+        model = fit_model(submitted_at, duration)
+        path = os.path.join(self.tmpdir, 'model.json')
+        save_model(model, path)
+        self.assertEqual(load_model(path), model)
+
+        # the model generates jobs at (a multiple of) the fitted rate
+        workload = Workload.from_model(load_model(path), scale=10, seed=2)
+        generated_at, generated_duration, _ = workload.arrays(end_time=3*86400)
+        self.assertTrue(abs(len(generated_at) - 10*len(submitted_at))
+                        < 10*len(submitted_at) * 0.05)
+        self.assertTrue(duration.min() <= generated_duration.min())
+        self.assertTrue(generated_duration.max() <= duration.max())
+
+    def test_empirical_durations(self):
+        quantiles = [0, 10, 100]
+        values = EmpiricallyDistributed(quantiles).sample(numpy.random.RandomState(1), 100000)
+        self.assertTrue(0 <= values.min() and values.max() <= 100)
+        self.assertTrue(abs(numpy.median(values) - 10) < 1)
+
+    def test_write(self):
+        workload = Workload(0.1, ExponentiallyDistributed(600), seed=1)
+        csv_path = os.path.join(self.tmpdir, 'jobs.csv')
+        with open(csv_path, 'wb') as output:
+            self.assertEqual(workload.write_csv(output, 1000), 1000)
+        jobs = load_jobs(csv_path)
+        self.assertEqual(jobs, list(workload_jobs(workload, 1000)))
+        trace_path = os.path.join(self.tmpdir, 'jobs.trace')
+        self.assertEqual(workload.write_trace(trace_path, 1000), 1000)
+        trace = TraceFile(trace_path)
+        self.assertEqual(trace.read(0, 1000), jobs)
+        trace.close()
+
+    def test_replay(self):
+        clock = _Clock()
+        batchsys = JobsFromWorkload(Workload(0.1, ExponentiallyDistributed(600), seed=1),
+                                    clock, end_time=86400)
+        for clock.now in xrange(0, 2*86400, 600):
+            jobs = batchsys.get_sched_info()
+            for job in batchsys.submitted:
+                job.running_at = clock.now
+                batchsys.job_started(job)
+            for job in jobs:
+                self.assertTrue(job.submitted_at <= clock.now < job.running_at + job.duration)
+        self.assertTrue(batchsys.exhausted)
+        self.assertEqual(jobs, [ ])
+
+    def test_resume(self):
+        clock = _Clock()
+        whole = JobsFromWorkload(Workload(0.1, ExponentiallyDistributed(600), seed=1),
+                                 clock, end_time=7200)
+        clock.now = 3600
+        whole.get_sched_info()
+        restored = pickle.loads(pickle.dumps(whole, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored.num_submitted, whole.num_submitted)
+        for batchsys in whole, restored:
+            batchsys.timer.now = 7200
+            batchsys.get_sched_info()
+        self.assertTrue(len(whole.submitted) > 100)
+        self.assertEqual([ dict(job) for job in restored.submitted ],
+                         [ dict(job) for job in whole.submitted ])
+        self.assertTrue(restored.exhausted)
+
+    def test_pending_jobs_do_not_terminate(self):
+        clock = _Clock()
+        batchsys = JobsFromWorkload(Workload(0.1, ExponentiallyDistributed(600), seed=1),
+                                    clock, end_time=3600)
+        clock.now = 3600
+        jobs = batchsys.get_sched_info()
+        self.assertTrue(len(jobs) > 100)
+        # nothing runs, so no job terminates
+        clock.now = 100*86400
+        self.assertEqual(len(batchsys.get_sched_info()), len(jobs))
+        self.assertEqual(batchsys.terminated, [ ])
+        for job in jobs:
+            job.running_at = clock.now
+            batchsys.job_started(job)
+        clock.now += max(job.duration for job in jobs)
+        self.assertEqual(batchsys.get_sched_info(), [ ])
+        self.assertEqual(len(batchsys.terminated), len(jobs))
+
+
+def workload_jobs(workload, count):
+    for n, job in enumerate(workload):
+        if n == count:
+            break
+        yield job
+
+
+## main: run tests
+
+if __name__ == "__main__":
+    # tests defined here
+    unittest.main()
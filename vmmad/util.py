@@ -28,9 +28,12 @@ __version__ = '$Revision$'
 
 
 # stdlib imports
+import calendar
 from collections import Mapping
 import random
 import string
+import time
+import types
 
 
 
@@ -38,6 +41,158 @@ def random_password(length=24, letters=(string.ascii_letters + string.digits)):
     return str.join('', [random.choice(letters) for _ in xrange(length)])
 
 
+class TimestampConverter(object):
+    """
+    Convert time stamps in a fixed format into UNIX epoch values.
+
+    Calling a `TimestampConverter` instance on a string returns the
+    same value as ``time.mktime(time.strptime(timestr, fmt))``, i.e.,
+    the time stamp is interpreted as local time, but is much faster:
+
+    * if the format only uses the directives ``%Y``, ``%m``, ``%d``,
+      ``%H``, ``%M`` and ``%S`` (in any order, separated by literal
+      characters), fields are extracted by slicing the string at fixed
+      offsets, so `time.strptime` is never called on well-formed input;
+
+    * results are memoized, since many jobs (e.g., tasks of an array
+      job) share the very same time stamp.  The cache holds at most
+      `maxsize` entries and is emptied when it grows past that limit.
+
+    Anything that does not look exactly like `fmt` is handed over to
+    `time.strptime`, so invalid input raises `ValueError` just as it
+    would without the converter.
+
+    Examples::
+
+      >>> to_epoch = TimestampConverter('%Y-%m-%dT%H:%M:%S')
+      >>> to_epoch('2011-11-23T17:20:34') == time.mktime(time.strptime('2011-11-23T17:20:34', '%Y-%m-%dT%H:%M:%S'))
+      True
+    """
+
+    # width of the fields that can be extracted at fixed offsets, and
+    # their index in a `time.struct_time` tuple
+    _FIXED_FIELDS = {
+        'Y': (4, 0),
+        'm': (2, 1),
+        'd': (2, 2),
+        'H': (2, 3),
+        'M': (2, 4),
+        'S': (2, 5),
+        }
+
+    def __init__(self, fmt='%Y-%m-%dT%H:%M:%S', maxsize=16384):
+        self.fmt = fmt
+        self.maxsize = maxsize
+        self._cache = { }
+        self._fields, self._literals, self._length = self._compile(fmt)
+
+    @classmethod
+    def _compile(cls, fmt):
+        """
+        Return a triple `(fields, literals, length)` describing where
+        each field and literal character is located in strings
+        formatted according to `fmt`, or `(None, None, None)` if `fmt`
+        cannot be parsed at fixed offsets.
+        """
+        fields = [ ]
+        literals = [ ]
+        pos = 0
+        i = 0
+        while i < len(fmt):
+            if fmt[i] == '%':
+                directive = fmt[i+1:i+2]
+                if directive not in cls._FIXED_FIELDS:
+                    return (None, None, None)
+                width, index = cls._FIXED_FIELDS[directive]
+                fields.append((index, pos, pos + width))
+                pos += width
+                i += 2
+            else:
+                literals.append((pos, fmt[i]))
+                pos += 1
+                i += 1
+        if len(set(index for index, _, _ in fields)) != 6:
+            # some date/time field is missing, let `strptime` fill in defaults
+            return (None, None, None)
+        return (fields, literals, pos)
+
+    def __call__(self, timestr):
+        try:
+            return self._cache[timestr]
+        except KeyError:
+            pass
+        result = self._convert(timestr)
+        if len(self._cache) >= self.maxsize:
+            self._cache.clear()
+        self._cache[timestr] = result
+        return result
+
+    def _convert(self, timestr):
+        if self._fields is not None and len(timestr) == self._length:
+            for pos, char in self._literals:
+                if timestr[pos] != char:
+                    break
+            else:
+                values = [0, 0, 0, 0, 0, 0, 0, 0, -1]
+                for index, start, end in self._fields:
+                    digits = timestr[start:end]
+                    if not digits.isdigit():
+                        break
+                    values[index] = int(digits)
+                else:
+                    # reject out-of-range values exactly as `strptime` does
+                    year, month, day = values[0], values[1], values[2]
+                    if (1 <= month <= 12 and values[3] <= 23
+                        and values[4] <= 59 and values[5] <= 61
+                        and 1 <= day and (day <= 28
+                                          or day <= calendar.monthrange(year, month)[1])):
+                        return time.mktime(tuple(values))
+        return time.mktime(time.strptime(timestr, self.fmt))
+
+
+# shared converter for the ISO-like time stamps found in GE's XML output
+timestamp_to_epoch = TimestampConverter('%Y-%m-%dT%H:%M:%S')
+
+
+class _MethodRef(object):
+    """
+    Reference to method `name` of object `obj`, which (unlike the
+    bound method itself) can be pickled; see `pack_methods`.
+    """
+    def __init__(self, obj, name):
+        self.obj = obj
+        self.name = name
+
+
+def pack_methods(state):
+    """
+    Return a copy of dictionary `state` (e.g., the one returned by a
+    `__getstate__` method), where bound methods are replaced by
+    references that can be pickled; `unpack_methods` reverses this.
+
+    Use this for objects that keep callbacks into other objects
+    (e.g., a simulation's `time` method as timer), without changing
+    how bound methods are pickled elsewhere in the program.
+    """
+    state = dict(state)
+    for name, value in state.items():
+        if isinstance(value, types.MethodType) and value.im_self is not None:
+            state[name] = _MethodRef(value.im_self, value.im_func.__name__)
+    return state
+
+
+def unpack_methods(state):
+    """
+    Replace (in place) the references created by `pack_methods` in
+    dictionary `state` with the bound methods they refer to, and
+    return `state`.
+    """
+    for name, value in state.items():
+        if isinstance(value, _MethodRef):
+            state[name] = getattr(value.obj, value.name)
+    return state
+
+
 class Struct(Mapping):
     """
     A `dict`-like object, whose keys can be accessed with the usual
@@ -59,14 +59,18 @@ class OrchestratorWebApp(Blueprint, Orchestrator):
                               chkptfile=chkptfile,
                               **kwargs)
 
-        # run the Orchestrator main loop in a separate thread
+        # run the Orchestrator main loop in a separate thread, until
+        # `stop` is called; restart it if it crashes
         def run_main_loop():
             while True:
                 try:
                     self.run(delay)
+                    break
                 except Exception, ex:
                     log.error("%s in Orchestrator's main loop: %s",
                               ex.__class__.__name__, str(ex), exc_info=True)
+                    # do not spin if the error happens at every cycle
+                    time.sleep(delay)
         self._daemon = threading.Thread(target=run_main_loop)
         self._daemon.daemon = True
         self._daemon.start()